@@ -2,9 +2,10 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import List, Optional
 from pathlib import Path
-import json
 import os
 
+from app.utils.json_store import read_json_cached
+
 # JSON 配置文件路径
 CONFIG_FILE = Path.home() / ".notion-ai-proxy" / "config.json"
 
@@ -20,6 +21,8 @@ class Settings(BaseSettings):
     DESCRIPTION: str = "一个将 Notion AI 转换为兼容 OpenAI 格式 API 的高性能代理。"
 
     API_MASTER_KEY: Optional[str] = None
+    # 管理接口（/admin/*）密钥，未配置时管理接口不可用
+    ADMIN_API_KEY: Optional[str] = None
 
     # --- Notion 凭证 ---
     NOTION_COOKIE: Optional[str] = None
@@ -29,12 +32,88 @@ class Settings(BaseSettings):
     NOTION_USER_EMAIL: Optional[str] = None
     NOTION_BLOCK_ID: Optional[str] = None
     NOTION_CLIENT_VERSION: Optional[str] = "23.13.20251011.2037"
+    # 上游地址（压测时可指向 benchmarks/fake_notion.py 启动的本地替身）
+    NOTION_BASE_URL: str = "https://www.notion.so"
+    # 轮询 ~/.notion-ai-proxy/config.json 的间隔（秒），文件变化时热更新凭证，0 表示不监视
+    CONFIG_WATCH_INTERVAL: float = 2.0
+    # 后台校验 token_v2 的间隔（秒），确认失效后请求直接返回错误，0 表示只在请求失败时发现
+    TOKEN_CHECK_INTERVAL: float = 300.0
+    # Token 失效时自动从本机浏览器（Edge/Chrome/Firefox）读取新的 token_v2 并热更新
+    CREDENTIAL_RECOVERY: bool = False
+    # 受影响的请求等待恢复结果的最长时间（秒），以及恢复失败后再次尝试的最小间隔（秒）
+    CREDENTIAL_RECOVERY_HOLD: float = 15.0
+    CREDENTIAL_RECOVERY_INTERVAL: float = 60.0
+    # 同一类桌面通知（如 Token 失效）的最小间隔（秒）
+    NOTIFY_MIN_INTERVAL: float = 300.0
+    # 停机时等待进行中请求（含 SSE 流）完成的最长时间（秒），超时后中断
+    SHUTDOWN_DRAIN_SECONDS: float = 30.0
+    # 多 worker 模式（app.core.server --workers N）：worker 的事件循环超过该秒数无响应时强制重启
+    WORKER_HEARTBEAT_TIMEOUT: float = 150.0
+    # worker 意外退出后的重启间隔从 1 秒起逐次翻倍，最长不超过该秒数
+    WORKER_RESTART_BACKOFF_MAX: float = 30.0
 
     API_REQUEST_TIMEOUT: int = 180
     NGINX_PORT: int = 8088
 
+    # --- 链路追踪 ---
+    # 采样率 0~1，0 表示不导出（仍会输出单行耗时日志）
+    TRACE_SAMPLE_RATE: float = 0.0
+    # 导出文件（Chrome Trace Event 格式），为空时写入 ~/.notion-ai-proxy/traces.json
+    TRACE_EXPORT_FILE: Optional[str] = None
+    # 导出文件的大小上限（MB），超出时轮转为 traces.json.1、.2 ...
+    TRACE_MAX_MB: float = 50.0
+    # 轮转后保留的历史文件数
+    TRACE_MAX_FILES: int = 5
+
+    # --- 性能诊断 ---
+    # CPU 采样分析的最长时长（秒）
+    PROFILE_MAX_SECONDS: int = 60
+    # 事件循环延迟监控
+    LOOP_MONITOR_ENABLED: bool = True
+    LOOP_LAG_INTERVAL_MS: int = 100
+    # 延迟超过该值时记录阻塞代码的调用栈
+    LOOP_LAG_THRESHOLD_MS: int = 200
+
+    # --- 流量录制与回放 ---
+    # 录制目录，设置后把上游原始响应（凭证已脱敏）写入 .ncap 文件
+    CAPTURE_DIR: Optional[str] = None
+    # 录制采样率 0~1
+    CAPTURE_SAMPLE_RATE: float = 1.0
+    # 最多保留的录制文件数
+    CAPTURE_MAX_FILES: int = 200
+    # 回放文件或目录，设置后不再访问 Notion，而是回放录制的响应
+    REPLAY_CAPTURE: Optional[str] = None
+    # 回放速度，1 为原速，0 为不等待
+    REPLAY_SPEED: float = 1.0
+
+    # --- 上下文预算 ---
+    # 发往 Notion 的历史消息 token 预算（估算值），超出时压缩历史，默认 0 表示不限制（按需开启）
+    CONTEXT_BUDGET_TOKENS: int = 0
+    # 按模型（客户端请求的模型名）单独设置预算，例如 {"gpt-4.1": 32000}
+    CONTEXT_BUDGET_MAP: dict = {}
+    # 压缩策略：default（去重、折叠超长消息、裁剪最早的轮次）或 none
+    CONTEXT_POLICY: str = "default"
+    # 单条历史消息的 token 上限，超出时只保留首尾
+    COMPACT_MESSAGE_MAX_TOKENS: int = 4000
+
     DEFAULT_MODEL: str = "claude-opus-4.5"
-    
+    # 向 Notion 查询可用模型、刷新 /v1/models 列表的间隔（秒），0 表示只使用下面的静态配置
+    MODEL_REFRESH_INTERVAL: float = 3600.0
+    # 模型健康探测间隔（秒），0 表示只根据真实请求判断（探测是一次不保存对话线程的真实推理请求，计入账号用量）
+    MODEL_PROBE_INTERVAL: float = 0.0
+    MODEL_PROBE_TIMEOUT: float = 30.0
+    # 连续失败多少次判定模型不可用，以及不可用后直接拒绝请求的时长（秒）
+    MODEL_DOWN_AFTER_FAILURES: int = 3
+    MODEL_DOWN_COOLDOWN: float = 60.0
+    # 回退链：客户端模型名 -> 依次尝试的回退模型名，例如 {"claude-opus-4.5": ["claude-sonnet-4.5"]}
+    MODEL_FALLBACKS: dict = {}
+    # 路由依据的样本时间窗口（秒）与最少样本数
+    MODEL_ROUTING_WINDOW: float = 300.0
+    MODEL_ROUTING_MIN_SAMPLES: int = 5
+    # 首字节耗时 p95 超过该值（秒）或错误率超过该值时视为降级，优先使用回退模型；SLO 为 0 表示不按耗时路由
+    MODEL_TTFB_SLO: float = 10.0
+    MODEL_MAX_ERROR_RATE: float = 0.5
+
     KNOWN_MODELS: List[str] = [
         "claude-opus-4.5",
         "claude-sonnet-4.5",
@@ -55,12 +134,13 @@ class Settings(BaseSettings):
         "gpt-4.1": "openai-gpt-4.1"
     }
     
-    def reload_from_json(self):
-        """从 JSON 配置文件重新加载凭证"""
+    def reload_from_json(self) -> bool:
+        """从 JSON 配置文件重新加载凭证（文件未变化时使用缓存），文件存在但读取失败时返回 False"""
         if CONFIG_FILE.exists():
             try:
-                with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
+                config = read_json_cached(CONFIG_FILE)
+                if config is None:
+                    return True
                 
                 # 更新凭证字段
                 if "token_v2" in config:
@@ -75,6 +155,8 @@ class Settings(BaseSettings):
                 print(f"✅ 已从 JSON 配置文件重新加载配置: {CONFIG_FILE}")
             except Exception as e:
                 print(f"⚠️ 加载 JSON 配置失败: {e}")
+                return False
+        return True
 
 # 创建全局 settings 实例
 settings = Settings()
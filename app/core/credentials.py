@@ -0,0 +1,150 @@
+"""
+凭证快照模块
+凭证（token_v2、space/user id）与据此生成的请求头、Cookies 组成一个不可变快照，
+由 CredentialStore 整体替换（单次引用赋值，天然原子）。
+每个请求开始时取一次快照并用到结束，因此热更新时进行中的请求沿用旧凭证，新请求使用新凭证，无需重启服务
+"""
+import asyncio
+import logging
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, NamedTuple, Optional
+
+from app.core.config import CONFIG_FILE, settings
+from app.utils.json_store import Signature, file_signature
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+
+class Credentials(NamedTuple):
+    """某一版本的凭证快照（只读）"""
+
+    version: int
+    loaded_at: float
+    cookie: Optional[str]
+    space_id: Optional[str]
+    user_id: Optional[str]
+    user_name: Optional[str]
+    user_email: Optional[str]
+    headers: Mapping[str, str]
+    cookies: Mapping[str, str]
+
+    @classmethod
+    def from_settings(cls, version: int) -> "Credentials":
+        headers = {
+            "Content-Type": "application/json",
+            "User-Agent": USER_AGENT,
+            "Accept": "application/json",
+            "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+            "Notion-Client-Version": "23.13.0.1",
+            "x-notion-active-user-header": settings.NOTION_USER_ID,
+            "x-notion-space-id": settings.NOTION_SPACE_ID,
+        }
+        return cls(
+            version=version,
+            loaded_at=time.time(),
+            cookie=settings.NOTION_COOKIE,
+            space_id=settings.NOTION_SPACE_ID,
+            user_id=settings.NOTION_USER_ID,
+            user_name=settings.NOTION_USER_NAME,
+            user_email=settings.NOTION_USER_EMAIL,
+            headers=MappingProxyType(headers),
+            cookies=MappingProxyType({"token_v2": settings.NOTION_COOKIE}),
+        )
+
+    def identity(self) -> tuple:
+        """用于判断凭证是否变化的字段"""
+        return (self.cookie, self.space_id, self.user_id, self.user_name, self.user_email)
+
+
+_FIELD_NAMES = ("cookie", "space_id", "user_id", "user_name", "user_email")
+
+
+class CredentialStore:
+    """持有当前凭证快照，监视 config.json 变化并热更新"""
+
+    def __init__(self):
+        self._current = Credentials.from_settings(version=1)
+        self._lock = threading.Lock()
+        self._config_signature: Optional[Signature] = None
+        self._task: Optional[asyncio.Task] = None
+        self.last_reload: Optional[Dict[str, Any]] = None
+
+    @property
+    def current(self) -> Credentials:
+        return self._current
+
+    def reload(self, source: str = "manual") -> Dict[str, Any]:
+        """重新读取配置文件，凭证有变化时替换快照，返回本次重载的结果"""
+        with self._lock:
+            signature = file_signature(CONFIG_FILE)
+            port = settings.NGINX_PORT
+            if not settings.reload_from_json():
+                # 文件内容无效，不记录签名，下次轮询重试
+                return {"changed": False, "version": self._current.version, "error": "配置文件读取失败"}
+            self._config_signature = signature
+
+            old = self._current
+            new = Credentials.from_settings(version=old.version + 1)
+            changed = [
+                name for name, before, after in zip(_FIELD_NAMES, old.identity(), new.identity())
+                if before != after
+            ]
+            if changed:
+                self._current = new
+                logger.info(f"凭证已热更新（来源: {source}，版本 {new.version}，变更: {', '.join(changed)}）")
+            if settings.NGINX_PORT != port:
+                logger.warning(f"端口已改为 {settings.NGINX_PORT}，需要重启服务才能生效")
+
+            self.last_reload = {
+                "source": source,
+                "time": time.time(),
+                "changed": bool(changed),
+                "fields": changed,
+                "version": self._current.version,
+            }
+            return self.last_reload
+
+    def info(self) -> Dict[str, Any]:
+        """当前快照概况（不含凭证明文）"""
+        current = self._current
+        return {
+            "version": current.version,
+            "loaded_at": current.loaded_at,
+            "cookie_prefix": f"{current.cookie[:8]}..." if current.cookie else None,
+            "space_id": current.space_id,
+            "user_id": current.user_id,
+            "watching": self._task is not None and not self._task.done(),
+            "last_reload": self.last_reload,
+        }
+
+    def start_watching(self, interval: float):
+        """在事件循环中轮询配置文件的 mtime 与大小（需在协程上下文调用）"""
+        if self._task is not None and not self._task.done():
+            return
+        self._config_signature = file_signature(CONFIG_FILE)
+        self._task = asyncio.get_running_loop().create_task(self._watch(interval))
+        logger.info(f"正在监视配置文件变化: {CONFIG_FILE}（间隔 {interval}s）")
+
+    async def stop_watching(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _watch(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            signature = file_signature(CONFIG_FILE)
+            if signature is not None and signature != self._config_signature:
+                self.reload("file")
+
+
+# 全局实例
+credential_store = CredentialStore()
@@ -0,0 +1,304 @@
+"""
+服务启动入口: python -m app.core.server --host 127.0.0.1 --port 8088
+
+在 uvicorn 之上增加:
+- 收到 SIGTERM/SIGINT（或 --control-stdin 时从标准输入读到 drain）后优雅排空，
+  进行中的流最多等待 SHUTDOWN_DRAIN_SECONDS 秒，再次按 Ctrl+C 立即退出
+- 监听端口开启 SO_REUSEPORT，以 --handoff 启动的新进程可以在旧进程退出前绑定同一端口
+  （Windows 上只有 --handoff 时才设置 SO_REUSEADDR），就绪后再让旧进程排空，实现零停机重启；
+  不带 --handoff 时端口已被占用仍会报错，避免两个无关的实例静默地分担同一端口的连接
+- --workers N（N > 1）时本进程作为监督进程：绑定端口后启动 N 个 worker 进程共享监听 socket，
+  worker 的输出加上 [worker i] 前缀汇总到本进程的标准输出；通过心跳检查 worker 的事件循环，
+  意外退出或长时间无响应的 worker 按退避间隔重启；全部 worker 就绪后才输出就绪标记，排空时通知所有 worker。
+  进程间只共享不加锁的数值（心跳时间与排空标记），worker 在任意时刻被杀死都不会让监督进程卡在共享锁上
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import List, Optional
+
+import uvicorn
+
+from app.core.config import settings
+from app.utils.drain import drain_controller
+
+logger = logging.getLogger(__name__)
+
+# 进程开始接受请求时输出，GUI 据此判断交接重启的新进程已就绪
+READY_MARKER = "服务已就绪"
+DRAIN_COMMAND = "drain"
+
+# worker 稳定运行超过该秒数后，重启间隔恢复为 1 秒
+WORKER_STABLE_SECONDS = 60.0
+SUPERVISOR_POLL_SECONDS = 0.5
+
+
+class DrainingServer(uvicorn.Server):
+    """
+    第一次收到退出信号时进入排空状态，其余交给 uvicorn 的优雅关闭流程
+    作为 worker 运行时，就绪后及事件循环的每个 tick 更新 heartbeat（供监督进程检查），
+    并在 tick 中检查监督进程的排空标记 drain
+    """
+
+    def __init__(self, config: uvicorn.Config, heartbeat=None, drain=None):
+        super().__init__(config)
+        self.heartbeat = heartbeat
+        self.drain = drain
+        self._parent = multiprocessing.parent_process()
+        if drain is not None:
+            # POST /admin/drain 排空整个服务：置位共享标记，由监督进程停止重启并让所有 worker 排空
+            drain_controller.shutdown_handler = self._request_supervisor_drain
+
+    def _request_supervisor_drain(self):
+        self.drain.value = 1
+
+    def handle_exit(self, sig: int, frame) -> None:
+        if not self.should_exit:
+            drain_controller.begin(f"信号 {signal.Signals(sig).name}")
+        super().handle_exit(sig, frame)
+
+    async def startup(self, sockets: Optional[List[socket.socket]] = None) -> None:
+        await super().startup(sockets=sockets)
+        if not self.started:
+            return
+        if self.heartbeat is None:
+            logger.info(f"{READY_MARKER}（端口 {self.config.port}）")
+        else:
+            # 多 worker 模式下由监督进程在全部 worker 就绪后输出就绪标记
+            logger.info(f"worker 已就绪（pid {os.getpid()}）")
+            self.heartbeat.value = time.monotonic()
+
+    async def on_tick(self, counter: int) -> bool:
+        if self.heartbeat is not None:
+            self.heartbeat.value = time.monotonic()
+            # 监督进程通知排空，或监督进程已意外退出（约每秒检查一次）时，同样排空退出
+            if not self.should_exit and (
+                self.drain.value or (counter % 10 == 0 and self._parent is not None and not self._parent.is_alive())
+            ):
+                drain_controller.begin("监督进程通知")
+                self.should_exit = True
+        return await super().on_tick(counter)
+
+
+def bind_socket(host: str, port: int, handoff: bool = False) -> socket.socket:
+    """绑定监听端口；handoff 为 True 时与正在运行的旧进程共享端口，否则端口被占用时报错"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    if sys.platform == "win32":
+        # Windows 上 SO_REUSEADDR 允许绑定已被占用的端口，只在交接时设置
+        if handoff:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    else:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            if not handoff:
+                # 共享端口要求双方都设置 SO_REUSEPORT，普通启动先不带它试绑一次，端口被占用时照常报错
+                with socket.socket(family, socket.SOCK_STREAM) as probe:
+                    probe.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                    probe.bind((host, port))
+            # 本进程也设置 SO_REUSEPORT，之后交接重启的新进程才能绑定同一端口
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    return sock
+
+
+def _watch_stdin():
+    """读取父进程（GUI）的指令；标准输入关闭说明父进程已退出，同样排空退出，避免遗留孤儿进程"""
+    for line in sys.stdin:
+        if line.strip() == DRAIN_COMMAND:
+            break
+    signal.raise_signal(signal.SIGTERM)
+
+
+def _build_config(args: argparse.Namespace) -> uvicorn.Config:
+    return uvicorn.Config(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        log_level=args.log_level,
+        timeout_graceful_shutdown=settings.SHUTDOWN_DRAIN_SECONDS or None,
+    )
+
+
+class _LinePrefixer:
+    """给每行输出加上前缀，多个 worker 的输出汇总到同一个标准输出时可以区分来源"""
+
+    def __init__(self, stream, prefix: str):
+        self._stream = stream
+        self._prefix = prefix
+        self._at_line_start = True
+
+    def write(self, text: str) -> int:
+        parts = []
+        for line in text.splitlines(keepends=True):
+            if self._at_line_start:
+                parts.append(self._prefix)
+            parts.append(line)
+            self._at_line_start = line.endswith("\n")
+        self._stream.write("".join(parts))
+        return len(text)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def _run_worker(index: int, sock: socket.socket, args: argparse.Namespace, heartbeat, drain):
+    """worker 进程入口（spawn 方式启动）"""
+    for name in ("stdout", "stderr"):
+        stream = getattr(sys, name)
+        if stream is None:
+            continue
+        # 按行写出，避免多个进程的输出在管道中交错成半行
+        stream.reconfigure(line_buffering=True)
+        setattr(sys, name, _LinePrefixer(stream, f"[worker {index}] "))
+    DrainingServer(_build_config(args), heartbeat=heartbeat, drain=drain).run(sockets=[sock])
+
+
+class _WorkerSlot:
+    """一个 worker 槽位：进程意外退出后在同一槽位按退避间隔重启"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process = None
+        # 最近一次心跳的 time.monotonic()，0 表示尚未就绪
+        self.heartbeat = None
+        self.started_at = 0.0
+        self.backoff = 1.0
+        self.restart_at: Optional[float] = None
+        self.restarts = 0
+
+
+class WorkerSupervisor:
+    """启动并监督多个 worker 进程（共享同一个监听 socket）"""
+
+    def __init__(self, args: argparse.Namespace, sock: socket.socket):
+        self.args = args
+        self.sock = sock
+        self.ctx = multiprocessing.get_context("spawn")
+        self.drain = self.ctx.RawValue("b", 0)
+        self.slots = [_WorkerSlot(i + 1) for i in range(args.workers)]
+        self.draining = False
+        self.exit_now = False
+        self.announced = False
+
+    def handle_exit(self, sig: int, frame) -> None:
+        """第一次收到退出信号时通知所有 worker 排空，再次收到时强制结束"""
+        if self.draining:
+            self.exit_now = True
+            return
+        self.draining = True
+        logger.info(f"收到信号 {signal.Signals(sig).name}，正在排空所有 worker...")
+        self.drain.value = 1
+
+    def run(self):
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, self.handle_exit)
+        for slot in self.slots:
+            self._spawn(slot)
+        try:
+            while not self.draining:
+                if self.drain.value:
+                    # 某个 worker 收到排空请求（如 POST /admin/drain）
+                    self.draining = True
+                    logger.info("worker 请求排空，正在排空所有 worker...")
+                    break
+                self._check()
+                time.sleep(SUPERVISOR_POLL_SECONDS)
+            self._shutdown()
+        finally:
+            self.sock.close()
+
+    def _spawn(self, slot: _WorkerSlot):
+        slot.heartbeat = self.ctx.RawValue("d", 0.0)
+        slot.process = self.ctx.Process(
+            target=_run_worker,
+            args=(slot.index, self.sock, self.args, slot.heartbeat, self.drain),
+            name=f"worker-{slot.index}",
+        )
+        slot.process.start()
+        slot.started_at = time.monotonic()
+        slot.restart_at = None
+        logger.info(f"worker {slot.index} 已启动（pid {slot.process.pid}）")
+
+    def _check(self):
+        now = time.monotonic()
+        for slot in self.slots:
+            if slot.restart_at is not None:
+                if now >= slot.restart_at:
+                    self._spawn(slot)
+                continue
+            exitcode = slot.process.exitcode
+            # 心跳在 worker 就绪后才有意义（启动阶段需要导入应用）
+            heartbeat = slot.heartbeat.value
+            stalled = now - heartbeat
+            if exitcode is None and heartbeat and stalled > settings.WORKER_HEARTBEAT_TIMEOUT:
+                logger.error(f"worker {slot.index}（pid {slot.process.pid}）的事件循环 {stalled:.0f}s 无响应，强制重启")
+                slot.process.kill()
+                slot.process.join(5)
+                exitcode = slot.process.exitcode
+            if exitcode == 0 and self.drain.value:
+                # 已请求排空，正常退出的 worker 不再重启
+                continue
+            if exitcode is not None:
+                self._schedule_restart(slot, exitcode, now)
+
+        if not self.announced and all(slot.heartbeat is not None and slot.heartbeat.value for slot in self.slots):
+            self.announced = True
+            logger.info(f"{READY_MARKER}（端口 {self.args.port}，{len(self.slots)} 个 worker）")
+
+    def _schedule_restart(self, slot: _WorkerSlot, exitcode: int, now: float):
+        if now - slot.started_at >= WORKER_STABLE_SECONDS:
+            slot.backoff = 1.0
+        delay = slot.backoff
+        slot.backoff = min(slot.backoff * 2, settings.WORKER_RESTART_BACKOFF_MAX)
+        slot.restart_at = now + delay
+        slot.restarts += 1
+        logger.error(f"worker {slot.index}（pid {slot.process.pid}）意外退出（退出码 {exitcode}），{delay:.0f}s 后重启")
+
+    def _shutdown(self):
+        """等待所有 worker 排空退出，超过排空时限仍未退出则强制结束"""
+        deadline = time.monotonic() + settings.SHUTDOWN_DRAIN_SECONDS + 5
+
+        def alive():
+            return [slot for slot in self.slots if slot.process is not None and slot.process.is_alive()]
+
+        while alive() and time.monotonic() < deadline and not self.exit_now:
+            time.sleep(SUPERVISOR_POLL_SECONDS)
+        for slot in alive():
+            logger.warning(f"worker {slot.index}（pid {slot.process.pid}）排空超时，强制结束")
+            slot.process.kill()
+        for slot in self.slots:
+            if slot.process is not None:
+                slot.process.join(5)
+        logger.info("所有 worker 已退出")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="启动 Notion AI 代理服务（支持优雅排空与交接重启）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=settings.NGINX_PORT)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--workers", type=int, default=1, help="worker 进程数，大于 1 时由本进程监督各 worker")
+    parser.add_argument("--control-stdin", action="store_true", help="从标准输入读取 drain 指令（GUI 使用）")
+    parser.add_argument("--handoff", action="store_true", help="与正在运行的旧进程共享端口（交接重启时使用）")
+    args = parser.parse_args(argv)
+
+    sock = bind_socket(args.host, args.port, handoff=args.handoff)
+    if args.control_stdin:
+        threading.Thread(target=_watch_stdin, name="stdin-control", daemon=True).start()
+    if args.workers > 1:
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        WorkerSupervisor(args, sock).run()
+        return
+    DrainingServer(_build_config(args)).run(sockets=[sock])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,28 @@
+import asyncio
+import codecs
 import json
 import logging
+import time
 import uuid
 import re
 from datetime import datetime, timezone
-from typing import AsyncGenerator, Optional
+from typing import AsyncGenerator, List, Optional
+from urllib.parse import quote
 
 import cloudscraper
 from app.core.config import settings
-from app.utils.notifier import notify_token_expired
+from app.core.credentials import Credentials, credential_store
+from app.providers.base_provider import BaseProvider
+from app.utils.capture import ReplayTransport, capture_store
+from app.utils.context import compact_messages
+from app.utils.credential_recovery import credential_recovery
+from app.utils.model_health import ModelProber, model_health
+from app.utils.model_registry import ModelRegistry, parse_available_models
+from app.utils.model_router import ModelRouter, Route
+from app.utils.stream_tracker import StreamStats, stream_tracker
+from app.utils.token_validator import TokenValidator
+from app.utils.tracing import RequestTrace, current_trace, tracer
+from app.utils.usage import CompletionCounter, build_usage, estimate_text, record_usage, token_estimator
 
 logger = logging.getLogger(__name__)
 
@@ -17,27 +32,189 @@ class TokenExpiredError(Exception):
     pass
 
 
-class NotionAIProvider:
+# 模型健康探测使用的最小对话
+PROBE_MESSAGES = [{"role": "user", "content": "ping"}]
+
+
+# <lang .../> 语言标签（自闭合及残留的开标签）
+_LANG_SELF_CLOSING_RE = re.compile(r'<lang[^>]*/>')
+_LANG_OPEN_RE = re.compile(r'<lang[^>]*>')
+_BRACE_RE = re.compile(r'[{}]')
+
+
+def strip_lang_tags(raw_content: str) -> str:
+    """去掉 agent-inference 文本开头的 <lang> 标签"""
+    # 处理开头未闭合的 <lang> 标签，防止输出乱码
+    if raw_content.lstrip().startswith("<lang") and "/>" not in raw_content and ">" not in raw_content:
+        return ""
+    clean_content = _LANG_SELF_CLOSING_RE.sub('', raw_content)
+    return _LANG_OPEN_RE.sub('', clean_content)  # 过滤残留
+
+
+class NotionStreamParser:
+    """
+    Notion 响应流解析器
+    从分块到达的数据中切出完整的 JSON 帧，并把 agent-inference（累积全文）、
+    record-map（最终全文）、patch（旧版增量）三种帧转换为增量文本
+    """
+
     def __init__(self):
-        self.scraper = cloudscraper.create_scraper()
-        self.base_url = "https://www.notion.so"
+        self.buffer = ""
+        self.last_text_content = ""
+        self.full_content = ""
+        # 增量解码，避免多字节字符被拆在两个 chunk 之间时解码失败
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        # 当前未完整帧已扫描到的位置及花括号嵌套深度
+        self._scan_pos = 0
+        self._depth = 0
+
+    def append(self, chunk):
+        """追加一个上游 chunk（bytes 或 str）"""
+        if isinstance(chunk, bytes):
+            chunk = self._decoder.decode(chunk)
+        self.buffer += chunk
+
+    def drain(self) -> List[str]:
+        """解析缓冲区中所有完整的帧，返回新产生的增量文本"""
+        deltas = []
+        for json_str in self.extract_frames():
+            try:
+                data = json.loads(json_str)
+            except json.JSONDecodeError:
+                continue
+            deltas.extend(self.handle_frame(data))
+        return deltas
+
+    def feed(self, chunk) -> List[str]:
+        self.append(chunk)
+        return self.drain()
+
+    def extract_frames(self) -> List[str]:
+        """
+        按花括号配对从缓冲区切出完整的 JSON 字符串，未完整的部分留在缓冲区
+
+        未完整帧的扫描进度（位置与嵌套深度）会保留下来，下一个 chunk 到达时接着扫描，
+        避免大帧被拆成多个 chunk 时每次都从帧首重新扫描
+        """
+        frames = []
+        buffer = self.buffer
+        # 未完整的帧总是位于缓冲区开头
+        start = 0
+        pos = self._scan_pos
+        depth = self._depth
+        while True:
+            if depth == 0:
+                # 找到下一帧的起点 {，帧之间的内容（换行等）直接跳过
+                start = buffer.find("{", pos)
+                if start == -1:
+                    break
+                pos = start
+
+            # 只在花括号处停下，跳过其余字符
+            end = -1
+            for match in _BRACE_RE.finditer(buffer, pos):
+                if match.group() == "{":
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        end = match.end()
+                        break
+
+            if end == -1:
+                # 没有找到完整的 JSON，记录进度等待更多数据
+                pos = len(buffer)
+                break
+
+            frames.append(buffer[start:end])
+            pos = end
+
+        # 一次性丢弃已切出的帧，只保留未完整的帧
+        if depth == 0:
+            self.buffer = ""
+            self._scan_pos = 0
+        else:
+            self.buffer = buffer[start:]
+            self._scan_pos = pos - start
+        self._depth = depth
+        return frames
+
+    def handle_frame(self, data: dict) -> List[str]:
+        """处理一个已解析的帧，返回其中的增量文本"""
+        deltas = []
+        # 处理 agent-inference 类型的消息（流式累积更新）
+        if data.get("type") == "agent-inference":
+            for item in data.get("value", []):
+                if item.get("type") == "text":
+                    clean_content = strip_lang_tags(item.get("content", ""))
+                    # 计算增量
+                    if clean_content and len(clean_content) > len(self.last_text_content):
+                        deltas.append(clean_content[len(self.last_text_content):])
+                        self.last_text_content = clean_content
+
+        # 格式1: 处理 record-map 类型的数据（兜底，通常包含最终完整响应）
+        elif data.get("type") == "record-map" and "recordMap" in data:
+            record_map = data["recordMap"]
+            for msg_data in record_map.get("thread_message", {}).values():
+                step = msg_data.get("value", {}).get("value", {}).get("step", {})
+                if not step:
+                    continue
+
+                content = ""
+                if step.get("type") == "agent-inference":
+                    agent_values = step.get("value", [])
+                    if isinstance(agent_values, list):
+                        for item in agent_values:
+                            if isinstance(item, dict) and item.get("type") == "text":
+                                content = item.get("content", "")
+                                break
+
+                if content and isinstance(content, str):
+                    # 如果之前流式已经发送了部分，这里只发送剩余的
+                    if len(content) > len(self.last_text_content):
+                        deltas.append(content[len(self.last_text_content):])
+                        self.last_text_content = content
+                    # 标记已获取完整内容
+                    self.full_content = content
+                    break
+
+        # 格式2: 处理 patch 类型的消息（旧版协议）
+        elif data.get("type") == "patch" and "v" in data:
+            for op in data.get("v", []):
+                if op.get("o") == "x" and "/value/" in op.get("p", ""):
+                    # Patch 通常是增量的，直接发送
+                    val = op.get("v", "")
+                    if val:
+                        deltas.append(val)
+        return deltas
+
+
+class NotionAIProvider(BaseProvider):
+    def __init__(self, scraper=None):
+        # scraper 可替换为 ReplayTransport 等实现相同接口的对象
+        self.scraper = scraper or self._create_scraper()
+        self.base_url = settings.NOTION_BASE_URL.rstrip("/")
+        self.models = ModelRegistry(self.fetch_available_models)
+        self.router = ModelRouter(model_health, self.models.resolve)
+        self.prober = ModelProber(model_health, self.probe_model, lambda: settings.MODEL_MAP.values())
+        self.token_validator = TokenValidator(credential_store, self.check_token)
+        # 后台校验确认失效时提前开始从浏览器恢复（未开启 CREDENTIAL_RECOVERY 时不做任何事）
+        self.token_validator.add_expired_listener(credential_recovery.trigger)
         self._warmup_session()
     
-    def _get_headers(self):
-        """动态获取请求头（使用最新的 settings）"""
-        return {
-            "Content-Type": "application/json",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Accept": "application/json",
-            "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-            "Notion-Client-Version": "23.13.0.1",
-            "x-notion-active-user-header": settings.NOTION_USER_ID,
-            "x-notion-space-id": settings.NOTION_SPACE_ID,
-        }
+    def _create_scraper(self):
+        if settings.REPLAY_CAPTURE:
+            logger.warning(f"回放模式：上游响应来自录制文件 {settings.REPLAY_CAPTURE}（速度 x{settings.REPLAY_SPEED}）")
+            return ReplayTransport(settings.REPLAY_CAPTURE, settings.REPLAY_SPEED)
+        return cloudscraper.create_scraper()
+
+    def _get_headers(self, creds: Optional[Credentials] = None):
+        """请求头（默认取当前凭证快照）"""
+        return dict((creds or credential_store.current).headers)
     
-    def _get_cookies(self):
-        """动态获取 Cookies（使用最新的 settings）"""
-        return {"token_v2": settings.NOTION_COOKIE}
+    def _get_cookies(self, creds: Optional[Credentials] = None):
+        """Cookies（默认取当前凭证快照）"""
+        return dict((creds or credential_store.current).cookies)
 
     def _warmup_session(self):
         """预热会话，建立 Cloudflare 信任"""
@@ -54,8 +231,61 @@ class NotionAIProvider:
         except Exception as e:
             logger.error(f"会话预热失败: {e}")
 
+    def fetch_available_models(self) -> List[str]:
+        """查询当前空间在 Notion 可用的模型 id（同步请求，由模型注册表在线程中调用）"""
+        creds = credential_store.current
+        response = self.scraper.post(
+            f"{self.base_url}/api/v3/getAvailableModels",
+            headers=self._get_headers(creds),
+            cookies=self._get_cookies(creds),
+            json={"spaceId": creds.space_id},
+            timeout=15,
+        )
+        response.raise_for_status()
+        return parse_available_models(response.json())
+
+    def check_token(self, creds: Credentials) -> bool:
+        """用轻量的认证请求校验凭证（同步请求，由 Token 校验器在线程中调用），被拒绝（401/403）时返回 False"""
+        response = self.scraper.post(
+            f"{self.base_url}/api/v3/getSpaces",
+            headers=self._get_headers(creds),
+            cookies=self._get_cookies(creds),
+            json={},
+            timeout=15,
+        )
+        if response.status_code in [401, 403]:
+            return False
+        response.raise_for_status()
+        return True
+
+    def probe_model(self, notion_model: str):
+        """向模型发送最小的推理请求并读完响应（同步，由探测器在线程中调用），成败由 _iter_deltas 记录"""
+        async def consume():
+            trace = tracer.start_trace("model_probe")
+            try:
+                async for _ in self._iter_deltas(PROBE_MESSAGES, notion_model, "workflow", trace, probe=True):
+                    pass
+            finally:
+                tracer.finish(trace)
+
+        asyncio.run(consume())
+
+    def session_stats(self) -> dict:
+        """cloudscraper 会话状态（用于内存诊断）"""
+        pools = 0
+        for adapter in self.scraper.adapters.values():
+            pool_manager = getattr(adapter, "poolmanager", None)
+            if pool_manager is not None:
+                pools += len(pool_manager.pools)
+        return {
+            "cookies": len(self.scraper.cookies),
+            "adapters": len(self.scraper.adapters),
+            "connection_pools": pools,
+        }
+
     async def _create_thread(self, thread_type: str = "workflow") -> str:
         """创建新的对话线程"""
+        creds = credential_store.current
         thread_id = str(uuid.uuid4())
         logger.info(f"正在创建新的对话线程 (type: {thread_type})...")
 
@@ -64,21 +294,21 @@ class NotionAIProvider:
             "transactions": [
                 {
                     "id": str(uuid.uuid4()),
-                    "spaceId": settings.NOTION_SPACE_ID,
+                    "spaceId": creds.space_id,
                     "operations": [
                         {
                             "pointer": {
                                 "table": "thread",
                                 "id": thread_id,
-                                "spaceId": settings.NOTION_SPACE_ID,
+                                "spaceId": creds.space_id,
                             },
                             "command": "set",
                             "path": [],
                             "args": {
                                 "type": thread_type,
                                 "id": thread_id,
-                                "space_id": settings.NOTION_SPACE_ID,
-                                "parent_id": settings.NOTION_SPACE_ID,
+                                "space_id": creds.space_id,
+                                "parent_id": creds.space_id,
                                 "parent_table": "space",
                                 "alive": True,
                             },
@@ -91,8 +321,8 @@ class NotionAIProvider:
         try:
             response = self.scraper.post(
                 f"{self.base_url}/api/v3/saveTransactionsFanout",
-                headers=self._get_headers(),
-                cookies=self._get_cookies(),
+                headers=self._get_headers(creds),
+                cookies=self._get_cookies(creds),
                 json=payload,
                 timeout=30,
             )
@@ -101,7 +331,7 @@ class NotionAIProvider:
             if response.status_code in [401, 403]:
                 logger.error(f"Token 失效，状态码: {response.status_code}")
                 logger.error(f"响应内容: {response.text[:500]}")
-                notify_token_expired()
+                self.token_validator.report_rejected(creds)
                 raise TokenExpiredError("Notion Token 已失效，请更新 token_v2")
             
             response.raise_for_status()
@@ -119,14 +349,14 @@ class NotionAIProvider:
                 # 检查是否是认证错误
                 if e.response.status_code in [401, 403]:
                     logger.error("检测到认证失败，Token 可能已失效")
-                    notify_token_expired()
+                    self.token_validator.report_rejected(creds)
                     raise TokenExpiredError("Notion Token 已失效，请更新 token_v2")
             
             # 检查错误消息中是否包含认证相关关键词
             error_msg = str(e).lower()
             if any(keyword in error_msg for keyword in ["401", "403", "unauthorized", "forbidden", "authentication"]):
                 logger.error("错误消息中检测到认证失败标识")
-                notify_token_expired()
+                self.token_validator.report_rejected(creds)
                 raise TokenExpiredError("Notion Token 已失效，请更新 token_v2")
             
             raise Exception("无法创建新的对话线程。")
@@ -137,9 +367,12 @@ class NotionAIProvider:
         model: str = "apple-danish",
         stream: bool = True,
         thread_type: str = "workflow",
+        trace: Optional[RequestTrace] = None,
+        include_usage: bool = False,
+        routes: Optional[List[Route]] = None,
     ) -> AsyncGenerator[str, None]:
         """流式聊天接口"""
-        async for chunk in self.stream_generator(messages, model, thread_type):
+        async for chunk in self.stream_generator(messages, model, thread_type, trace, include_usage, routes):
             yield chunk
 
     async def stream_generator(
@@ -147,21 +380,156 @@ class NotionAIProvider:
         messages: list,
         model: str,
         thread_type: str = "workflow",
+        trace: Optional[RequestTrace] = None,
+        include_usage: bool = False,
+        routes: Optional[List[Route]] = None,
+    ) -> AsyncGenerator[str, None]:
+        """
+        生成流式响应，include_usage 时在结束前额外发送一个携带 usage 的数据块
+        routes 为路由候选（未指定时直接请求 model 对应的 Notion 模型），数据块的 model 字段为实际响应的模型
+        """
+        if trace is None:
+            trace = tracer.start_trace("stream_generator")
+        routes = routes or [Route(model, model)]
+        prompt_tokens = token_estimator.count_messages(messages)
+        completion = CompletionCounter()
+        timing_sent = False
+        try:
+            async for delta in self._iter_routed(messages, routes, thread_type, trace):
+                if not timing_sent:
+                    # 首个数据块前以 SSE 注释下发耗时，此时上游连接与首字节耗时均已确定
+                    timing_sent = True
+                    yield self._format_sse_timing(trace)
+                completion.add(delta)
+                yield self._format_sse_chunk(delta, include_usage, trace.attrs["served_model"])
+
+            if not timing_sent:
+                yield self._format_sse_timing(trace)
+            if include_usage:
+                yield self._format_sse_usage(build_usage(prompt_tokens, completion.tokens), trace.attrs["served_model"])
+            # 发送结束标记
+            yield "data: [DONE]\n\n"
+
+        except Exception as e:
+            logger.error(f"处理 Notion AI 流时发生意外错误: {e}")
+            import traceback
+            traceback.print_exc()
+            trace.set(error=str(e))
+            if not timing_sent:
+                yield self._format_sse_timing(trace)
+            yield self._format_sse_error(str(e))
+        finally:
+            self._record_usage(trace, model, prompt_tokens, completion.tokens)
+            tracer.finish(trace)
+
+    async def _collect_completion(
+        self,
+        messages: list,
+        routes: List[Route],
+        thread_type: str,
+        trace: RequestTrace,
+    ) -> str:
+        """非流式请求：收集完整回复文本"""
+        parts = []
+        async for delta in self._iter_routed(messages, routes, thread_type, trace):
+            parts.append(delta)
+        return "".join(parts)
+
+    async def _iter_routed(
+        self,
+        messages: list,
+        routes: List[Route],
+        thread_type: str,
+        trace: RequestTrace,
+    ) -> AsyncGenerator[str, None]:
+        """
+        依次尝试路由候选：某个候选在产出首个文本前失败（或未返回任何文本）时换用下一个，
+        已开始输出后不再切换。当前响应的客户端模型名记录在 trace 的 served_model 中
+        """
+        requested = trace.attrs.get("model_label", routes[0].model)
+        for index, route in enumerate(routes):
+            trace.set(served_model=route.model)
+            is_last = index == len(routes) - 1
+            started = False
+            try:
+                async for delta in self._iter_recovering(messages, route.notion_model, thread_type, trace):
+                    started = True
+                    yield delta
+            except TokenExpiredError:
+                # 凭证失效时换模型也无济于事
+                raise
+            except Exception as e:
+                if started or is_last:
+                    raise
+                self.router.record_fallback(requested, routes[index + 1].model, "error", f"{route.model} 请求失败: {e}")
+                continue
+            if started or is_last:
+                return
+            self.router.record_fallback(requested, routes[index + 1].model, "error", f"{route.model} 未返回任何文本")
+
+    async def _iter_recovering(
+        self,
+        messages: list,
+        model: str,
+        thread_type: str,
+        trace: RequestTrace,
+    ) -> AsyncGenerator[str, None]:
+        """Token 失效时暂缓请求等待凭证恢复（CREDENTIAL_RECOVERY），取得新凭证后重试一次"""
+        creds = credential_store.current
+        started = False
+        try:
+            async for delta in self._iter_deltas(messages, model, thread_type, trace, creds):
+                started = True
+                yield delta
+            return
+        except TokenExpiredError:
+            if started:
+                raise
+            renewed = await credential_recovery.hold(creds)
+            if renewed is None:
+                raise
+        logger.info(f"凭证已更新（版本 {renewed.version}），重试请求")
+        trace.set(credentials_recovered=True)
+        async for delta in self._iter_deltas(messages, model, thread_type, trace, renewed):
+            yield delta
+
+    async def _iter_deltas(
+        self,
+        messages: list,
+        model: str,
+        thread_type: str,
+        trace: RequestTrace,
+        creds: Optional[Credentials] = None,
+        probe: bool = False,
     ) -> AsyncGenerator[str, None]:
-        """生成流式响应"""
+        """
+        请求 Notion AI 并逐个产出增量文本，出错时直接抛出异常。
+        probe 为 True 时是健康探测：不创建、不保存 Notion 线程，也不登记到进行中的流与抓包中
+        """
+        trace.set(model=model, messages=len(messages))
+        stats = StreamStats(trace.trace_id, model) if probe else stream_tracker.open(trace.trace_id, model)
+        capture = None
+        response = None
+        # 首个增量文本相对请求发出的耗时，用于模型健康统计
+        ttfb = None
+        # 整个请求使用同一份凭证快照，期间热更新不影响本请求
+        creds = creds or credential_store.current
+        trace.set(credentials_version=creds.version)
         try:
             # 构建 transcript
-            transcript = self._build_transcript(messages, model, thread_type)
+            with trace.span("build_transcript"):
+                transcript = self._build_transcript(messages, model, thread_type, creds)
 
             payload = {
-                "traceId": str(uuid.uuid4()),
-                "spaceId": settings.NOTION_SPACE_ID,
+                # 复用请求的 trace id，便于与 Notion 侧日志对应
+                "traceId": trace.trace_id,
+                "spaceId": creds.space_id,
                 "transcript": transcript,
-                "createThread": True,  # 让 Notion 自动创建线程
+                "createThread": not probe,  # 让 Notion 自动创建线程（探测请求不在工作区留下线程）
                 "isPartialTranscript": True,
                 "asPatchResponse": True,
-                "generateTitle": True,
-                "saveAllThreadOperations": True,
+                "generateTitle": not probe,
+                "saveAllThreadOperations": not probe,
                 "threadType": thread_type,
             }
 
@@ -169,148 +537,102 @@ class NotionAIProvider:
             logger.info(f"请求 Notion AI URL: {url}")
             logger.info(f"请求体: {json.dumps(payload, indent=2, ensure_ascii=False)}")
 
-            response = self.scraper.post(
-                url,
-                headers=self._get_headers(),
-                cookies=self._get_cookies(),
-                json=payload,
-                stream=True,
-                timeout=120,
-            )
-            
+            capture = None if probe else capture_store.start(trace.trace_id, model, creds)
+            request_begin = time.perf_counter()
+            with trace.span("upstream_connect"):
+                response = self.scraper.post(
+                    url,
+                    headers=self._get_headers(creds),
+                    cookies=self._get_cookies(creds),
+                    json=payload,
+                    stream=True,
+                    timeout=120,
+                )
+            trace.set(upstream_status=response.status_code)
+            if capture is not None:
+                capture.set_response(response.status_code, response.headers)
+        
             # 检测 Token 失效
             if response.status_code in [401, 403]:
                 logger.error(f"Token 失效，状态码: {response.status_code}")
-                notify_token_expired()
+                self.token_validator.report_rejected(creds)
                 raise TokenExpiredError("Notion Token 已失效，请更新 token_v2")
-            
+        
             response.raise_for_status()
 
-            full_content = ""
-            buffer = ""
-            last_text_content = ""
+            parser = NotionStreamParser()
+            # 本轮 chunk 解析出的增量，解析完成后统一发送，便于区分解析与写客户端耗时
+            pending = []
+            read_begin = time.perf_counter()
+
+            chunks = response.iter_content(chunk_size=None)
+            if capture is not None:
+                chunks = capture.wrap(chunks)
+
+            for chunk in chunks:
+                chunk_begin = time.perf_counter()
+                if "upstream_first_byte" not in trace.marks:
+                    trace.mark("upstream_first_byte")
+                    trace.add_span("upstream_ttfb", read_begin, chunk_begin)
+                else:
+                    trace.add("upstream_read", chunk_begin - read_begin)
 
-            for chunk in response.iter_content(chunk_size=None):
                 if not chunk:
+                    read_begin = time.perf_counter()
                     continue
 
-                # 解码 bytes 为 str
-                chunk_str = chunk.decode('utf-8') if isinstance(chunk, bytes) else chunk
-                buffer += chunk_str
+                parser.append(chunk)
+                stats.update(len(chunk), parser.buffer, parser.last_text_content, parser.full_content)
+                pending.extend(parser.drain())
 
-                # 尝试解析 buffer 中的完整 JSON 对象
-                while buffer:
-                    # 找到第一个 { 的位置
-                    start = buffer.find("{")
-                    if start == -1:
-                        buffer = ""
-                        break
+                trace.add("parse", time.perf_counter() - chunk_begin)
 
-                    # 尝试找到匹配的 }
-                    depth = 0
-                    end = -1
-                    for i in range(start, len(buffer)):
-                        if buffer[i] == "{":
-                            depth += 1
-                        elif buffer[i] == "}":
-                            depth -= 1
-                            if depth == 0:
-                                end = i + 1
-                                break
+                if pending:
+                    write_begin = time.perf_counter()
+                    if ttfb is None:
+                        ttfb = write_begin - request_begin
+                    for delta in pending:
+                        yield delta
+                    pending.clear()
+                    trace.add("client_write", time.perf_counter() - write_begin)
 
-                    if end == -1:
-                        # 没有找到完整的 JSON，等待更多数据
-                        buffer = buffer[start:]
-                        break
+                read_begin = time.perf_counter()
 
-                    json_str = buffer[start:end]
-                    buffer = buffer[end:]
-
-                    try:
-                        data = json.loads(json_str)
-                        
-                        # 处理 agent-inference 类型的消息（流式累积更新）
-                        if data.get("type") == "agent-inference":
-                            value_list = data.get("value", [])
-                            for item in value_list:
-                                if item.get("type") == "text":
-                                    raw_content = item.get("content", "")
-                                    
-                                    # 处理开头未闭合的 <lang> 标签，防止输出乱码
-                                    if raw_content.lstrip().startswith("<lang") and "/>" not in raw_content and ">" not in raw_content:
-                                        clean_content = ""
-                                    else:
-                                        # 过滤掉 <lang> 标签
-                                        clean_content = re.sub(r'<lang[^>]*/>', '', raw_content)
-                                        clean_content = re.sub(r'<lang[^>]*>', '', clean_content) # 过滤残留
-                                        
-                                    if clean_content:
-                                        # 计算增量
-                                        if len(clean_content) > len(last_text_content):
-                                            delta = clean_content[len(last_text_content):]
-                                            last_text_content = clean_content
-                                            yield self._format_sse_chunk(delta)
-
-                        # 格式1: 处理 record-map 类型的数据（兜底，通常包含最终完整响应）
-                        elif data.get("type") == "record-map" and "recordMap" in data:
-                            record_map = data["recordMap"]
-                            if "thread_message" in record_map:
-                                for msg_id, msg_data in record_map["thread_message"].items():
-                                    value_data = msg_data.get("value", {}).get("value", {})
-                                    step = value_data.get("step", {})
-                                    if not step:
-                                        continue
-                                    
-                                    content = ""
-                                    step_type = step.get("type")
-                                    
-                                    if step_type == "agent-inference":
-                                        agent_values = step.get("value", [])
-                                        if isinstance(agent_values, list):
-                                            for item in agent_values:
-                                                if isinstance(item, dict) and item.get("type") == "text":
-                                                    content = item.get("content", "")
-                                                    break
-                                    
-                                    if content and isinstance(content, str):
-                                        # 如果之前流式已经发送了部分，这里只发送剩余的
-                                        if len(content) > len(last_text_content):
-                                            delta = content[len(last_text_content):]
-                                            last_text_content = content
-                                            yield self._format_sse_chunk(delta)
-                                        # 标记已获取完整内容
-                                        full_content = content
-                                        break
-                        
-                        # 格式2: 处理 patch 类型的消息（旧版协议）
-                        elif data.get("type") == "patch" and "v" in data:
-                             for op in data.get("v", []):
-                                if op.get("o") == "x" and "/value/" in op.get("p", ""):
-                                    # Patch 通常是增量的，直接发送
-                                    val = op.get("v", "")
-                                    if val:
-                                        yield self._format_sse_chunk(val)
-
-
-                    except json.JSONDecodeError:
-                        continue
-
-            if full_content:
-                logger.info(f"成功提取响应内容，长度: {len(full_content)} 字符")
+            trace.set(output_chars=len(parser.last_text_content))
+            if parser.full_content:
+                logger.info(f"成功提取响应内容，长度: {len(parser.full_content)} 字符")
             else:
                 logger.warning("警告: Notion 返回的数据流中未提取到任何有效文本。请检查您的 .env 配置是否全部正确且凭证有效。")
 
-            # 发送结束标记
-            yield "data: [DONE]\n\n"
-
+            if ttfb is not None:
+                model_health.record_success(model, ttfb)
+            else:
+                model_health.record_failure(model, "上游未返回任何文本")
+        except TokenExpiredError:
+            # 凭证问题与模型无关，不计入模型健康
+            raise
         except Exception as e:
-            logger.error(f"处理 Notion AI 流时发生意外错误: {e}")
-            import traceback
-            traceback.print_exc()
-            yield self._format_sse_error(str(e))
-
-    def _build_transcript(self, messages: list, model: str, thread_type: str) -> list:
+            # 429 为账号级限流，同样与模型无关
+            if getattr(getattr(e, "response", None), "status_code", None) != 429:
+                model_health.record_failure(model, str(e))
+            raise
+        finally:
+            if response is not None:
+                # 客户端提前断开时及时释放上游连接
+                response.close()
+            stream_tracker.close(stats)
+            if capture is not None:
+                capture_store.save(capture)
+
+    def _build_transcript(
+        self,
+        messages: list,
+        model: str,
+        thread_type: str,
+        creds: Optional[Credentials] = None,
+    ) -> list:
         """构建 Notion AI 的 transcript 格式"""
+        creds = creds or credential_store.current
         now = datetime.now(timezone.utc).astimezone()
         timestamp = now.isoformat()
 
@@ -329,11 +651,11 @@ class NotionAIProvider:
                 "type": "context",
                 "value": {
                     "timezone": "Asia/Shanghai",
-                    "spaceId": settings.NOTION_SPACE_ID,
-                    "userId": settings.NOTION_USER_ID,
-                    "userEmail": settings.NOTION_USER_EMAIL if hasattr(settings, 'NOTION_USER_EMAIL') else "",
+                    "spaceId": creds.space_id,
+                    "userId": creds.user_id,
+                    "userEmail": creds.user_email,
                     "currentDatetime": timestamp,
-                    "userName": settings.NOTION_USER_NAME if hasattr(settings, 'NOTION_USER_NAME') else "User",
+                    "userName": creds.user_name,
                     "surface": "workflows",
                 },
             },
@@ -350,7 +672,7 @@ class NotionAIProvider:
                         "id": str(uuid.uuid4()),
                         "type": "user",
                         "value": [[content]],
-                        "userId": settings.NOTION_USER_ID,
+                        "userId": creds.user_id,
                         "createdAt": timestamp,
                     }
                 )
@@ -365,13 +687,23 @@ class NotionAIProvider:
 
         return transcript
 
-    def _format_sse_chunk(self, content: str) -> str:
-        """格式化为 OpenAI SSE 格式"""
+    def _record_usage(self, trace: RequestTrace, model: str, prompt_tokens: int, completion_tokens: int):
+        """用量写入 trace 并按模型（客户端请求的名称，未知的归入 other）与 Key 汇总"""
+        trace.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        record_usage(
+            trace.attrs.get("model_label", model),
+            trace.attrs.get("api_key", "anonymous"),
+            prompt_tokens,
+            completion_tokens,
+        )
+
+    def _format_sse_chunk(self, content: str, include_usage: bool = False, model: str = "notion-ai") -> str:
+        """格式化为 OpenAI SSE 格式（include_usage 时与 OpenAI 一致，普通数据块带 usage: null）"""
         data = {
             "id": f"chatcmpl-{uuid.uuid4().hex[:8]}",
             "object": "chat.completion.chunk",
             "created": int(datetime.now().timestamp()),
-            "model": "notion-ai",
+            "model": model,
             "choices": [
                 {
                     "index": 0,
@@ -380,8 +712,26 @@ class NotionAIProvider:
                 }
             ],
         }
+        if include_usage:
+            data["usage"] = None
+        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    def _format_sse_usage(self, usage: dict, model: str = "notion-ai") -> str:
+        """stream_options.include_usage 要求的最后一个数据块：choices 为空，携带整个请求的 usage"""
+        data = {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:8]}",
+            "object": "chat.completion.chunk",
+            "created": int(datetime.now().timestamp()),
+            "model": model,
+            "choices": [],
+            "usage": usage,
+        }
         return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
 
+    def _format_sse_timing(self, trace: RequestTrace) -> str:
+        """以 SSE 注释行下发 Server-Timing（客户端 SDK 会忽略注释行）"""
+        return f": server-timing: {trace.server_timing()}\n\n"
+
     def _format_sse_error(self, error: str) -> str:
         """格式化错误为 SSE"""
         data = {
@@ -394,39 +744,140 @@ class NotionAIProvider:
 
     async def chat_completion(self, request_data: dict):
         """处理聊天完成请求（main.py 调用的接口）"""
-        from fastapi.responses import StreamingResponse
+        from fastapi.responses import JSONResponse, StreamingResponse
         
         messages = request_data.get("messages", [])
         model = request_data.get("model", settings.DEFAULT_MODEL)
         stream = request_data.get("stream", True)
+        include_usage = bool((request_data.get("stream_options") or {}).get("include_usage"))
+        
+        # 沿用 main.py 创建的请求 trace
+        trace = current_trace.get() or tracer.start_trace("chat_completion")
+        # 指标标签只使用已知的模型名，未知的名称归入 other，避免客户端随意填写的模型名使标签基数失控
+        trace.set(requested_model=model, model_label=model if self.models.is_known(model) else "other")
+        
+        # 后台校验已确认当前 Token 失效时直接失败（开启凭证恢复时先等待恢复结果），不再等待上游返回 401
+        creds = credential_store.current
+        if self.token_validator.is_expired(creds) and await credential_recovery.hold(creds) is None:
+            message = "Notion Token 已失效，请更新 token_v2"
+            trace.set(error=message)
+            tracer.finish(trace)
+            return JSONResponse(
+                status_code=503,
+                content={"error": {"message": message, "type": "token_expired", "code": "token_expired"}},
+            )
+        
+        # 按回退链与健康统计选择模型（未映射但 Notion 提供的模型 id 原样使用）
+        routes = self.router.route(model)
         
-        # 模型映射
-        notion_model = settings.MODEL_MAP.get(model, "apple-danish")
-        logger.info(f"收到聊天请求，模型: {model} -> {notion_model}")
+        # 请求的模型及其回退模型均已知不可用时直接失败，不再走一遍上游
+        if not routes:
+            rejection = model_health.reject(self.models.resolve(model))
+            message = (
+                f"模型 {model} 当前不可用（最近错误: {rejection['last_error']}），"
+                f"请 {rejection['retry_after']} 秒后重试或换用其他模型"
+            )
+            trace.set(error=message)
+            tracer.finish(trace)
+            return JSONResponse(
+                status_code=503,
+                content={"error": {"message": message, "type": "model_unavailable", "code": "model_unavailable"}},
+                headers={"Retry-After": str(rejection["retry_after"])},
+            )
+        
+        served = routes[0]
+        logger.info(f"收到聊天请求，模型: {model} -> {served.model} ({served.notion_model})")
+        if served.model != model:
+            requested_route = next((route for route in routes if route.model == model), None)
+            self.router.record_fallback(
+                trace.attrs["model_label"], served.model, "unhealthy",
+                requested_route.degraded if requested_route else f"{model} 当前不可用",
+            )
+        trace.set(served_model=served.model)
         
-        # 返回流式响应
+        # 实际响应的模型（流式响应为首选模型，以数据块中的 model 字段为准）
+        extra_headers = {"X-Served-Model": quote(served.model)}
+        # 超出上下文预算时压缩历史，压缩情况通过响应头告知客户端
+        with trace.span("compact_context"):
+            report = compact_messages(messages, model, trace.attrs["model_label"])
+        if report.compacted:
+            messages = report.messages
+            trace.set(**report.to_dict())
+            extra_headers["X-Context-Compaction"] = report.header_value()
+        
+        if not stream:
+            return await self._completion_response(messages, routes, trace, extra_headers)
+        
+        # 返回流式响应（此时只有排队耗时已知，其余耗时随首个 SSE 注释下发）
         return StreamingResponse(
-            self.stream_chat(messages, notion_model, stream),
+            self.stream_chat(
+                messages, served.notion_model, stream, trace=trace, include_usage=include_usage, routes=routes
+            ),
             media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
                 "Connection": "keep-alive",
                 "X-Accel-Buffering": "no",
+                "Server-Timing": trace.server_timing(),
+                **extra_headers,
             }
         )
+
+    async def _completion_response(
+        self,
+        messages: list,
+        routes: List[Route],
+        trace: RequestTrace,
+        extra_headers: Optional[dict] = None,
+    ):
+        """非流式响应：返回完整的 chat.completion（含 usage），耗时通过 Server-Timing 头下发"""
+        from fastapi.responses import JSONResponse
+
+        prompt_tokens = token_estimator.count_messages(messages)
+        try:
+            content = await self._collect_completion(messages, routes, "workflow", trace)
+        except Exception as e:
+            logger.error(f"处理 Notion AI 非流式请求时发生错误: {e}")
+            trace.set(error=str(e))
+            self._record_usage(trace, routes[0].model, prompt_tokens, 0)
+            headers = {"Server-Timing": trace.server_timing(include_total=True), **(extra_headers or {})}
+            tracer.finish(trace)
+            return JSONResponse(
+                status_code=502,
+                content={"error": {"message": str(e), "type": "server_error"}},
+                headers=headers,
+            )
+
+        completion_tokens = estimate_text(content)
+        served_model = trace.attrs["served_model"]
+        self._record_usage(trace, served_model, prompt_tokens, completion_tokens)
+        headers = {
+            "Server-Timing": trace.server_timing(include_total=True),
+            **(extra_headers or {}),
+            "X-Served-Model": quote(served_model),
+        }
+        tracer.finish(trace)
+        return JSONResponse(
+            content={
+                "id": f"chatcmpl-{uuid.uuid4().hex[:8]}",
+                "object": "chat.completion",
+                "created": int(datetime.now().timestamp()),
+                "model": served_model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": build_usage(prompt_tokens, completion_tokens),
+            },
+            headers=headers,
+        )
     
     async def get_models(self):
-        """获取可用模型列表（main.py 调用的接口）"""
-        models = []
-        for model_name in settings.KNOWN_MODELS:
-            models.append({
-                "id": model_name,
-                "object": "model",
-                "created": int(datetime.now().timestamp()),
-                "owned_by": "notion-ai",
-            })
-        
+        """获取可用模型列表（/v1/models 直接使用 self.models.listing 的预序列化响应体）"""
         return {
             "object": "list",
-            "data": models
+            "data": self.models.listing.data
         }
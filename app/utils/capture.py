@@ -0,0 +1,288 @@
+"""
+上游流量录制与回放模块
+录制：把 Notion 返回的原始字节连同到达时间写入 .ncap 文件（凭证脱敏）；
+回放：ReplayTransport 代替 cloudscraper 会话，按录制时的节奏（或加速）把数据喂回同一条解析路径，
+从而在没有网络的情况下稳定复现线上的性能问题
+
+.ncap 文件格式（整体 gzip 压缩）:
+    b"NCAP1\\n"
+    头部 JSON 一行（trace_id、模型、状态码、响应头、响应延迟等）
+    若干条记录: struct "<II"（相对请求发出时刻的微秒偏移、数据长度） + 数据
+"""
+import gzip
+import itertools
+import json
+import logging
+import random
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from requests.exceptions import HTTPError
+from requests.structures import CaseInsensitiveDict
+
+from app.core.config import settings
+from app.core.credentials import Credentials, credential_store
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"NCAP1\n"
+CAPTURE_SUFFIX = ".ncap"
+_RECORD = struct.Struct("<II")
+# 需要整体脱敏的响应头
+_SENSITIVE_HEADERS = {"set-cookie", "cookie", "authorization"}
+_REDACTED = "[redacted]"
+
+
+def _secrets(creds: Optional[Credentials] = None) -> List[bytes]:
+    """请求所用凭证快照（未指定时为当前凭证）中的 token、space/user id、邮箱，录制时全部脱敏"""
+    creds = creds or credential_store.current
+    values = [creds.cookie, creds.space_id, creds.user_id, creds.user_email]
+    return [v.encode("utf-8") for v in values if v and len(v) >= 4]
+
+
+def redact(data: bytes, secrets: Iterable[bytes]) -> bytes:
+    """用等长的 * 替换凭证，保持长度不变，以便按原 chunk 边界重新切分"""
+    for secret in secrets:
+        data = data.replace(secret, b"*" * len(secret))
+    return data
+
+
+class Capture:
+    """一次上游响应的录制内容"""
+
+    def __init__(self, header: Dict[str, Any], records: List[Tuple[int, bytes]]):
+        self.header = header
+        # (相对请求发出时刻的微秒偏移, chunk 数据)
+        self.records = records
+
+    @property
+    def status(self) -> int:
+        return self.header.get("status", 200)
+
+    @property
+    def model(self) -> str:
+        return self.header.get("model", "apple-danish")
+
+    @property
+    def body(self) -> bytes:
+        return b"".join(data for _, data in self.records)
+
+    def dump(self, path: Path):
+        with gzip.open(path, "wb") as f:
+            f.write(MAGIC)
+            f.write(json.dumps(self.header, ensure_ascii=False).encode("utf-8") + b"\n")
+            for offset_us, data in self.records:
+                f.write(_RECORD.pack(offset_us, len(data)))
+                f.write(data)
+
+
+def load_capture(path) -> Capture:
+    """读取 .ncap 文件"""
+    with gzip.open(path, "rb") as f:
+        if f.readline() != MAGIC:
+            raise ValueError(f"不是有效的录制文件: {path}")
+        header = json.loads(f.readline())
+        records = []
+        while True:
+            head = f.read(_RECORD.size)
+            if len(head) < _RECORD.size:
+                break
+            offset_us, length = _RECORD.unpack(head)
+            records.append((offset_us, f.read(length)))
+    return Capture(header, records)
+
+
+def capture_files(path) -> List[Path]:
+    """单个文件或目录下的全部 .ncap 文件（按文件名排序）"""
+    path = Path(path)
+    if path.is_dir():
+        return sorted(path.glob(f"*{CAPTURE_SUFFIX}"))
+    return [path]
+
+
+class StreamCapture:
+    """录制进行中的一次上游请求"""
+
+    def __init__(self, trace_id: str, model: str, creds: Optional[Credentials] = None):
+        self.trace_id = trace_id
+        self.model = model
+        # 请求实际使用的凭证快照，保存时据此脱敏，期间凭证热更新也不会漏掉
+        self.creds = creds
+        self.started_at = time.time()
+        self._begin = time.perf_counter()
+        self.status: Optional[int] = None
+        self.headers: Dict[str, str] = {}
+        self.response_us = 0
+        self.records: List[Tuple[int, bytes]] = []
+
+    def _offset_us(self) -> int:
+        return int((time.perf_counter() - self._begin) * 1_000_000)
+
+    def set_response(self, status: int, headers):
+        """收到响应头时调用"""
+        self.response_us = self._offset_us()
+        self.status = status
+        self.headers = dict(headers or {})
+
+    def wrap(self, chunks: Iterable) -> Iterator:
+        """包装 iter_content，记录每个 chunk 及其到达时间"""
+        for chunk in chunks:
+            if chunk:
+                data = chunk if isinstance(chunk, bytes) else chunk.encode("utf-8")
+                self.records.append((self._offset_us(), data))
+            yield chunk
+
+    def to_capture(self, secrets: List[bytes]) -> Capture:
+        """脱敏后生成 Capture：整体替换后按原边界切分，避免凭证恰好被拆在两个 chunk 之间"""
+        body = redact(b"".join(data for _, data in self.records), secrets)
+        records = []
+        pos = 0
+        for offset_us, data in self.records:
+            records.append((offset_us, body[pos:pos + len(data)]))
+            pos += len(data)
+
+        headers = {}
+        for name, value in self.headers.items():
+            if name.lower() in _SENSITIVE_HEADERS:
+                headers[name] = _REDACTED
+            else:
+                headers[name] = redact(value.encode("utf-8"), secrets).decode("utf-8", "replace")
+
+        header = {
+            "version": 1,
+            "trace_id": self.trace_id,
+            "model": self.model,
+            "started_at": self.started_at,
+            "status": self.status,
+            "headers": headers,
+            "response_us": self.response_us,
+            "chunks": len(records),
+            "bytes": len(body),
+        }
+        return Capture(header, records)
+
+
+class CaptureStore:
+    """按 CAPTURE_DIR / CAPTURE_SAMPLE_RATE 录制上游响应，后台线程写盘"""
+
+    def __init__(self):
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(settings.CAPTURE_DIR)
+
+    def start(self, trace_id: str, model: str, creds: Optional[Credentials] = None) -> Optional[StreamCapture]:
+        """未开启或未命中采样时返回 None"""
+        if not self.enabled:
+            return None
+        rate = settings.CAPTURE_SAMPLE_RATE
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return None
+        return StreamCapture(trace_id, model, creds)
+
+    def save(self, capture: StreamCapture):
+        """提交到后台线程写盘，避免压缩大响应时阻塞事件循环"""
+        directory = settings.CAPTURE_DIR
+        if not directory:
+            return
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="capture-writer")
+        self._executor.submit(self._write, capture, Path(directory), _secrets(capture.creds))
+
+    def _write(self, capture: StreamCapture, directory: Path, secrets: List[bytes]):
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(capture.started_at))
+        path = directory / f"{stamp}_{capture.trace_id}{CAPTURE_SUFFIX}"
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            capture.to_capture(secrets).dump(path)
+            logger.info(f"已录制上游响应: {path}")
+            self._rotate(directory)
+        except OSError as e:
+            logger.error(f"写入录制文件失败: {e}")
+
+    def _rotate(self, directory: Path):
+        """只保留最新的 CAPTURE_MAX_FILES 个录制文件"""
+        files = sorted(directory.glob(f"*{CAPTURE_SUFFIX}"), key=lambda p: p.stat().st_mtime)
+        for path in files[:max(0, len(files) - settings.CAPTURE_MAX_FILES)]:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+
+class ReplayResponse:
+    """回放的响应，接口与 requests.Response 中被用到的部分一致"""
+
+    def __init__(self, capture: Capture, speed: float, begin: float):
+        self._capture = capture
+        self._speed = speed
+        self._begin = begin
+        self.status_code = capture.status
+        self.headers = CaseInsensitiveDict(capture.header.get("headers", {}))
+
+    def _wait_until(self, offset_us: int):
+        if self._speed <= 0:
+            return
+        delay = self._begin + offset_us / 1_000_000 / self._speed - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    def iter_content(self, chunk_size=None, decode_unicode=False):
+        """按录制时的 chunk 边界与到达节奏产出数据"""
+        for offset_us, data in self._capture.records:
+            self._wait_until(offset_us)
+            yield data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise HTTPError(f"{self.status_code} Error (replay)", response=self)
+
+    def close(self):
+        pass
+
+
+class ReplayTransport:
+    """
+    代替 cloudscraper 会话的回放传输层
+
+    每次推理请求按顺序轮流回放录制文件；speed=1 为原速，2 为两倍速，0 为不等待
+    """
+
+    def __init__(self, path, speed: float = 1.0):
+        self.files = capture_files(path)
+        if not self.files:
+            raise ValueError(f"没有找到录制文件: {path}")
+        self.captures = [load_capture(p) for p in self.files]
+        self.speed = speed
+        self._cycle = itertools.cycle(self.captures)
+        self._lock = threading.Lock()
+        # 与 requests.Session 保持一致，供 session_stats 使用
+        self.adapters: Dict[str, Any] = {}
+        self.cookies: Dict[str, str] = {}
+
+    def _empty(self, status: int = 200) -> ReplayResponse:
+        return ReplayResponse(Capture({"status": status}, [(0, b"{}")]), 0, time.perf_counter())
+
+    def get(self, url, **kwargs) -> ReplayResponse:
+        return self._empty()
+
+    def post(self, url, **kwargs) -> ReplayResponse:
+        if not url.endswith("/runInferenceTranscript"):
+            return self._empty()
+        with self._lock:
+            capture = next(self._cycle)
+        begin = time.perf_counter()
+        response = ReplayResponse(capture, self.speed, begin)
+        response._wait_until(capture.header.get("response_us", 0))
+        return response
+
+
+# 全局实例
+capture_store = CaptureStore()
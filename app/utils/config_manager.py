@@ -1,10 +1,14 @@
 """
 配置持久化管理模块
 使用 JSON 格式存储配置，支持自动加载和保存
+写入为原子操作，短时间内的多次修改合并为一次写盘；读取按文件 mtime 与大小缓存
 """
-import json
+import atexit
+import threading
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+from app.utils.json_store import file_signature, read_json_cached, write_json_atomic
 
 # 配置目录和文件
 CONFIG_DIR = Path.home() / ".notion-ai-proxy"
@@ -17,17 +21,33 @@ DEFAULT_CONFIG = {
     "user_id": "",
     "port": "8088",
     "auto_start": False,
-    "log_level": "INFO"
+    "log_level": "INFO",
+    # GUI 运行日志保留的最大行数
+    "log_max_lines": 2000,
+    # 服务的 worker 进程数，0 表示按 CPU 核数自动选择
+    "workers": 0
 }
 
+# set/update 后延迟写盘的时间（秒），期间的修改合并为一次写入
+SAVE_DEBOUNCE_SECONDS = 0.3
+
 
 class ConfigManager:
     """配置管理器"""
     
-    def __init__(self):
+    def __init__(self, path: Path = CONFIG_FILE, debounce: float = SAVE_DEBOUNCE_SECONDS):
         """初始化配置管理器"""
-        CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.debounce = debounce
+        self._lock = threading.RLock()
+        self._timer: Optional[threading.Timer] = None
+        # 内存中有尚未写盘的修改
+        self._dirty = False
+        self._signature = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
         self.config = self.load()
+        # 退出前写入尚未落盘的修改
+        atexit.register(self.flush)
     
     def load(self) -> Dict[str, Any]:
         """
@@ -36,38 +56,58 @@ class ConfigManager:
         Returns:
             配置字典
         """
-        if not CONFIG_FILE.exists():
-            # 配置文件不存在，返回默认配置
-            return DEFAULT_CONFIG.copy()
-        
+        merged_config = DEFAULT_CONFIG.copy()
         try:
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-            
-            # 合并默认配置（确保新增字段存在）
-            merged_config = DEFAULT_CONFIG.copy()
-            merged_config.update(config)
-            
-            return merged_config
+            config = read_json_cached(self.path)
         except Exception as e:
             print(f"加载配置文件失败: {e}")
-            return DEFAULT_CONFIG.copy()
+            return merged_config
+        
+        self._signature = file_signature(self.path)
+        if config:
+            # 合并默认配置（确保新增字段存在）
+            merged_config.update(config)
+        return merged_config
+    
+    def _refresh(self):
+        """文件被其他进程修改过（签名变化）且本地没有未写盘的修改时，重新加载"""
+        if not self._dirty and file_signature(self.path) != self._signature:
+            self.config = self.load()
     
     def save(self, config: Dict[str, Any] = None):
         """
-        保存配置到文件
+        立即保存配置到文件（原子写入）
         
         Args:
             config: 要保存的配置字典，如果为 None 则保存当前配置
         """
-        if config is not None:
-            self.config = config
-        
-        try:
-            with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            print(f"保存配置文件失败: {e}")
+        with self._lock:
+            if config is not None:
+                self.config = config
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._dirty = False
+            try:
+                write_json_atomic(self.path, self.config)
+                self._signature = file_signature(self.path)
+            except Exception as e:
+                print(f"保存配置文件失败: {e}")
+    
+    def flush(self):
+        """写入尚未落盘的修改"""
+        with self._lock:
+            if self._dirty:
+                self.save()
+    
+    def _schedule_save(self):
+        """标记修改并延迟写盘，计时期间的后续修改合并到同一次写入"""
+        with self._lock:
+            self._dirty = True
+            if self._timer is None:
+                self._timer = threading.Timer(self.debounce, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
     
     def get(self, key: str, default: Any = None) -> Any:
         """
@@ -80,7 +120,9 @@ class ConfigManager:
         Returns:
             配置值
         """
-        return self.config.get(key, default)
+        with self._lock:
+            self._refresh()
+            return self.config.get(key, default)
     
     def set(self, key: str, value: Any):
         """
@@ -90,8 +132,9 @@ class ConfigManager:
             key: 配置键
             value: 配置值
         """
-        self.config[key] = value
-        self.save()
+        with self._lock:
+            self.config[key] = value
+            self._schedule_save()
     
     def update(self, updates: Dict[str, Any]):
         """
@@ -100,8 +143,9 @@ class ConfigManager:
         Args:
             updates: 要更新的配置字典
         """
-        self.config.update(updates)
-        self.save()
+        with self._lock:
+            self.config.update(updates)
+            self._schedule_save()
     
     def get_all(self) -> Dict[str, Any]:
         """
@@ -110,7 +154,9 @@ class ConfigManager:
         Returns:
             完整配置字典
         """
-        return self.config.copy()
+        with self._lock:
+            self._refresh()
+            return self.config.copy()
 
 
 # 全局配置管理器实例
@@ -0,0 +1,202 @@
+"""
+上下文预算模块
+客户端（尤其是 Agent 类客户端）常常发送远超需要的历史消息，而上游首字节时间随 transcript 长度增长。
+这里按模型配置 token 预算，超出时由压缩策略（可插拔）裁剪历史：
+去重重复内容、折叠超长的历史消息（例如内联在消息中的工具输出）、丢弃最早的轮次，并报告裁剪情况
+"""
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Type
+
+from app.core.config import settings
+from app.utils.metrics import metrics
+from app.utils.usage import message_text, token_estimator
+
+logger = logging.getLogger(__name__)
+
+compactions_counter = metrics.counter("context_compactions_total", "触发上下文压缩的请求数")
+compacted_messages_counter = metrics.counter("context_compacted_messages_total", "被压缩处理的消息数")
+
+
+class CompactionReport:
+    """一次压缩的结果与统计"""
+
+    def __init__(self, messages: list, budget: int, original_tokens: int):
+        self.messages = messages
+        self.budget = budget
+        self.original_tokens = original_tokens
+        self.final_tokens = original_tokens
+        self.dropped = 0
+        self.deduplicated = 0
+        self.collapsed = 0
+
+    @property
+    def compacted(self) -> bool:
+        return bool(self.dropped or self.deduplicated or self.collapsed)
+
+    def header_value(self) -> str:
+        """X-Context-Compaction 响应头"""
+        return (
+            f"tokens={self.original_tokens}->{self.final_tokens}; budget={self.budget}; "
+            f"dropped={self.dropped}; deduplicated={self.deduplicated}; collapsed={self.collapsed}"
+        )
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "context_budget": self.budget,
+            "context_tokens_before": self.original_tokens,
+            "context_tokens_after": self.final_tokens,
+            "context_dropped": self.dropped,
+            "context_deduplicated": self.deduplicated,
+            "context_collapsed": self.collapsed,
+        }
+
+
+class CompactionPolicy(ABC):
+    """压缩策略：在 messages 超出预算时返回裁剪后的消息列表"""
+
+    @abstractmethod
+    def compact(self, messages: list, budget: int, report: CompactionReport) -> list:
+        pass
+
+
+class NoopPolicy(CompactionPolicy):
+    """不做任何处理"""
+
+    def compact(self, messages: list, budget: int, report: CompactionReport) -> list:
+        return messages
+
+
+class DefaultPolicy(CompactionPolicy):
+    """
+    默认策略，依次执行，预算满足即停止:
+    1. 去重：同角色、同内容的历史消息只保留最后一次
+    2. 折叠：超过 COMPACT_MESSAGE_MAX_TOKENS 的历史消息只保留首尾
+    3. 裁剪：从最早的非 system 消息开始丢弃
+
+    最后一条消息（当前提问）与 system 消息始终保留原样
+    """
+
+    def compact(self, messages: list, budget: int, report: CompactionReport) -> list:
+        messages = self._deduplicate(messages, report)
+        if _count(messages) <= budget:
+            return messages
+        messages = self._collapse(messages, settings.COMPACT_MESSAGE_MAX_TOKENS, report)
+        if _count(messages) <= budget:
+            return messages
+        return self._trim(messages, budget, report)
+
+    def _deduplicate(self, messages: list, report: CompactionReport) -> list:
+        seen = set()
+        kept = []
+        last = len(messages) - 1
+        # 从后往前扫描，保留最后一次出现
+        for index in range(last, -1, -1):
+            message = messages[index]
+            role = message.get("role", "user")
+            text = message_text(message.get("content", ""))
+            key = (role, len(text), hash(text))
+            if index != last and role != "system" and text and key in seen:
+                report.deduplicated += 1
+                continue
+            seen.add(key)
+            kept.append(message)
+        kept.reverse()
+        return kept
+
+    def _collapse(self, messages: list, max_tokens: int, report: CompactionReport) -> list:
+        result = []
+        last = len(messages) - 1
+        for index, message in enumerate(messages):
+            if index == last or message.get("role") == "system" or max_tokens <= 0:
+                result.append(message)
+                continue
+            if token_estimator.count_message(message) <= max_tokens:
+                result.append(message)
+                continue
+            text = message_text(message.get("content", ""))
+            # 按平均每 token 的字符数换算保留长度，头部保留 2/3、尾部保留 1/3
+            chars_per_token = len(text) / max(1, token_estimator.count_message(message))
+            keep = int(max_tokens * chars_per_token)
+            head, tail = text[:keep * 2 // 3], text[len(text) - keep // 3:]
+            omitted = len(text) - len(head) - len(tail)
+            result.append({
+                **message,
+                "content": f"{head}\n[... 已省略 {omitted} 个字符 ...]\n{tail}",
+            })
+            report.collapsed += 1
+        return result
+
+    def _trim(self, messages: list, budget: int, report: CompactionReport) -> list:
+        total = _count(messages)
+        kept = list(messages)
+        index = 0
+        # 始终保留最后一条消息
+        while total > budget and index < len(kept) - 1:
+            message = kept[index]
+            if message.get("role") == "system":
+                index += 1
+                continue
+            total -= token_estimator.count_message(message)
+            del kept[index]
+            report.dropped += 1
+        # 不以 assistant 开头：丢弃后紧跟的孤立回复
+        while index < len(kept) - 1 and report.dropped and kept[index].get("role") == "assistant":
+            del kept[index]
+            report.dropped += 1
+        return kept
+
+
+POLICIES: Dict[str, Type[CompactionPolicy]] = {
+    "default": DefaultPolicy,
+    "none": NoopPolicy,
+}
+
+
+def register_policy(name: str, policy: Type[CompactionPolicy]):
+    """注册自定义压缩策略，通过 CONTEXT_POLICY 选用"""
+    POLICIES[name] = policy
+
+
+def _count(messages: list) -> int:
+    return token_estimator.count_messages(messages)
+
+
+def context_budget(model: str) -> int:
+    """模型的上下文预算（token），0 表示不限制"""
+    return settings.CONTEXT_BUDGET_MAP.get(model, settings.CONTEXT_BUDGET_TOKENS)
+
+
+def compact_messages(messages: list, model: str, label: Optional[str] = None) -> CompactionReport:
+    """
+    按模型预算压缩消息，未超出预算时原样返回（估算结果有缓存，开销很小）
+
+    Args:
+        messages: 客户端发送的消息
+        model: 客户端请求的模型名，用于查找预算
+        label: 指标中使用的模型标签（未知的模型为 other），默认为 model
+    """
+    label = label or model
+    budget = context_budget(model)
+    if budget <= 0 or not messages:
+        return CompactionReport(messages, budget, 0)
+
+    original_tokens = _count(messages)
+    report = CompactionReport(messages, budget, original_tokens)
+    if original_tokens <= budget:
+        return report
+
+    policy_cls: Optional[Type[CompactionPolicy]] = POLICIES.get(settings.CONTEXT_POLICY)
+    if policy_cls is None:
+        logger.warning(f"未知的上下文压缩策略 {settings.CONTEXT_POLICY}，使用 default")
+        policy_cls = DefaultPolicy
+    report.messages = policy_cls().compact(messages, budget, report)
+    report.final_tokens = _count(report.messages)
+
+    if report.compacted:
+        compactions_counter.inc(model=label)
+        compacted_messages_counter.inc(report.dropped, model=label, action="dropped")
+        compacted_messages_counter.inc(report.deduplicated, model=label, action="deduplicated")
+        compacted_messages_counter.inc(report.collapsed, model=label, action="collapsed")
+        logger.info(f"上下文超出预算，已压缩（{model}）: {report.header_value()}")
+    return report
@@ -1,94 +1,242 @@
+"""
+浏览器 Cookie 读取模块
+- 各浏览器并发读取，每个浏览器有独立的超时，总耗时取决于最慢的一个而不是所有之和
+- 浏览器运行中数据库被锁定时，把 Cookie 数据库（连同 -wal/-shm 文件）复制为快照后读取
+- 按 Cookie 文件的 (mtime, 大小) 缓存读取结果，并记住上次成功的浏览器，文件未变化时重复读取立即返回
+"""
 import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, Optional, Tuple
+
 import browser_cookie3
-from typing import Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+DOMAIN = "notion.so"
+COOKIE_NAME = "token_v2"
+
+# 读取顺序（也是多个浏览器都有 token 时的优先顺序）
+BROWSERS = ('edge', 'chrome', 'firefox')
+_LOADERS = {
+    'chrome': browser_cookie3.Chrome,
+    'edge': browser_cookie3.Edge,
+    'firefox': browser_cookie3.Firefox,
+}
+# SQLite 的日志文件，快照需要与数据库一起复制，否则会丢失尚未合并的最新 Cookie
+_SIDECAR_SUFFIXES = ('-wal', '-shm', '-journal')
+
+# 单个浏览器读取的超时（秒），超时的读取在后台线程中自行结束
+PROBE_TIMEOUT_SECONDS = 10.0
+
+CookieResult = Tuple[Optional[str], Optional[str], Optional[str]]
+
 class CookieError:
     """Cookie 获取错误类型"""
     DATABASE_LOCKED = "database_locked"
     PERMISSION_DENIED = "permission_denied"
     FILE_NOT_FOUND = "file_not_found"
     COOKIE_NOT_FOUND = "cookie_not_found"
+    TIMEOUT = "timeout"
     UNKNOWN = "unknown"
 
-def get_notion_cookie_from_browser(browser_name: str = 'edge') -> Tuple[Optional[str], Optional[str], Optional[str]]:
+# 所有浏览器都失败时，按此顺序选择报告给用户的错误
+_ERROR_PRIORITY = (
+    CookieError.DATABASE_LOCKED,
+    CookieError.TIMEOUT,
+    CookieError.PERMISSION_DENIED,
+    CookieError.COOKIE_NOT_FOUND,
+    CookieError.UNKNOWN,
+    CookieError.FILE_NOT_FOUND,
+)
+
+_cache_lock = threading.Lock()
+# 浏览器 -> (Cookie 文件签名, 读取结果)
+_cache: Dict[str, Tuple[tuple, CookieResult]] = {}
+# 最近一次成功读取的 (token, 浏览器)
+_last_success: Optional[Tuple[str, str]] = None
+
+def _file_signature(cookie_file: str) -> tuple:
+    """Cookie 数据库及其日志文件的 (mtime_ns, 大小)，任一变化都视为 Cookie 可能已更新"""
+    signature = []
+    for path in (cookie_file, *(cookie_file + suffix for suffix in _SIDECAR_SUFFIXES)):
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+def _find_token(cj) -> Optional[str]:
+    for cookie in cj or []:
+        if cookie.name == COOKIE_NAME and DOMAIN in cookie.domain:
+            return cookie.value
+    return None
+
+def _load_snapshot(browser_name: str, cookie_file: str):
+    """复制 Cookie 数据库快照后读取（数据库被运行中的浏览器锁定时使用）"""
+    snapshot_dir = tempfile.mkdtemp(prefix="notion-cookies-")
+    try:
+        snapshot = os.path.join(snapshot_dir, os.path.basename(cookie_file))
+        shutil.copy2(cookie_file, snapshot)
+        for suffix in _SIDECAR_SUFFIXES:
+            if os.path.exists(cookie_file + suffix):
+                shutil.copy2(cookie_file + suffix, snapshot + suffix)
+        # 把 -wal 合并进快照的主文件：browser_cookie3 会再复制一次主文件读取，不会带上 -wal
+        con = sqlite3.connect(snapshot)
+        try:
+            con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            con.close()
+        return _LOADERS[browser_name](cookie_file=snapshot, domain_name=DOMAIN).load()
+    finally:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+def _classify_error(e: Exception, browser_name: str) -> CookieResult:
+    error_str = str(e).lower()
+
+    # 数据库锁定（浏览器正在运行）
+    if "database is locked" in error_str or "locked" in error_str:
+        return None, CookieError.DATABASE_LOCKED, "浏览器正在运行，请关闭所有浏览器窗口后重试"
+
+    # 权限错误
+    elif "permission" in error_str or "access" in error_str:
+        return None, CookieError.PERMISSION_DENIED, "没有权限读取浏览器数据，请以管理员身份运行"
+
+    # 文件不存在
+    elif "no such file" in error_str or "not found" in error_str or "failed to find" in error_str or isinstance(e, FileNotFoundError):
+        return None, CookieError.FILE_NOT_FOUND, f"找不到浏览器 Cookie 文件，请确认已安装 {browser_name.title()}"
+
+    # 其他错误
+    else:
+        logger.error(f"读取 Cookie 失败: {e}")
+        return None, CookieError.UNKNOWN, f"自动获取失败：{str(e)}"
+
+def get_notion_cookie_from_browser(browser_name: str = 'edge', use_cache: bool = True) -> CookieResult:
     """
     尝试从指定的浏览器中获取 Notion 的 token_v2 Cookie
-    
+
+    Args:
+        browser_name: 浏览器名称（edge/chrome/firefox）
+        use_cache: Cookie 文件未变化时直接返回上次的读取结果
+
     Returns:
         Tuple[cookie_value, error_type, error_message]
         - 成功: (cookie_value, None, None)
         - 失败: (None, error_type, error_message)
     """
-    domain = "notion.so"
-    cookie_name = "token_v2"
-    
+    global _last_success
+    browser_name = browser_name.lower()
+    loader = _LOADERS.get(browser_name)
+    if loader is None:
+        logger.warning(f"不支持的浏览器类型: {browser_name}")
+        return None, CookieError.UNKNOWN, f"不支持的浏览器: {browser_name}"
+
     logger.info(f"尝试从 {browser_name} 读取 Notion Cookie...")
-    
+
     try:
-        cj = None
-        if browser_name.lower() == 'chrome':
-            cj = browser_cookie3.chrome(domain_name=domain)
-        elif browser_name.lower() == 'edge':
-            cj = browser_cookie3.edge(domain_name=domain)
-        elif browser_name.lower() == 'firefox':
-            cj = browser_cookie3.firefox(domain_name=domain)
-        else:
-            logger.warning(f"不支持的浏览器类型: {browser_name}")
-            return None, CookieError.UNKNOWN, f"不支持的浏览器: {browser_name}"
-            
-        if cj:
-            for cookie in cj:
-                if cookie.name == cookie_name and domain in cookie.domain:
-                    logger.info("成功读取到 token_v2")
-                    return cookie.value, None, None
-                    
-        logger.warning(f"在 {browser_name} 中未找到 token_v2")
-        return None, CookieError.COOKIE_NOT_FOUND, f"未找到 Notion Cookie，请确认已登录 notion.so"
-        
+        # 只定位 Cookie 文件（及密钥），尚未读取数据库
+        reader = loader(domain_name=DOMAIN)
     except Exception as e:
-        error_str = str(e).lower()
-        
-        # 数据库锁定（浏览器正在运行）
-        if "database is locked" in error_str or "locked" in error_str:
-            return None, CookieError.DATABASE_LOCKED, "浏览器正在运行，请关闭所有浏览器窗口后重试"
-        
-        # 权限错误
-        elif "permission" in error_str or "access" in error_str:
-            return None, CookieError.PERMISSION_DENIED, "没有权限读取浏览器数据，请以管理员身份运行"
-        
-        # 文件不存在
-        elif "no such file" in error_str or "not found" in error_str or isinstance(e, FileNotFoundError):
-            return None, CookieError.FILE_NOT_FOUND, f"找不到浏览器 Cookie 文件，请确认已安装 {browser_name.title()}"
-        
-        # 其他错误
-        else:
-            logger.error(f"读取 Cookie 失败: {e}")
-            return None, CookieError.UNKNOWN, f"自动获取失败：{str(e)}"
-
-def try_all_browsers() -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        return _classify_error(e, browser_name)
+
+    signature = _file_signature(reader.cookie_file)
+    if use_cache:
+        with _cache_lock:
+            cached = _cache.get(browser_name)
+        if cached is not None and cached[0] == signature:
+            logger.info(f"{browser_name} 的 Cookie 文件未变化，使用缓存结果")
+            return cached[1]
+
+    token = None
+    try:
+        token = _find_token(reader.load())
+    except Exception as e:
+        error = e
+    else:
+        error = None
+    # 数据库被锁定时 browser_cookie3 的只读打开或复制会失败，且都不含 -wal 中尚未合并的数据：
+    # 读取失败、或未找到但存在 -wal 文件时，改为读取完整快照
+    if token is None and os.path.exists(reader.cookie_file) and (error is not None or os.path.exists(reader.cookie_file + "-wal")):
+        logger.info(f"{browser_name} 的 Cookie 数据库被占用，改为读取快照")
+        try:
+            token = _find_token(_load_snapshot(browser_name, reader.cookie_file))
+        except Exception as e:
+            logger.debug(f"读取 {browser_name} 的 Cookie 快照失败: {e}")
+    if token is None and error is not None:
+        return _classify_error(error, browser_name)
+
+    if token:
+        logger.info("成功读取到 token_v2")
+        result = (token, None, None)
+        with _cache_lock:
+            _last_success = (token, browser_name)
+    else:
+        logger.warning(f"在 {browser_name} 中未找到 token_v2")
+        result = (None, CookieError.COOKIE_NOT_FOUND, f"未找到 Notion Cookie，请确认已登录 notion.so")
+    with _cache_lock:
+        _cache[browser_name] = (signature, result)
+    return result
+
+def _probe_in_thread(browser_name: str, use_cache: bool) -> Future:
+    """在守护线程中读取（超时后不再等待，也不会阻止进程退出）"""
+    future: Future = Future()
+
+    def run():
+        try:
+            future.set_result(get_notion_cookie_from_browser(browser_name, use_cache))
+        except Exception as e:
+            future.set_result((None, CookieError.UNKNOWN, f"自动获取失败：{str(e)}"))
+
+    threading.Thread(target=run, name=f"cookie-{browser_name}", daemon=True).start()
+    return future
+
+def last_success() -> Optional[Tuple[str, str]]:
+    """最近一次成功读取的 (token, 浏览器)"""
+    with _cache_lock:
+        return _last_success
+
+def try_all_browsers(use_cache: bool = True, timeout: float = PROBE_TIMEOUT_SECONDS) -> CookieResult:
     """
-    尝试从所有支持的浏览器获取 Cookie
-    
+    尝试从所有支持的浏览器获取 Cookie（并发读取，上次成功的浏览器优先）
+
+    Args:
+        use_cache: Cookie 文件未变化时直接返回上次的读取结果
+        timeout: 单个浏览器的读取超时（秒）
+
     Returns:
         Tuple[cookie_value, error_type, error_message]
     """
-    browsers = ['edge', 'chrome', 'firefox']
-    last_error_type = None
-    last_error_msg = None
-    
-    for browser in browsers:
-        cookie, error_type, error_msg = get_notion_cookie_from_browser(browser)
+    previous = last_success()
+    order = list(BROWSERS)
+    if previous is not None:
+        order.remove(previous[1])
+        order.insert(0, previous[1])
+
+    futures = {browser: _probe_in_thread(browser, use_cache) for browser in order}
+    # 各浏览器同时开始读取，共用同一个截止时间
+    deadline = time.monotonic() + timeout
+    errors: Dict[str, Tuple[str, str]] = {}
+
+    # 按优先顺序等待：并发读取，前面的浏览器成功时不必等待后面的
+    for browser in order:
+        try:
+            cookie, error_type, error_msg = futures[browser].result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            logger.warning(f"读取 {browser} 的 Cookie 超时（{timeout:.0f}s）")
+            error_type, error_msg = CookieError.TIMEOUT, f"读取 {browser.title()} 的 Cookie 超时"
+            cookie = None
         if cookie:
             return cookie, None, None
-        
-        # 记录最后一个错误
-        last_error_type = error_type
-        last_error_msg = error_msg
-        
-        # 如果是数据库锁定，不继续尝试其他浏览器（因为可能都在运行）
-        if error_type == CookieError.DATABASE_LOCKED:
-            break
-    
-    return None, last_error_type, last_error_msg
+        errors.setdefault(error_type, error_msg)
+
+    for error_type in _ERROR_PRIORITY:
+        if error_type in errors:
+            return None, error_type, errors[error_type]
+    error_type, error_msg = next(iter(errors.items()))
+    return None, error_type, error_msg
@@ -0,0 +1,130 @@
+"""
+凭证自动恢复模块（CREDENTIAL_RECOVERY 开启时生效）
+Token 失效后在工作线程中调用 cookie_extractor.try_all_browsers() 从本机浏览器读取新的 token_v2，
+读到与当前不同的 token 时写入 config.json（文件存在时）并热更新凭证。
+失效期间到达或因 401/403 失败的请求在暂缓队列中最多等待 CREDENTIAL_RECOVERY_HOLD 秒，
+取得新凭证后用新凭证重试一次，未取得时按原样失败。同一时刻只进行一次读取
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from app.core.config import CONFIG_FILE, settings
+from app.core.credentials import CredentialStore, Credentials, credential_store
+from app.utils.json_store import read_json_cached, write_json_atomic
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 暂缓队列的容量，超出时请求直接失败
+MAX_HELD_REQUESTS = 64
+
+recovery_counter = metrics.counter("credential_recoveries_total", "从浏览器恢复凭证的尝试次数")
+
+
+class CredentialRecovery:
+    """从浏览器恢复 token_v2，并让受影响的请求等待恢复结果"""
+
+    def __init__(self, store: CredentialStore):
+        self.store = store
+        self._task: Optional[asyncio.Task] = None
+        # 最近一次恢复失败对应的凭证版本与时间，CREDENTIAL_RECOVERY_INTERVAL 内不再重复读取
+        self._failed_version: Optional[int] = None
+        self._failed_at = 0.0
+        self.held = 0
+        self.last_result: Optional[Dict[str, Any]] = None
+
+    def trigger(self, creds: Credentials) -> Optional[asyncio.Task]:
+        """凭证失效时开始一次恢复（已在进行中则复用），未开启或处于冷却期时返回 None"""
+        if not settings.CREDENTIAL_RECOVERY:
+            return None
+        if self._task is not None and not self._task.done():
+            return self._task
+        if self.store.current.version != creds.version:
+            # 凭证已被替换，无需恢复
+            return None
+        if self._failed_version == creds.version and time.monotonic() - self._failed_at < settings.CREDENTIAL_RECOVERY_INTERVAL:
+            return None
+        self._task = asyncio.get_running_loop().create_task(self._recover(creds))
+        return self._task
+
+    async def hold(self, creds: Credentials) -> Optional[Credentials]:
+        """
+        暂缓请求直到恢复结束或超时
+
+        Returns:
+            新的凭证快照；未开启恢复、恢复失败或超时时返回 None
+        """
+        if self.store.current.version != creds.version:
+            return self.store.current
+        task = self.trigger(creds)
+        if task is None or self.held >= MAX_HELD_REQUESTS:
+            return None
+        self.held += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(task), settings.CREDENTIAL_RECOVERY_HOLD)
+        except asyncio.TimeoutError:
+            logger.warning(f"等待凭证恢复超时（{settings.CREDENTIAL_RECOVERY_HOLD:.0f}s）")
+        finally:
+            self.held -= 1
+        current = self.store.current
+        return current if current.version != creds.version else None
+
+    async def _recover(self, creds: Credentials) -> bool:
+        started = time.perf_counter()
+        logger.warning("Token 已失效，正在尝试从浏览器读取新的 token_v2...")
+        try:
+            cookie, error_type, error_msg = await asyncio.to_thread(self._extract_and_save, creds)
+        except Exception as e:
+            cookie, error_type, error_msg = None, "unknown", str(e)
+        elapsed = time.perf_counter() - started
+
+        if cookie is None:
+            self._failed_version = creds.version
+            self._failed_at = time.monotonic()
+            recovery_counter.inc(result=error_type or "unknown")
+            self.last_result = {"ok": False, "time": time.time(), "elapsed": round(elapsed, 3), "error": error_msg}
+            logger.error(f"从浏览器恢复凭证失败（{elapsed:.1f}s）: {error_msg}")
+            return False
+
+        result = self.store.reload("browser")
+        recovery_counter.inc(result="ok")
+        self.last_result = {"ok": True, "time": time.time(), "elapsed": round(elapsed, 3), "version": result["version"]}
+        logger.info(f"已从浏览器恢复凭证（{elapsed:.1f}s，凭证版本 {result['version']}）")
+        return True
+
+    def _extract_and_save(self, creds: Credentials):
+        """在工作线程中读取浏览器 Cookie，取得新 token 时写入配置（返回值同 try_all_browsers）"""
+        try:
+            from app.utils.cookie_extractor import try_all_browsers
+        except ImportError as e:
+            return None, "unavailable", f"未安装浏览器 Cookie 读取依赖: {e}"
+
+        cookie, error_type, error_msg = try_all_browsers()
+        if not cookie:
+            return None, error_type, error_msg
+        if cookie == creds.cookie:
+            return None, "unchanged", "浏览器中的 token_v2 与当前相同，请在浏览器中重新登录 Notion"
+
+        settings.NOTION_COOKIE = cookie
+        # 写入 config.json，GUI 与重启后的服务使用同一 token；只使用 .env 时不创建该文件
+        config = read_json_cached(CONFIG_FILE)
+        if config is not None:
+            config["token_v2"] = cookie
+            write_json_atomic(CONFIG_FILE, config)
+        return cookie, None, None
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.CREDENTIAL_RECOVERY,
+            "recovering": self._task is not None and not self._task.done(),
+            "held_requests": self.held,
+            "last_result": self.last_result,
+        }
+
+
+# 全局实例
+credential_recovery = CredentialRecovery(credential_store)
+
+metrics.gauge("credential_recovery_held_requests", "等待凭证恢复的请求数", callback=lambda: float(credential_recovery.held))
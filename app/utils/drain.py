@@ -0,0 +1,92 @@
+"""
+优雅停机（排空）模块
+开始排空后 uvicorn 关闭监听端口、不再接受新连接，健康检查返回 503 便于负载均衡摘除，
+进行中的请求（尤其是 SSE 流）在截止时间内继续完成，期间每秒报告剩余请求数。
+配合 app/core/server.py 的交接重启：新进程先绑定同一端口并就绪，旧进程再排空退出
+"""
+import asyncio
+import logging
+import signal
+import time
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.utils.metrics import metrics
+from app.utils.stream_tracker import stream_tracker
+
+logger = logging.getLogger(__name__)
+
+# 不计入进行中请求的路径
+EXEMPT_PATH_PREFIXES = ("/health", "/admin/", "/metrics")
+
+
+class DrainController:
+    """进行中请求计数与排空状态（只在事件循环线程中读写）"""
+
+    def __init__(self):
+        self.inflight = 0
+        self.draining = False
+        self.reason: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.deadline: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        # 多 worker 模式下由 worker 设置：排空请求交给监督进程，由其通知所有 worker 排空（见 app/core/server.py）
+        self.shutdown_handler: Optional[Callable[[], None]] = None
+
+    def begin(self, reason: str, timeout: Optional[float] = None) -> bool:
+        """开始排空，已在排空中时返回 False"""
+        if self.draining:
+            return False
+        timeout = settings.SHUTDOWN_DRAIN_SECONDS if timeout is None else timeout
+        self.draining = True
+        self.reason = reason
+        self.started_at = time.monotonic()
+        self.deadline = self.started_at + timeout
+        logger.warning(f"开始排空（{reason}）：不再接受新请求，等待 {self.inflight} 个进行中的请求完成，最长 {timeout:.0f}s")
+        try:
+            self._task = asyncio.get_running_loop().create_task(self._report())
+        except RuntimeError:
+            # 不在事件循环中（例如测试脚本直接调用），只切换状态
+            pass
+        return True
+
+    def request_shutdown(self, reason: str):
+        """排空后退出进程：交给 uvicorn 的信号处理完成关闭监听、等待连接与 lifespan 清理"""
+        self.begin(reason)
+        if self.shutdown_handler is not None:
+            self.shutdown_handler()
+        else:
+            signal.raise_signal(signal.SIGTERM)
+
+    def status(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "draining": self.draining,
+            "reason": self.reason,
+            "inflight_requests": self.inflight,
+            "inflight_streams": len(stream_tracker),
+            "elapsed_seconds": round(now - self.started_at, 3) if self.started_at else None,
+            "remaining_seconds": round(max(0.0, self.deadline - now), 3) if self.deadline else None,
+        }
+
+    async def _report(self):
+        """每秒报告一次排空进度"""
+        while self.inflight > 0:
+            await asyncio.sleep(1)
+            elapsed = time.monotonic() - self.started_at
+            if time.monotonic() >= self.deadline:
+                logger.error(f"排空超时（{elapsed:.1f}s），仍有 {self.inflight} 个请求未完成，将被中断")
+                return
+            if self.inflight:
+                logger.info(
+                    f"排空中：剩余 {self.inflight} 个请求（{len(stream_tracker)} 个上游流），"
+                    f"已等待 {elapsed:.1f}s，剩余 {self.deadline - time.monotonic():.1f}s"
+                )
+        logger.info(f"排空完成，耗时 {time.monotonic() - self.started_at:.1f}s")
+
+
+# 全局实例
+drain_controller = DrainController()
+
+metrics.gauge("http_inflight_requests", "进行中的 HTTP 请求数（含未结束的流式响应）", callback=lambda: float(drain_controller.inflight))
+metrics.gauge("server_draining", "是否正在排空（1 为是）", callback=lambda: float(drain_controller.draining))
@@ -0,0 +1,119 @@
+"""
+JSON 文件读写工具
+- 读取：按文件的 (mtime, 大小) 缓存解析结果，文件未变化时不重复解析，GUI 与服务端共用
+- 写入：先写同目录下的临时文件并 fsync，再原子替换目标文件，崩溃或断电不会留下写了一半的文件
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+Signature = Tuple[int, int]
+
+# Windows 上目标文件正被其他进程读取时 os.replace 会短暂失败，重试几次
+_REPLACE_RETRIES = 5
+_REPLACE_RETRY_DELAY = 0.05
+
+_cache_lock = threading.Lock()
+# 路径 -> (文件签名, 解析结果)
+_read_cache: Dict[Path, Tuple[Signature, Dict[str, Any]]] = {}
+
+
+def file_signature(path: Path) -> Optional[Signature]:
+    """
+    文件的 (mtime_ns, 大小)，用于判断文件是否变化
+
+    Returns:
+        签名；文件不存在时返回 None
+    """
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def read_json_cached(path: Path) -> Optional[Dict[str, Any]]:
+    """
+    读取 JSON 文件，签名未变化时直接返回缓存结果的副本
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        解析后的字典；文件不存在时返回 None
+
+    Raises:
+        OSError, ValueError: 读取或解析失败
+    """
+    signature = file_signature(path)
+    if signature is None:
+        return None
+    with _cache_lock:
+        cached = _read_cache.get(path)
+        if cached is not None and cached[0] == signature:
+            return dict(cached[1])
+
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    with _cache_lock:
+        # 读取期间文件若被替换，下次签名不一致会重新读取
+        _read_cache[path] = (signature, data)
+    return dict(data)
+
+
+def _fsync_dir(directory: Path):
+    """持久化目录项（重命名本身），Windows 不支持对目录 fsync"""
+    if os.name == "nt":
+        return
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_json_atomic(path: Path, data: Dict[str, Any]):
+    """
+    原子写入 JSON 文件（临时文件 + fsync + 重命名），并更新读取缓存
+
+    Args:
+        path: 目标文件路径
+        data: 要写入的字典
+
+    Raises:
+        OSError: 写入失败（目标文件保持原样）
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        for attempt in range(_REPLACE_RETRIES):
+            try:
+                os.replace(tmp_path, path)
+                break
+            except PermissionError:
+                if attempt == _REPLACE_RETRIES - 1:
+                    raise
+                time.sleep(_REPLACE_RETRY_DELAY)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_dir(path.parent)
+
+    signature = file_signature(path)
+    if signature is not None:
+        with _cache_lock:
+            _read_cache[path] = (signature, dict(data))
@@ -0,0 +1,132 @@
+"""
+事件循环延迟监控模块
+协程按固定间隔 sleep，实际唤醒时间与预期之差即调度延迟（lag）；
+同时由一个看门狗线程检查循环是否迟迟没有唤醒，超过阈值时抓取事件循环线程的调用栈，
+从而定位阻塞事件循环的同步代码（例如同步 HTTP 请求、桌面通知）
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+lag_gauge = metrics.gauge("event_loop_lag_seconds", "最近一次测得的事件循环调度延迟（秒）")
+lag_max_gauge = metrics.gauge("event_loop_lag_max_seconds", "启动以来最大的事件循环调度延迟（秒）")
+lag_histogram = metrics.histogram("event_loop_lag_distribution_seconds", "事件循环调度延迟分布（秒）", LAG_BUCKETS)
+blocked_counter = metrics.counter("event_loop_blocked_total", "事件循环阻塞超过阈值的次数")
+
+
+class LoopLagMonitor:
+    """事件循环延迟监控"""
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.2, max_events: int = 50):
+        self.interval = interval
+        self.threshold = threshold
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+        self._events: deque = deque(maxlen=max_events)
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        # 下一次预期唤醒的时间点（perf_counter），由协程写入、看门狗读取
+        self._expected_wakeup = 0.0
+        # 本轮阻塞是否已抓取过调用栈
+        self._captured: Optional[Dict[str, Any]] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """在事件循环中启动（需在协程上下文调用）"""
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._stopped.clear()
+        self._expected_wakeup = time.perf_counter() + self.interval
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"事件循环延迟监控已启动（间隔 {self.interval * 1000:.0f}ms，阈值 {self.threshold * 1000:.0f}ms）")
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            begin = time.perf_counter()
+            self._expected_wakeup = begin + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - self._expected_wakeup)
+            self._record(lag)
+
+    def _record(self, lag: float):
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        lag_gauge.set(lag)
+        lag_max_gauge.set(self.max_lag)
+        lag_histogram.observe(lag)
+
+        captured, self._captured = self._captured, None
+        if lag < self.threshold:
+            return
+
+        blocked_counter.inc()
+        event = captured or {"time": time.time(), "stack": None}
+        event["lag_seconds"] = round(lag, 4)
+        self._events.append(event)
+        where = f"\n{event['stack']}" if event["stack"] else "（未能抓取调用栈）"
+        logger.warning(f"事件循环被阻塞 {lag * 1000:.0f}ms，阻塞位置:{where}")
+
+    def _watch(self):
+        """看门狗线程：循环超时未唤醒时抓取事件循环线程的调用栈"""
+        poll = max(self.threshold / 4, 0.005)
+        while not self._stopped.wait(poll):
+            overdue = time.perf_counter() - self._expected_wakeup
+            if overdue < self.threshold or self._captured is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame))
+            del frame
+            self._captured = {"time": time.time(), "stack": stack}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "interval_seconds": self.interval,
+            "threshold_seconds": self.threshold,
+            "last_lag_seconds": round(self.last_lag, 4),
+            "max_lag_seconds": round(self.max_lag, 4),
+            "blocked_total": blocked_counter.get(),
+        }
+
+    def recent_events(self) -> List[Dict[str, Any]]:
+        """最近的阻塞事件（含调用栈），新的在前"""
+        return list(reversed(self._events))
+
+
+# 全局实例（在 lifespan 中启动）
+loop_monitor = LoopLagMonitor(
+    interval=settings.LOOP_LAG_INTERVAL_MS / 1000,
+    threshold=settings.LOOP_LAG_THRESHOLD_MS / 1000,
+)
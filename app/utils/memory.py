@@ -0,0 +1,144 @@
+"""
+内存诊断模块
+基于 tracemalloc 在两个时间点之间做分配快照对比，按模块（文件）或代码行分组，
+用于定位长时间运行后 RSS 持续增长的来源
+"""
+import gc
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 快照中排除诊断工具自身的分配
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+GROUP_BY_CHOICES = ("filename", "lineno", "traceback")
+
+
+def get_rss_bytes() -> Optional[int]:
+    """当前进程常驻内存（字节），无法获取时返回 None"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open(f"/proc/{os.getpid()}/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        # ru_maxrss 为峰值：Linux 下单位 KB，macOS 下单位字节
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return None
+
+
+class MemoryInspector:
+    """管理 tracemalloc 的开启、基线快照与对比"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._previous: Optional[tracemalloc.Snapshot] = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def _take(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+    def start(self, frames: int = 1) -> Dict[str, Any]:
+        """开启追踪并记录基线快照（已在追踪时只重置基线）"""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+                logger.info(f"已开启 tracemalloc（{frames} 帧）")
+            self._baseline = self._take()
+            self._previous = self._baseline
+            return self.status()
+
+    def stop(self) -> Dict[str, Any]:
+        """停止追踪并释放快照"""
+        with self._lock:
+            self._baseline = None
+            self._previous = None
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+                logger.info("已停止 tracemalloc")
+            return self.status()
+
+    def diff(self, group_by: str = "lineno", limit: int = 30, against: str = "baseline") -> Dict[str, Any]:
+        """
+        记录新快照并与基线（或上一次快照）对比
+
+        Args:
+            group_by: filename（按模块）/ lineno（按代码行）/ traceback（按调用栈）
+            limit: 返回条数
+            against: baseline（与开启时对比）/ previous（与上一次对比）
+        """
+        if group_by not in GROUP_BY_CHOICES:
+            raise ValueError(f"group_by 必须是 {GROUP_BY_CHOICES} 之一")
+        with self._lock:
+            if not tracemalloc.is_tracing() or self._baseline is None:
+                raise RuntimeError("尚未开启内存追踪，请先调用 start")
+            reference = self._baseline if against == "baseline" else self._previous
+            current = self._take()
+            self._previous = current
+
+        stats = current.compare_to(reference, group_by)
+        top = []
+        for stat in stats[:limit]:
+            # traceback 按从最早到最近的顺序排列，最后一帧才是分配发生的位置
+            frame = stat.traceback[-1]
+            entry = {
+                "location": f"{frame.filename}:{frame.lineno}" if group_by != "filename" else frame.filename,
+                "size_diff": stat.size_diff,
+                "size": stat.size,
+                "count_diff": stat.count_diff,
+                "count": stat.count,
+            }
+            if group_by == "traceback":
+                entry["traceback"] = stat.traceback.format()
+            top.append(entry)
+
+        return {
+            "group_by": group_by,
+            "against": against,
+            "total_size_diff": sum(s.size_diff for s in stats),
+            "top": top,
+        }
+
+    def status(self) -> Dict[str, Any]:
+        """进程内存概况"""
+        info: Dict[str, Any] = {
+            "rss_bytes": get_rss_bytes(),
+            "gc_counts": gc.get_count(),
+            "tracing": tracemalloc.is_tracing(),
+        }
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            info.update(
+                traced_bytes=current,
+                traced_peak_bytes=peak,
+                traceback_frames=tracemalloc.get_traceback_limit(),
+                tracemalloc_overhead_bytes=tracemalloc.get_tracemalloc_memory(),
+            )
+        return info
+
+
+# 全局实例
+memory_inspector = MemoryInspector()
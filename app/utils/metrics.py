@@ -0,0 +1,257 @@
+"""
+指标模块
+进程内的轻量指标注册表（Counter / Gauge / Histogram），
+可导出为 Prometheus 文本格式，也可导出为 JSON 快照供 GUI 使用
+"""
+import bisect
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 标签键：按名称排序后的 (name, value) 元组
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# 默认直方图分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape_label_value(value: str) -> str:
+    """按 Prometheus 文本格式转义标签值中的反斜杠、双引号与换行"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    body = ",".join(f'{k}="{_escape_label_value(v)}"' for k, v in items)
+    return "{" + body + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+    def snapshot(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in items]
+
+    def snapshot(self):
+        with self._lock:
+            return [{"labels": dict(k), "value": v} for k, v in self._values.items()]
+
+
+class Gauge(_Metric):
+    """瞬时值，可直接设置，也可在导出时通过回调取值"""
+    type_name = "gauge"
+
+    def __init__(self, name: str, help_text: str, callback: Optional[Callable[[], Optional[float]]] = None):
+        super().__init__(name, help_text)
+        self._values: Dict[LabelKey, float] = {}
+        self._callback = callback
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def _items(self) -> List[Tuple[LabelKey, float]]:
+        if self._callback is not None:
+            value = self._callback()
+            return [] if value is None else [((), value)]
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in self._items()]
+
+    def snapshot(self):
+        return [{"labels": dict(k), "value": v} for k, v in self._items()]
+
+
+class Histogram(_Metric):
+    """分桶直方图"""
+    type_name = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [各桶计数..., +Inf 计数], sum
+        self._counts: Dict[LabelKey, List[int]] = {}
+        self._sums: Dict[LabelKey, float] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[index] += 1
+            self._sums[key] += value
+
+    def render(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = [(k, list(c), self._sums[k]) for k, c in self._counts.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = "+Inf" if math.isinf(bound) else _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+    def snapshot(self):
+        with self._lock:
+            return [
+                {
+                    "labels": dict(k),
+                    "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], c)),
+                    "sum": self._sums[k],
+                    "count": sum(c),
+                }
+                for k, c in self._counts.items()
+            ]
+
+
+def histogram_quantile(buckets: Dict[str, float], q: float) -> Optional[float]:
+    """
+    由直方图快照的分桶计数（非累计，键为上界字符串，含 "+Inf"）估算分位数，桶内按线性插值
+
+    Returns:
+        分位数估计值；没有样本时返回 None，落在 +Inf 桶时返回最大的有限上界
+    """
+    bounds = sorted((math.inf if le == "+Inf" else float(le), count) for le, count in buckets.items())
+    total = sum(count for _, count in bounds)
+    if total <= 0:
+        return None
+    rank = q * total
+    cumulative = 0.0
+    lower = 0.0
+    for bound, count in bounds:
+        if count > 0 and cumulative + count >= rank:
+            if math.isinf(bound):
+                return lower
+            return lower + (bound - lower) * (rank - cumulative) / count
+        cumulative += count
+        if not math.isinf(bound):
+            lower = bound
+    return lower
+
+
+class MetricsRegistry:
+    """指标注册表，同名指标只注册一次"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._register(Counter(name, help_text))
+
+    def gauge(self, name: str, help_text: str, callback: Optional[Callable[[], Optional[float]]] = None) -> Gauge:
+        return self._register(Gauge(name, help_text, callback))
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, buckets))
+
+    def render_prometheus(self) -> str:
+        """导出为 Prometheus 文本格式"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, object]:
+        """导出为 JSON 快照"""
+        return {
+            "timestamp": time.time(),
+            "metrics": {name: metric.snapshot() for name, metric in list(self._metrics.items())},
+        }
+
+
+def _open_fds() -> Optional[float]:
+    """当前进程打开的文件描述符数量（仅 Linux）"""
+    try:
+        return float(len(os.listdir(f"/proc/{os.getpid()}/fd")))
+    except OSError:
+        return None
+
+
+def _rss_bytes() -> Optional[float]:
+    from app.utils.memory import get_rss_bytes
+    rss = get_rss_bytes()
+    return None if rss is None else float(rss)
+
+
+# 全局注册表
+metrics = MetricsRegistry()
+
+# 进程级指标（负载测试用来计算每请求 CPU 开销）
+metrics.gauge("process_cpu_seconds_total", "进程累计 CPU 时间（秒）", callback=time.process_time)
+metrics.gauge("process_resident_memory_bytes", "进程常驻内存（字节）", callback=_rss_bytes)
+metrics.gauge("process_open_fds", "进程打开的文件描述符数量", callback=_open_fds)
@@ -0,0 +1,218 @@
+"""
+模型健康状态模块
+按 Notion 模型 id 记录最近若干次请求的首字节耗时与成败（真实请求与后台探测共用），
+连续失败达到 MODEL_DOWN_AFTER_FAILURES 次即判定为不可用：冷却期内的请求直接失败，不再走一遍上游；
+冷却期过后放行请求试探，成功即恢复。
+后台探测（MODEL_PROBE_INTERVAL > 0 时开启）定期向每个模型发送最小的推理请求。
+探测仍是一次真实的 Notion AI 推理请求（计入账号用量与限流），但不创建、不保存对话线程，
+也不计入进行中的流与上游录制
+"""
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+model_up_gauge = metrics.gauge("model_up", "模型是否可用（1 可用，0 不可用）")
+model_failures_counter = metrics.counter("model_failures_total", "按模型统计的上游失败次数")
+model_rejected_counter = metrics.counter("model_rejected_total", "因模型不可用而直接拒绝的请求数")
+
+UP = "up"
+DOWN = "down"
+UNKNOWN = "unknown"
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """最近邻法求分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+class ModelState:
+    """单个模型的健康状态"""
+
+    def __init__(self, model: str, window: int):
+        self.model = model
+        self.status = UNKNOWN
+        # (时间, 首字节耗时（失败为 None）, 是否成功)
+        self.samples: Deque[Tuple[float, Optional[float], bool]] = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+        self.last_error: Optional[str] = None
+        self.last_checked: Optional[float] = None
+
+    def ttfb_values(self) -> List[float]:
+        return [ttfb for _, ttfb, ok in self.samples if ok and ttfb is not None]
+
+    def recent(self, seconds: float) -> List[Tuple[float, Optional[float], bool]]:
+        """最近 seconds 秒内的样本"""
+        since = time.time() - seconds
+        return [sample for sample in self.samples if sample[0] >= since]
+
+    @property
+    def error_rate(self) -> Optional[float]:
+        if not self.samples:
+            return None
+        return sum(1 for _, _, ok in self.samples if not ok) / len(self.samples)
+
+    def to_dict(self) -> Dict[str, Any]:
+        ttfb = self.ttfb_values()
+        p50 = percentile(ttfb, 0.5)
+        p95 = percentile(ttfb, 0.95)
+        return {
+            "status": self.status,
+            "samples": len(self.samples),
+            "error_rate": round(self.error_rate, 3) if self.error_rate is not None else None,
+            "ttfb_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "ttfb_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in_seconds": round(max(0.0, self.down_until - time.time()), 1) if self.status == DOWN else None,
+            "last_error": self.last_error,
+            "last_checked": self.last_checked,
+        }
+
+
+class ModelHealth:
+    """所有模型的健康状态表，状态变化时通知监听者（例如模型注册表重建 /v1/models）"""
+
+    def __init__(self, window: int = 50):
+        self.window = window
+        self._lock = threading.Lock()
+        self._states: Dict[str, ModelState] = {}
+        self._listeners: List[Callable[[], None]] = []
+
+    def add_listener(self, callback: Callable[[], None]):
+        self._listeners.append(callback)
+
+    def _state(self, model: str) -> ModelState:
+        state = self._states.get(model)
+        if state is None:
+            state = self._states[model] = ModelState(model, self.window)
+        return state
+
+    def get(self, model: str) -> Optional[ModelState]:
+        return self._states.get(model)
+
+    def record_success(self, model: str, ttfb: Optional[float]):
+        now = time.time()
+        with self._lock:
+            state = self._state(model)
+            state.samples.append((now, ttfb, True))
+            state.last_checked = now
+            state.consecutive_failures = 0
+            changed = state.status != UP
+            state.status = UP
+        model_up_gauge.set(1, model=model)
+        if changed:
+            logger.info(f"模型 {model} 可用")
+            self._notify()
+
+    def record_failure(self, model: str, error: str):
+        now = time.time()
+        with self._lock:
+            state = self._state(model)
+            state.samples.append((now, None, False))
+            state.last_checked = now
+            state.last_error = error
+            state.consecutive_failures += 1
+            tripped = state.consecutive_failures >= settings.MODEL_DOWN_AFTER_FAILURES
+            changed = tripped and state.status != DOWN
+            if tripped:
+                # 冷却期过后的试探请求再次失败时，重新开始冷却
+                state.status = DOWN
+                state.down_until = now + settings.MODEL_DOWN_COOLDOWN
+        model_failures_counter.inc(model=model)
+        if changed:
+            model_up_gauge.set(0, model=model)
+            logger.warning(
+                f"模型 {model} 连续失败 {settings.MODEL_DOWN_AFTER_FAILURES} 次，标记为不可用"
+                f"（{settings.MODEL_DOWN_COOLDOWN:.0f}s 内的请求直接失败）: {error}"
+            )
+            self._notify()
+
+    def is_down(self, model: str) -> bool:
+        """冷却期内返回 True；冷却期过后放行请求试探"""
+        state = self._states.get(model)
+        return state is not None and state.status == DOWN and time.time() < state.down_until
+
+    def is_listed_down(self, model: str) -> bool:
+        """是否应从 /v1/models 中隐藏（直到试探或探测成功）"""
+        state = self._states.get(model)
+        return state is not None and state.status == DOWN
+
+    def reject(self, model: str) -> Dict[str, Any]:
+        """记录一次直接拒绝，返回拒绝原因"""
+        model_rejected_counter.inc(model=model)
+        state = self._states[model]
+        return {
+            "last_error": state.last_error,
+            "retry_after": max(1, math.ceil(state.down_until - time.time())),
+        }
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {model: state.to_dict() for model, state in sorted(self._states.items())}
+
+    def _notify(self):
+        for callback in self._listeners:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"模型状态监听回调失败: {e}")
+
+
+class ModelProber:
+    """后台探测：按间隔依次向每个模型发送最小的推理请求（probe_fn 为同步函数，在线程中调用）"""
+
+    def __init__(self, health: ModelHealth, probe_fn: Callable[[str], None], models: Callable[[], Iterable[str]]):
+        self.health = health
+        self._probe_fn = probe_fn
+        self._models = models
+        self._task: Optional[asyncio.Task] = None
+
+    async def probe(self, model: str):
+        """探测一个模型；probe_fn 走正常的请求路径，成败已由其记录，这里只补记超时"""
+        try:
+            await asyncio.wait_for(asyncio.to_thread(self._probe_fn, model), settings.MODEL_PROBE_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.health.record_failure(model, f"探测超时（{settings.MODEL_PROBE_TIMEOUT:.0f}s）")
+        except Exception as e:
+            logger.debug(f"探测模型 {model} 失败: {e}")
+
+    async def probe_all(self):
+        for model in dict.fromkeys(self._models()):
+            await self.probe(model)
+
+    def start(self, interval: float):
+        """启动后台探测（需在协程上下文调用）"""
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run(interval))
+        logger.info(f"模型健康探测已启动（间隔 {interval:.0f}s）")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, interval: float):
+        while True:
+            await self.probe_all()
+            await asyncio.sleep(interval)
+
+
+# 全局实例
+model_health = ModelHealth()
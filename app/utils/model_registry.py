@@ -0,0 +1,187 @@
+"""
+模型注册表
+对外的模型列表由 KNOWN_MODELS / MODEL_MAP 与 Notion 实际提供的模型合并而成：
+后台按 MODEL_REFRESH_INTERVAL 向 Notion 查询可用模型，Notion 已下线的映射不再列出，
+Notion 新增但未映射的模型以其原始 id 列出并可直接使用；健康检查判定为不可用的模型暂时隐藏。
+/v1/models 的响应体预先序列化并附带 ETag，客户端轮询时以 If-None-Match 换取 304
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, NamedTuple, Optional
+
+from app.core.config import settings
+from app.utils.metrics import metrics
+from app.utils.model_health import model_health
+
+logger = logging.getLogger(__name__)
+
+# 未映射且未在 Notion 模型列表中的模型名，回退到此模型
+FALLBACK_NOTION_MODEL = "apple-danish"
+
+refresh_counter = metrics.counter("model_registry_refreshes_total", "向 Notion 查询可用模型的次数")
+models_response_counter = metrics.counter("models_responses_total", "/v1/models 响应次数")
+
+
+class ModelListing(NamedTuple):
+    """某一版本的模型列表（预序列化）"""
+
+    body: bytes
+    etag: str
+    data: List[Dict[str, Any]]
+
+
+def parse_available_models(payload: Any) -> List[str]:
+    """从 Notion getAvailableModels 的响应中取出可用的模型 id"""
+    items = payload.get("models", []) if isinstance(payload, dict) else payload
+    model_ids = []
+    for item in items or []:
+        if isinstance(item, str):
+            model_ids.append(item)
+        elif isinstance(item, dict) and not item.get("isDisabled"):
+            model_id = item.get("model") or item.get("id")
+            if model_id:
+                model_ids.append(model_id)
+    return model_ids
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 是否命中（支持多个值、弱校验前缀与 *）"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class ModelRegistry:
+    """模型列表与模型名解析，fetcher 为同步函数（在线程中调用），返回 Notion 当前可用的模型 id"""
+
+    def __init__(self, fetcher: Optional[Callable[[], Iterable[str]]] = None):
+        self._fetcher = fetcher
+        self._lock = threading.Lock()
+        # Notion 可用的模型 id，None 表示尚未成功查询
+        self._upstream: Optional[FrozenSet[str]] = None
+        # 模型 id -> 首次出现的时间，保证 created 字段与 ETag 在列表不变时保持稳定
+        self._first_seen: Dict[str, int] = {}
+        self._listing = self._build()
+        self._task: Optional[asyncio.Task] = None
+        # 模型可用性变化时重新生成列表
+        model_health.add_listener(self.rebuild)
+        self.refreshed_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def listing(self) -> ModelListing:
+        return self._listing
+
+    def resolve(self, model: str) -> str:
+        """客户端模型名 -> Notion 模型 id"""
+        mapped = settings.MODEL_MAP.get(model)
+        if mapped:
+            return mapped
+        upstream = self._upstream
+        if upstream and model in upstream:
+            return model
+        return FALLBACK_NOTION_MODEL
+
+    def is_known(self, model: str) -> bool:
+        """是否为配置或 Notion 提供的模型名（客户端随意填写的名称返回 False）"""
+        if model in settings.MODEL_MAP or model in settings.KNOWN_MODELS:
+            return True
+        upstream = self._upstream
+        return bool(upstream) and model in upstream
+
+    def _model_ids(self) -> List[str]:
+        upstream = self._upstream
+        if not upstream:
+            # 尚未查询到 Notion 的模型列表，按配置原样列出
+            model_ids = list(settings.KNOWN_MODELS)
+        else:
+            model_ids = [
+                model for model in settings.KNOWN_MODELS
+                if settings.MODEL_MAP.get(model, model) in upstream
+            ]
+            mapped = set(settings.MODEL_MAP.values())
+            model_ids.extend(sorted(upstream - mapped))
+        return [model for model in model_ids if not model_health.is_listed_down(self.resolve(model))]
+
+    def _build(self) -> ModelListing:
+        now = int(time.time())
+        data = []
+        for model_id in self._model_ids():
+            created = self._first_seen.setdefault(model_id, now)
+            data.append({"id": model_id, "object": "model", "created": created, "owned_by": "notion-ai"})
+        body = json.dumps({"object": "list", "data": data}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        return ModelListing(body, etag, data)
+
+    def rebuild(self):
+        with self._lock:
+            self._listing = self._build()
+
+    def update_upstream(self, model_ids: Iterable[str]):
+        """用 Notion 返回的模型 id 更新列表，列表有变化时重新生成响应体与 ETag"""
+        upstream = frozenset(model_ids)
+        with self._lock:
+            self.refreshed_at = time.time()
+            self.last_error = None
+            if not upstream or upstream == self._upstream:
+                return
+            self._upstream = upstream
+            old_ids = {item["id"] for item in self._listing.data}
+            self._listing = self._build()
+        new_ids = {item["id"] for item in self._listing.data}
+        if new_ids != old_ids:
+            logger.info(
+                f"模型列表已更新: 新增 {sorted(new_ids - old_ids) or '无'}，移除 {sorted(old_ids - new_ids) or '无'}"
+            )
+
+    async def refresh(self) -> bool:
+        """向 Notion 查询一次可用模型，失败时保留现有列表"""
+        if self._fetcher is None:
+            return False
+        try:
+            model_ids = await asyncio.to_thread(self._fetcher)
+        except Exception as e:
+            self.last_error = str(e)
+            refresh_counter.inc(result="error")
+            logger.warning(f"查询 Notion 可用模型失败，继续使用现有列表: {e}")
+            return False
+        refresh_counter.inc(result="ok")
+        self.update_upstream(model_ids)
+        return True
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "models": [item["id"] for item in self._listing.data],
+            "etag": self._listing.etag,
+            "upstream_models": sorted(self._upstream) if self._upstream else None,
+            "refreshed_at": self.refreshed_at,
+            "last_error": self.last_error,
+        }
+
+    def start_refreshing(self, interval: float):
+        """启动后台刷新（需在协程上下文调用），启动时立即查询一次"""
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.get_running_loop().create_task(self._refresh_loop(interval))
+
+    async def stop_refreshing(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _refresh_loop(self, interval: float):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(interval)
@@ -0,0 +1,92 @@
+"""
+模型路由模块
+按 MODEL_FALLBACKS 为客户端请求的模型生成候选链（例如 claude-opus-4.5 -> claude-sonnet-4.5），
+并依据模型健康统计中最近 MODEL_ROUTING_WINDOW 秒的首字节耗时 p95 与错误率排序：
+不可用的模型跳过，超出 SLO 的模型排在达标的候选之后。请求在产出首个文本前失败时换用下一个候选。
+降级的模型不再接收流量后，其样本随时间窗口过期，之后自动恢复为首选（开启后台探测时恢复更及时）
+"""
+import logging
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+from app.utils.metrics import metrics
+from app.utils.model_health import ModelHealth, percentile
+
+logger = logging.getLogger(__name__)
+
+fallback_counter = metrics.counter("model_fallbacks_total", "改用回退模型的次数（unhealthy 为路由时避开，error 为请求失败后切换）")
+
+
+class Route(NamedTuple):
+    """一个候选：客户端模型名、对应的 Notion 模型 id，以及降级原因（达标时为 None）"""
+
+    model: str
+    notion_model: str
+    degraded: Optional[str] = None
+
+
+class ModelRouter:
+    """按健康统计为请求选择模型，resolve 为客户端模型名 -> Notion 模型 id 的映射函数"""
+
+    def __init__(self, health: ModelHealth, resolve: Callable[[str], str]):
+        self.health = health
+        self._resolve = resolve
+
+    def chain(self, model: str) -> List[str]:
+        """请求的模型及其回退模型（按配置顺序，去重）"""
+        return list(dict.fromkeys([model, *settings.MODEL_FALLBACKS.get(model, [])]))
+
+    def assess(self, notion_model: str) -> Tuple[Optional[str], Optional[float]]:
+        """
+        根据最近的样本评估模型
+
+        Returns:
+            (降级原因，达标时为 None；首字节耗时 p95，样本不足时为 None)
+        """
+        state = self.health.get(notion_model)
+        if state is None:
+            return None, None
+        samples = state.recent(settings.MODEL_ROUTING_WINDOW)
+        ttfb = [value for _, value, ok in samples if ok and value is not None]
+        p95 = percentile(ttfb, 0.95) if len(ttfb) >= settings.MODEL_ROUTING_MIN_SAMPLES else None
+        if len(samples) >= settings.MODEL_ROUTING_MIN_SAMPLES:
+            error_rate = sum(1 for _, _, ok in samples if not ok) / len(samples)
+            if error_rate > settings.MODEL_MAX_ERROR_RATE:
+                return f"错误率 {error_rate:.0%}", p95
+        if p95 is not None and settings.MODEL_TTFB_SLO > 0 and p95 > settings.MODEL_TTFB_SLO:
+            return f"首字节耗时 p95 {p95:.1f}s", p95
+        return None, p95
+
+    def route(self, model: str) -> List[Route]:
+        """
+        按优先顺序返回可用的候选：达标的候选保持配置顺序在前，降级的候选按 p95 升序在后
+
+        Returns:
+            候选列表；为空表示请求的模型及其回退模型均不可用
+        """
+        healthy: List[Route] = []
+        degraded: List[Tuple[float, Route]] = []
+        seen = set()
+        for name in self.chain(model):
+            notion_model = self._resolve(name)
+            if notion_model in seen or self.health.is_down(notion_model):
+                continue
+            seen.add(notion_model)
+            reason, p95 = self.assess(notion_model)
+            if reason is None:
+                healthy.append(Route(name, notion_model))
+            else:
+                degraded.append((p95 if p95 is not None else float("inf"), Route(name, notion_model, reason)))
+        degraded.sort(key=lambda item: item[0])
+        return healthy + [route for _, route in degraded]
+
+    def record_fallback(self, requested: str, served: str, reason: str, detail: str):
+        fallback_counter.inc(requested=requested, served=served, reason=reason)
+        logger.warning(f"模型 {requested} 改由 {served} 响应: {detail}")
+
+    def info(self) -> Dict[str, Any]:
+        """各回退链当前的路由顺序"""
+        return {
+            "fallbacks": settings.MODEL_FALLBACKS,
+            "routes": {model: [route._asdict() for route in self.route(model)] for model in settings.MODEL_FALLBACKS},
+        }
@@ -1,78 +1,134 @@
 """
 Windows 系统通知模块
 使用 plyer 库发送 Toast 通知
+通知由后台线程逐个发送，调用方（包括请求处理路径）只负责入队，不会被阻塞；
+同一类通知在最小间隔内只发送一次，队列已满时直接丢弃
 """
 from plyer import notification
+import atexit
 import logging
+import queue
+import threading
+import time
+from typing import Dict, Optional
+
+from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+APP_NAME = "Notion AI Proxy"
+
+
+class Notifier:
+    """后台发送系统通知，按 key 去重限频"""
+
+    def __init__(self, maxsize: int = 16):
+        self._queue: "queue.Queue" = queue.Queue(maxsize)
+        self._lock = threading.Lock()
+        # key -> 最近一次入队的时间
+        self._last_sent: Dict[str, float] = {}
+        self._thread: Optional[threading.Thread] = None
+        self.sent = 0
+        self.suppressed = 0
+
+    def notify(self, key: str, title: str, message: str, timeout: int = 10, min_interval: float = 0.0) -> bool:
+        """
+        入队一条通知
+
+        Args:
+            key: 通知类别，同一类别在 min_interval 秒内只发送一次
+            title: 标题
+            message: 内容
+            timeout: 通知显示的秒数
+            min_interval: 最小间隔（秒）
+
+        Returns:
+            是否入队（被去重或队列已满时返回 False）
+        """
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_sent.get(key)
+            if last is not None and now - last < min_interval:
+                self.suppressed += 1
+                logger.debug(f"通知已去重: {message}")
+                return False
+            try:
+                self._queue.put_nowait((title, message, timeout))
+            except queue.Full:
+                self.suppressed += 1
+                logger.warning(f"通知队列已满，丢弃通知: {message}")
+                return False
+            self._last_sent[key] = now
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="notifier", daemon=True)
+                self._thread.start()
+        return True
+
+    def flush(self, timeout: float = 3.0):
+        """等待已入队的通知发送完毕（退出前调用）"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def _run(self):
+        while True:
+            title, message, timeout = self._queue.get()
+            try:
+                notification.notify(title=title, message=message, app_name=APP_NAME, timeout=timeout)
+                self.sent += 1
+                logger.info(f"已发送通知: {message}")
+            except Exception as e:
+                logger.error(f"发送通知失败: {e}")
+            finally:
+                self._queue.task_done()
+
+
+# 全局实例
+notifier = Notifier()
+atexit.register(notifier.flush)
+
 
 def notify_token_expired():
     """
-    发送 Token 失效通知
+    发送 Token 失效通知（最小间隔 NOTIFY_MIN_INTERVAL 秒）
     """
-    try:
-        notification.notify(
-            title="Notion AI Proxy",
-            message="Token 已失效，请更新 token_v2",
-            app_name="Notion AI Proxy",
-            timeout=10  # 通知显示 10 秒
-        )
-        logger.info("已发送 Token 失效通知")
-    except Exception as e:
-        logger.error(f"发送通知失败: {e}")
+    notifier.notify(
+        "token_expired",
+        APP_NAME,
+        "Token 已失效，请更新 token_v2",
+        timeout=10,  # 通知显示 10 秒
+        min_interval=settings.NOTIFY_MIN_INTERVAL,
+    )
 
 
 def notify_service_started(port: str):
     """
     发送服务启动通知
-    
+
     Args:
         port: 服务端口
     """
-    try:
-        notification.notify(
-            title="Notion AI Proxy",
-            message=f"服务已启动，端口: {port}",
-            app_name="Notion AI Proxy",
-            timeout=5
-        )
-        logger.info(f"已发送服务启动通知 (端口: {port})")
-    except Exception as e:
-        logger.error(f"发送通知失败: {e}")
+    notifier.notify("service_started", APP_NAME, f"服务已启动，端口: {port}", timeout=5)
 
 
 def notify_service_stopped():
     """
     发送服务停止通知
     """
-    try:
-        notification.notify(
-            title="Notion AI Proxy",
-            message="服务已停止",
-            app_name="Notion AI Proxy",
-            timeout=5
-        )
-        logger.info("已发送服务停止通知")
-    except Exception as e:
-        logger.error(f"发送通知失败: {e}")
+    notifier.notify("service_stopped", APP_NAME, "服务已停止", timeout=5)
 
 
 def notify_error(message: str):
     """
-    发送错误通知
-    
+    发送错误通知（相同内容最小间隔 NOTIFY_MIN_INTERVAL 秒）
+
     Args:
         message: 错误消息
     """
-    try:
-        notification.notify(
-            title="Notion AI Proxy - 错误",
-            message=message,
-            app_name="Notion AI Proxy",
-            timeout=10
-        )
-        logger.info(f"已发送错误通知: {message}")
-    except Exception as e:
-        logger.error(f"发送通知失败: {e}")
+    notifier.notify(
+        f"error:{message}",
+        f"{APP_NAME} - 错误",
+        message,
+        timeout=10,
+        min_interval=settings.NOTIFY_MIN_INTERVAL,
+    )
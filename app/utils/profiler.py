@@ -0,0 +1,121 @@
+"""
+采样式 CPU 分析模块
+定期读取所有线程的调用栈（sys._current_frames），输出 flamegraph 可用的折叠栈格式：
+    线程名;最外层函数;...;最内层函数 采样次数
+只读取栈信息，不注入 trace/profile 钩子，开销与采样频率成正比，可在生产环境使用。
+默认跳过停在阻塞等待上的线程（Event.wait、queue.get、select 等，例如空闲的写入线程、线程池与事件循环），
+结果只反映实际占用 CPU 的调用栈；include_idle=True 时保留这些线程，得到按墙钟时间统计的结果
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ProfilerBusyError(Exception):
+    """已有分析任务在运行"""
+    pass
+
+
+# 线程停在这些标准库函数里时处于阻塞等待（锁、队列、select），不占用 CPU：(文件名, 函数名)
+IDLE_LEAF_FRAMES = frozenset({
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+    ("socket.py", "readinto"),
+})
+
+
+def _is_idle(frame: FrameType) -> bool:
+    """最内层的 Python 栈帧是否为已知的阻塞等待"""
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAF_FRAMES
+
+
+def _frame_label(frame: FrameType) -> str:
+    """单个栈帧的显示名：函数名 (文件名:行号)"""
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    filename = os.path.basename(code.co_filename)
+    # 分号是折叠栈格式的分隔符
+    return f"{name} ({filename}:{frame.f_lineno})".replace(";", ":")
+
+
+def _collapse(frame: Optional[FrameType], max_depth: int) -> str:
+    """把调用栈折叠成 root;...;leaf"""
+    labels = []
+    while frame is not None and len(labels) < max_depth:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return ";".join(labels)
+
+
+class SamplingProfiler:
+    """同一时间只允许一个分析任务，避免叠加开销"""
+
+    def __init__(self, max_depth: int = 128):
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    def profile(self, seconds: float, interval: float = 0.01, include_idle: bool = False) -> str:
+        """
+        阻塞采样 seconds 秒（应在工作线程中调用）
+
+        Args:
+            seconds: 采样时长
+            interval: 采样间隔（秒）
+            include_idle: 是否保留停在阻塞等待上的线程（墙钟时间分析）
+
+        Returns:
+            折叠栈文本，可直接交给 flamegraph.pl / speedscope / inferno
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("已有 CPU 分析任务正在运行")
+        try:
+            logger.info(f"开始 CPU 采样: {seconds}s, 间隔 {interval * 1000:.1f}ms")
+            stacks: Counter = Counter()
+            samples = 0
+            idle = 0
+            own_ident = threading.get_ident()
+            thread_names: Dict[int, str] = {}
+            deadline = time.perf_counter() + seconds
+
+            while time.perf_counter() < deadline:
+                frames = sys._current_frames()
+                for ident, frame in frames.items():
+                    if ident == own_ident:
+                        continue
+                    if not include_idle and _is_idle(frame):
+                        idle += 1
+                        continue
+                    name = thread_names.get(ident)
+                    if name is None:
+                        # 新线程出现时才刷新线程名表
+                        thread_names = {t.ident: t.name for t in threading.enumerate()}
+                        name = thread_names.get(ident, f"thread-{ident}")
+                    stacks[f"{name};{_collapse(frame, self.max_depth)}"] += 1
+                del frames
+                samples += 1
+                time.sleep(interval)
+
+            logger.info(f"CPU 采样完成: {samples} 轮, {len(stacks)} 个不同调用栈, 跳过 {idle} 个空闲线程样本")
+            return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        finally:
+            self._lock.release()
+
+
+# 全局分析器实例
+cpu_profiler = SamplingProfiler()
@@ -0,0 +1,93 @@
+"""
+进行中流式请求的登记模块
+记录每个上游流的进度与内存占用（缓冲区、已输出文本等），
+用于区分内存泄漏与正常的大响应
+"""
+import sys
+import threading
+import time
+from typing import Any, Dict, List
+
+from app.utils.metrics import metrics
+
+
+class StreamStats:
+    """单个上游流的统计"""
+
+    __slots__ = (
+        "trace_id", "model", "started", "chunks", "bytes_in",
+        "buffer_bytes", "last_text_bytes", "full_content_bytes", "output_chars",
+    )
+
+    def __init__(self, trace_id: str, model: str):
+        self.trace_id = trace_id
+        self.model = model
+        self.started = time.time()
+        self.chunks = 0
+        self.bytes_in = 0
+        self.buffer_bytes = 0
+        self.last_text_bytes = 0
+        self.full_content_bytes = 0
+        self.output_chars = 0
+
+    def update(self, chunk_size: int, buffer: str, last_text: str, full_content: str):
+        """每收到一个上游 chunk 调用一次（sys.getsizeof 为 O(1)）"""
+        self.chunks += 1
+        self.bytes_in += chunk_size
+        self.buffer_bytes = sys.getsizeof(buffer)
+        self.last_text_bytes = sys.getsizeof(last_text)
+        self.full_content_bytes = sys.getsizeof(full_content)
+        self.output_chars = len(last_text)
+
+    @property
+    def held_bytes(self) -> int:
+        """该流当前持有的字符串内存"""
+        return self.buffer_bytes + self.last_text_bytes + self.full_content_bytes
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "model": self.model,
+            "age_seconds": round(time.time() - self.started, 3),
+            "chunks": self.chunks,
+            "bytes_in": self.bytes_in,
+            "buffer_bytes": self.buffer_bytes,
+            "last_text_bytes": self.last_text_bytes,
+            "full_content_bytes": self.full_content_bytes,
+            "held_bytes": self.held_bytes,
+            "output_chars": self.output_chars,
+        }
+
+
+class StreamTracker:
+    """进行中流的登记表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._streams: Dict[int, StreamStats] = {}
+
+    def open(self, trace_id: str, model: str) -> StreamStats:
+        stats = StreamStats(trace_id, model)
+        with self._lock:
+            self._streams[id(stats)] = stats
+        return stats
+
+    def close(self, stats: StreamStats):
+        with self._lock:
+            self._streams.pop(id(stats), None)
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """按持有内存从大到小返回所有进行中的流"""
+        with self._lock:
+            streams = list(self._streams.values())
+        streams.sort(key=lambda s: s.held_bytes, reverse=True)
+        return [s.to_dict() for s in streams]
+
+
+# 全局实例
+stream_tracker = StreamTracker()
+
+metrics.gauge("upstream_active_streams", "进行中的上游流数量", callback=lambda: float(len(stream_tracker)))
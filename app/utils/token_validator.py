@@ -0,0 +1,141 @@
+"""
+Token 校验模块
+后台定期用当前凭证向 Notion 发送一个轻量的认证请求，在用户请求失败之前发现 token_v2 失效：
+确认失效后新请求直接返回错误（不再等待上游 401），并发送一次桌面通知；
+凭证热更新后立即校验新凭证。请求遇到 401/403 时只触发一次提前复核，由复核结果决定是否标记失效
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.credentials import CredentialStore, Credentials
+from app.utils.metrics import metrics
+from app.utils.notifier import notify_token_expired
+
+logger = logging.getLogger(__name__)
+
+VALID = "valid"
+EXPIRED = "expired"
+UNKNOWN = "unknown"
+
+# 已失效时的复核间隔（秒），避免误判长时间阻断请求
+EXPIRED_RECHECK_SECONDS = 60.0
+# 由请求触发的复核之间的最小间隔（秒）
+MIN_RECHECK_GAP_SECONDS = 10.0
+# 首次被拒绝后隔多久再确认一次（秒），两次均被拒绝才标记失效
+CONFIRM_DELAY_SECONDS = 2.0
+
+token_valid_gauge = metrics.gauge("notion_token_valid", "Token 状态（1 有效，0 已失效，-1 未知）")
+token_check_counter = metrics.counter("notion_token_checks_total", "Token 校验次数")
+
+
+class TokenValidator:
+    """当前凭证的有效性，check_fn 为同步函数（在线程中调用）：有效返回 True，被拒绝返回 False，其他错误抛出异常"""
+
+    def __init__(self, store: CredentialStore, check_fn: Callable[[Credentials], bool]):
+        self.store = store
+        self._check_fn = check_fn
+        self._task: Optional[asyncio.Task] = None
+        # 请求遇到 401/403 后置位，后台循环据此提前复核
+        self._recheck = False
+        # 校验结果对应的凭证版本，凭证更新后旧结果不再适用
+        self.version: Optional[int] = None
+        self.status = UNKNOWN
+        self.checked_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        # 确认失效时的回调（在事件循环线程中调用，参数为失效的凭证快照）
+        self._expired_listeners: List[Callable[[Credentials], Any]] = []
+        token_valid_gauge.set(-1)
+
+    def add_expired_listener(self, callback: Callable[[Credentials], Any]):
+        self._expired_listeners.append(callback)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def is_expired(self, creds: Credentials) -> bool:
+        """该凭证是否已确认失效"""
+        return self.status == EXPIRED and self.version == creds.version
+
+    def report_rejected(self, creds: Credentials):
+        """请求被 Notion 以 401/403 拒绝：后台校验运行时交给其复核，否则直接发送通知（通知本身去重限频）"""
+        if self.running:
+            self._recheck = True
+        else:
+            notify_token_expired()
+
+    async def validate(self) -> str:
+        """校验一次当前凭证，网络或上游错误时保持原状态"""
+        creds = self.store.current
+        try:
+            valid = await asyncio.to_thread(self._check_fn, creds)
+            if not valid and not self.is_expired(creds):
+                # 偶发的 401 不足以阻断所有请求，稍后再确认一次
+                await asyncio.sleep(CONFIRM_DELAY_SECONDS)
+                valid = await asyncio.to_thread(self._check_fn, creds)
+        except Exception as e:
+            token_check_counter.inc(result="error")
+            self.last_error = str(e)
+            logger.warning(f"校验 Token 失败（保持当前状态）: {e}")
+            return self.status
+        token_check_counter.inc(result=VALID if valid else EXPIRED)
+        self._set(creds, VALID if valid else EXPIRED)
+        return self.status
+
+    def _set(self, creds: Credentials, status: str):
+        previous = self.status if self.version == creds.version else UNKNOWN
+        self.version = creds.version
+        self.status = status
+        self.checked_at = time.time()
+        self.last_error = None
+        token_valid_gauge.set(1 if status == VALID else 0)
+        if status == EXPIRED and previous != EXPIRED:
+            logger.error(f"Token 已失效（凭证版本 {creds.version}），新请求将直接返回错误，请更新 token_v2")
+            notify_token_expired()
+            for callback in self._expired_listeners:
+                try:
+                    callback(creds)
+                except Exception as e:
+                    logger.error(f"Token 失效回调失败: {e}")
+        elif status == VALID and previous == EXPIRED:
+            logger.info(f"Token 已恢复有效（凭证版本 {creds.version}）")
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "status": self.status if self.version == self.store.current.version else UNKNOWN,
+            "version": self.version,
+            "checked_at": self.checked_at,
+            "last_error": self.last_error,
+            "validating": self.running,
+        }
+
+    def start(self, interval: float):
+        """启动后台校验（需在协程上下文调用），启动时立即校验一次"""
+        if self.running:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run(interval))
+        logger.info(f"Token 后台校验已启动（间隔 {interval:.0f}s）")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, interval: float):
+        while True:
+            self._recheck = False
+            await self.validate()
+            checked = time.monotonic()
+            wait = min(interval, EXPIRED_RECHECK_SECONDS) if self.status == EXPIRED else interval
+            version = self.store.current.version
+            # 到期、凭证更新或请求触发复核时再次校验
+            while time.monotonic() - checked < wait and self.store.current.version == version:
+                if self._recheck and time.monotonic() - checked >= MIN_RECHECK_GAP_SECONDS:
+                    break
+                await asyncio.sleep(1)
@@ -0,0 +1,236 @@
+"""
+请求链路追踪模块
+为每个请求记录分阶段耗时（span），按采样率导出为 Chrome Trace Event 格式，
+导出文件可直接在 chrome://tracing 或 https://ui.perfetto.dev 中打开。
+写盘在后台线程中进行，文件超过 TRACE_MAX_MB 时轮转，只保留 TRACE_MAX_FILES 个历史文件
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import count
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 默认导出文件
+DEFAULT_TRACE_FILE = Path.home() / ".notion-ai-proxy" / "traces.json"
+
+# 当前请求的 trace（由 main.py 设置，provider 读取）
+current_trace: ContextVar[Optional["RequestTrace"]] = ContextVar("current_trace", default=None)
+
+# 用于区分并发请求的 tid，使每个请求在时间线上占一行
+_trace_seq = count(1)
+
+# Server-Timing 指标名 -> 阶段名
+SERVER_TIMING_STAGES = (
+    ("queue", "queue"),
+    ("upstream-connect", "upstream_connect"),
+    ("upstream-ttfb", "upstream_ttfb"),
+)
+
+
+class RequestTrace:
+    """单个请求的链路记录"""
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: Optional[str] = None,
+        sampled: bool = False,
+        start: Optional[float] = None,
+    ):
+        self.name = name
+        self.trace_id = trace_id or str(uuid.uuid4())
+        self.sampled = sampled
+        self.tid = next(_trace_seq)
+        now = time.perf_counter()
+        # start 为 perf_counter 时间戳，可早于创建时刻（例如请求到达时间）
+        self.start = start if start is not None else now
+        self.wall_start = time.time() - (now - self.start)
+        # (name, 相对起点秒数, 持续秒数, args)
+        self.spans: List[tuple] = []
+        # 时间点：name -> 相对起点秒数（只记录第一次）
+        self.marks: Dict[str, float] = {}
+        # 分散在整个流中的阶段累计耗时（解析、写客户端等）
+        self.totals: Dict[str, float] = {}
+        self.attrs: Dict[str, Any] = {}
+        self.finished = False
+
+    def elapsed(self) -> float:
+        """距请求开始的秒数"""
+        return time.perf_counter() - self.start
+
+    @contextmanager
+    def span(self, name: str, **args):
+        """记录一个连续阶段"""
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, begin, time.perf_counter(), **args)
+
+    def add_span(self, name: str, begin: float, end: float, **args):
+        """以 perf_counter 时间戳记录阶段"""
+        self.spans.append((name, begin - self.start, end - begin, args))
+
+    def mark(self, name: str):
+        """记录时间点（重复调用只保留第一次）"""
+        if name not in self.marks:
+            self.marks[name] = self.elapsed()
+
+    def add(self, name: str, seconds: float):
+        """累加某个阶段的耗时"""
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+
+    def set(self, **attrs):
+        """附加请求属性（模型、输出长度等）"""
+        self.attrs.update(attrs)
+
+    def span_duration(self, name: str) -> Optional[float]:
+        """获取第一个同名阶段的耗时（秒）"""
+        for span_name, _, duration, _ in self.spans:
+            if span_name == name:
+                return duration
+        return None
+
+    def server_timing(self, include_total: bool = False) -> str:
+        """生成 Server-Timing 格式的耗时（毫秒），只包含已完成的阶段"""
+        parts = []
+        for metric, stage in SERVER_TIMING_STAGES:
+            duration = self.span_duration(stage)
+            if duration is not None:
+                parts.append(f"{metric};dur={duration * 1000:.1f}")
+        if include_total:
+            parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+    def summary(self) -> str:
+        """单行耗时摘要，用于日志"""
+        parts = [f"{name}={duration * 1000:.1f}ms" for name, _, duration, _ in self.spans]
+        parts += [f"{name}={value * 1000:.1f}ms" for name, value in self.totals.items()]
+        parts.append(f"total={self.elapsed() * 1000:.1f}ms")
+        return " ".join(parts)
+
+    def to_events(self) -> List[Dict[str, Any]]:
+        """转换为 Chrome Trace Event（complete / instant 事件）"""
+        pid = os.getpid()
+        base_us = self.wall_start * 1_000_000
+        total = self.elapsed()
+        events = [{
+            "name": self.name,
+            "cat": "request",
+            "ph": "X",
+            "ts": base_us,
+            "dur": total * 1_000_000,
+            "pid": pid,
+            "tid": self.tid,
+            "args": {
+                "traceId": self.trace_id,
+                **self.attrs,
+                **{f"{name}_ms": round(value * 1000, 3) for name, value in self.totals.items()},
+            },
+        }]
+        for name, offset, duration, args in self.spans:
+            events.append({
+                "name": name,
+                "cat": "stage",
+                "ph": "X",
+                "ts": base_us + offset * 1_000_000,
+                "dur": duration * 1_000_000,
+                "pid": pid,
+                "tid": self.tid,
+                "args": {"traceId": self.trace_id, **args},
+            })
+        for name, offset in self.marks.items():
+            events.append({
+                "name": name,
+                "cat": "mark",
+                "ph": "i",
+                "s": "t",
+                "ts": base_us + offset * 1_000_000,
+                "pid": pid,
+                "tid": self.tid,
+                "args": {"traceId": self.trace_id},
+            })
+        return events
+
+
+class Tracer:
+    """创建 trace 并按采样率导出到本地文件，后台线程写盘"""
+
+    def __init__(self):
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def export_file(self) -> Path:
+        return Path(settings.TRACE_EXPORT_FILE) if settings.TRACE_EXPORT_FILE else DEFAULT_TRACE_FILE
+
+    def start_trace(self, name: str, start: Optional[float] = None) -> RequestTrace:
+        """开始一个新的请求 trace，按 TRACE_SAMPLE_RATE 决定是否导出"""
+        rate = settings.TRACE_SAMPLE_RATE
+        sampled = rate > 0 and (rate >= 1 or random.random() < rate)
+        return RequestTrace(name, sampled=sampled, start=start)
+
+    def finish(self, trace: RequestTrace):
+        """结束 trace：输出耗时摘要，命中采样时写入导出文件"""
+        if trace.finished:
+            return
+        trace.finished = True
+        logger.info(f"链路耗时 [{trace.trace_id}] {trace.summary()}")
+        if trace.sampled:
+            self._export(trace.to_events())
+
+    def _export(self, events: List[Dict[str, Any]]):
+        """提交到后台线程写盘，避免在事件循环中进行文件操作"""
+        lines = "".join(json.dumps(event, ensure_ascii=False) + ",\n" for event in events)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trace-writer")
+        self._executor.submit(self._write, self.export_file, lines)
+
+    def _write(self, path: Path, lines: str):
+        """
+        以 JSON Array 格式追加写入
+
+        Trace Event 格式允许省略结尾的 ]，因此可以逐行追加，进程崩溃也不会损坏已有数据
+        """
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            size = path.stat().st_size if path.exists() else 0
+            if size and size + len(lines) > settings.TRACE_MAX_MB * 1024 * 1024:
+                self._rotate(path)
+                size = 0
+            with open(path, "a", encoding="utf-8") as f:
+                if size == 0:
+                    f.write("[\n")
+                f.write(lines)
+        except OSError as e:
+            logger.error(f"写入 trace 文件失败: {e}")
+
+    def _rotate(self, path: Path):
+        """traces.json -> traces.json.1 -> traces.json.2 ...，只保留 TRACE_MAX_FILES 个历史文件"""
+        keep = max(0, settings.TRACE_MAX_FILES)
+        path.with_name(f"{path.name}.{keep}").unlink(missing_ok=True)
+        for index in range(keep - 1, 0, -1):
+            source = path.with_name(f"{path.name}.{index}")
+            if source.exists():
+                source.replace(path.with_name(f"{path.name}.{index + 1}"))
+        if keep:
+            path.replace(path.with_name(f"{path.name}.1"))
+        else:
+            path.unlink(missing_ok=True)
+
+
+# 全局 tracer 实例
+tracer = Tracer()
@@ -0,0 +1,155 @@
+"""
+用量统计模块
+Notion 不返回 token 用量，这里用近似算法估算 prompt / completion token 数：
+ASCII 文本约 4 个字符 1 个 token，中日韩等多字节字符约 1 个字符 1 个 token。
+估算只依赖 len() 与 UTF-8 编码长度（均为 C 实现），并按消息缓存，多轮对话中重复的历史不会重复计算。
+结果写入响应的 usage 字段，并按模型与 API Key 汇总到 /metrics
+"""
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.utils.metrics import metrics
+
+# OpenAI 的计数约定：每条消息额外约 4 个 token（角色与分隔符），回复前缀约 3 个 token
+TOKENS_PER_MESSAGE = 4
+TOKENS_REPLY_PRIMING = 3
+# 按 Key 汇总时最多区分的 Key 数量，超出的归入 other，避免标签基数失控
+MAX_TRACKED_KEYS = 100
+
+prompt_tokens_counter = metrics.counter("usage_prompt_tokens_total", "估算的 prompt token 总数")
+completion_tokens_counter = metrics.counter("usage_completion_tokens_total", "估算的 completion token 总数")
+usage_requests_counter = metrics.counter("usage_requests_total", "计入用量统计的请求数")
+
+
+def estimate_from_counts(chars: int, utf8_bytes: int) -> int:
+    """根据字符数与 UTF-8 字节数估算 token 数"""
+    if chars <= 0:
+        return 0
+    # 3 字节字符（中日韩）每个比 ASCII 多 2 字节，据此估算宽字符数量
+    wide = min(chars, (utf8_bytes - chars) // 2)
+    narrow = chars - wide
+    return max(1, math.ceil(narrow / 4) + wide)
+
+
+def _utf8_len(text: str) -> int:
+    return len(text.encode("utf-8", "surrogatepass"))
+
+
+def estimate_text(text: str) -> int:
+    """估算一段文本的 token 数"""
+    if not text:
+        return 0
+    return estimate_from_counts(len(text), _utf8_len(text))
+
+
+def message_text(content: Any) -> str:
+    """取出消息中的文本（兼容 content 为分段列表的多模态格式）"""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(
+            part.get("text", "") for part in content
+            if isinstance(part, dict) and part.get("type") == "text"
+        )
+    return "" if content is None else str(content)
+
+
+class TokenEstimator:
+    """带 LRU 缓存的 token 估算器"""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        # 键只保存长度与哈希，不持有消息文本本身
+        self._cache: "OrderedDict[Tuple[str, int, int], int]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 命中统计用普通整数，避免热路径上每条消息都更新带标签的指标
+        self.hits = 0
+        self.misses = 0
+
+    def count_message(self, message: Dict[str, Any]) -> int:
+        role = str(message.get("role", "user"))
+        text = message_text(message.get("content", ""))
+        key = (role, len(text), hash(text))
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        tokens = TOKENS_PER_MESSAGE + estimate_text(text)
+        with self._lock:
+            self._cache[key] = tokens
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def count_messages(self, messages: list) -> int:
+        """估算整个对话的 prompt token 数"""
+        if not messages:
+            return 0
+        return TOKENS_REPLY_PRIMING + sum(self.count_message(m) for m in messages if isinstance(m, dict))
+
+
+class CompletionCounter:
+    """流式输出时逐块累计字符数与字节数，结束时一次性估算，避免每个小块单独取整造成高估"""
+
+    __slots__ = ("chars", "utf8_bytes")
+
+    def __init__(self):
+        self.chars = 0
+        self.utf8_bytes = 0
+
+    def add(self, text: str):
+        self.chars += len(text)
+        self.utf8_bytes += _utf8_len(text)
+
+    @property
+    def tokens(self) -> int:
+        return estimate_from_counts(self.chars, self.utf8_bytes)
+
+
+def key_fingerprint(authorization: Optional[str]) -> str:
+    """API Key 的短指纹，用作统计标签（不暴露原始 Key）"""
+    if not authorization:
+        return "anonymous"
+    token = authorization.split(" ")[-1]
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:8]
+
+
+def build_usage(prompt_tokens: int, completion_tokens: int) -> Dict[str, int]:
+    """OpenAI 格式的 usage 字段"""
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+_tracked_keys = set()
+_tracked_keys_lock = threading.Lock()
+
+
+def record_usage(model: str, key: str, prompt_tokens: int, completion_tokens: int):
+    """按模型与 Key 汇总用量"""
+    with _tracked_keys_lock:
+        if key not in _tracked_keys:
+            if len(_tracked_keys) >= MAX_TRACKED_KEYS:
+                key = "other"
+            else:
+                _tracked_keys.add(key)
+    prompt_tokens_counter.inc(prompt_tokens, model=model, key=key)
+    completion_tokens_counter.inc(completion_tokens, model=model, key=key)
+    usage_requests_counter.inc(model=model, key=key)
+
+
+# 全局实例
+token_estimator = TokenEstimator()
+
+metrics.gauge("usage_estimate_cache_hits", "消息 token 估算缓存命中次数", callback=lambda: float(token_estimator.hits))
+metrics.gauge("usage_estimate_cache_misses", "消息 token 估算缓存未命中次数", callback=lambda: float(token_estimator.misses))
@@ -0,0 +1,294 @@
+"""
+本地 Notion 替身服务器
+实现 /api/v3/runInferenceTranscript、/api/v3/saveTransactionsFanout 与 /api/v3/getAvailableModels，
+按真实协议回放 agent-inference / record-map / patch 数据帧，用于在不访问 notion.so 的情况下压测代理
+
+用法:
+    python -m benchmarks.fake_notion --port 9100 --token-rate 50 --ttfb-ms 800 --rate-429 0.05
+
+代理端设置 NOTION_BASE_URL=http://127.0.0.1:9100 即可指向替身
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from typing import Dict, Iterator, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+
+# 回放文本语料（中英混排，不含花括号，避免干扰代理按括号切分 JSON 帧）
+CORPUS = (
+    "Notion AI 是一个集成在 Notion 工作区中的智能助手，可以帮助你撰写、总结和整理内容。"
+    "It can draft documents, answer questions about your workspace, and translate text between languages. "
+    "在实际使用中，响应通常以流式方式返回，每个数据帧携带截至目前的完整文本。"
+    "Streaming responses let clients render partial output while the model is still generating, "
+    "which keeps perceived latency low even for long answers. "
+    "下面是一段示例代码：def add(a, b): return a + b，以及一个列表 [1, 2, 3]。"
+)
+
+# 近似 token 切分：连续的英文/数字为一个 token，单个中文字符或标点为一个 token
+_TOKEN_RE = re.compile(r"[A-Za-z0-9_]+\s*|\s+|[^\sA-Za-z0-9_]")
+
+PROTOCOLS = ("agent-inference", "patch")
+
+# getAvailableModels 返回的模型（与代理 MODEL_MAP 中可用的映射一致）
+AVAILABLE_MODELS = ("apple-danish", "anthropic-sonnet-alt", "openai-turbo", "anthropic-opus-4.1", "openai-gpt-4.1")
+
+
+def generate_tokens(count: int, seed: int = 0) -> List[str]:
+    """从语料循环生成 count 个 token"""
+    base = _TOKEN_RE.findall(CORPUS)
+    rng = random.Random(seed)
+    offset = rng.randrange(len(base))
+    return [base[(offset + i) % len(base)] for i in range(count)]
+
+
+def _record_map_frame(text: str, model: str, user_text: str) -> Dict:
+    """结尾的 record-map 帧，结构与真实响应一致（config / user / agent-inference 步骤）"""
+    space_id = str(uuid.uuid4())
+    thread_id = str(uuid.uuid4())
+
+    def message(step: Dict) -> Dict:
+        message_id = str(uuid.uuid4())
+        return {
+            "spaceId": space_id,
+            "value": {
+                "value": {
+                    "id": message_id,
+                    "version": 2,
+                    "space_id": space_id,
+                    "step": {"id": message_id, **step},
+                    "parent_id": thread_id,
+                    "parent_table": "thread",
+                    "created_time": int(time.time() * 1000),
+                    "data": {"completed": True},
+                },
+                "role": "editor",
+            },
+        }
+
+    steps = [
+        {"type": "config", "value": {"type": "workflow", "model": model, "useWebSearch": True}},
+        {"type": "user", "value": [[user_text]]},
+        {"type": "agent-inference", "value": [{"type": "text", "content": text}]},
+    ]
+    return {
+        "type": "record-map",
+        "recordMap": {
+            "__version__": 3,
+            "thread_message": {str(uuid.uuid4()): message(step) for step in steps},
+        },
+    }
+
+
+def build_frames(
+    tokens: List[str],
+    protocol: str = "agent-inference",
+    tokens_per_frame: int = 1,
+    model: str = "apple-danish",
+    user_text: str = "",
+) -> Iterator[Dict]:
+    """
+    按协议生成数据帧
+
+    agent-inference: 每帧携带截至目前的完整文本（开头带 <lang> 标签），最后附 record-map
+    patch: 旧版协议，每帧只携带增量
+    """
+    if protocol not in PROTOCOLS:
+        raise ValueError(f"protocol 必须是 {PROTOCOLS} 之一")
+
+    inference_id = str(uuid.uuid4())
+    yield {"type": "patch-start", "data": {"s": [{"type": "agent-inference", "id": inference_id}]}, "version": 1}
+
+    if protocol == "agent-inference":
+        text = ""
+        for i in range(0, len(tokens), tokens_per_frame):
+            text += "".join(tokens[i:i + tokens_per_frame])
+            yield {
+                "type": "agent-inference",
+                "id": inference_id,
+                "value": [{"type": "text", "content": '<lang primary="zh-CN"/>' + text}],
+            }
+        yield _record_map_frame(text, model, user_text)
+    else:
+        for i in range(0, len(tokens), tokens_per_frame):
+            yield {
+                "type": "patch",
+                "v": [{"o": "x", "p": "/s/1/value/0/content", "v": "".join(tokens[i:i + tokens_per_frame])}],
+            }
+
+
+def encode_frame(frame: Dict) -> bytes:
+    """与 Notion 一致：每帧一行 JSON"""
+    return (json.dumps(frame, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class FakeNotionConfig:
+    """替身服务器行为配置"""
+
+    def __init__(
+        self,
+        token_rate: float = 50.0,
+        ttfb_ms: float = 500.0,
+        ttfb_per_kb_ms: float = 0.0,
+        response_tokens: int = 200,
+        tokens_per_frame: int = 1,
+        protocol: str = "agent-inference",
+        rate_401: float = 0.0,
+        rate_429: float = 0.0,
+        jitter: float = 0.1,
+        model_ttfb_ms: Optional[Dict[str, float]] = None,
+        valid_token: Optional[str] = None,
+    ):
+        self.token_rate = token_rate
+        self.ttfb_ms = ttfb_ms
+        self.ttfb_per_kb_ms = ttfb_per_kb_ms
+        self.response_tokens = response_tokens
+        self.tokens_per_frame = tokens_per_frame
+        self.protocol = protocol
+        self.rate_401 = rate_401
+        self.rate_429 = rate_429
+        self.jitter = jitter
+        # 按模型覆盖首帧等待，用于模拟单个模型变慢
+        self.model_ttfb_ms = model_ttfb_ms or {}
+        # 设置后只接受该 token_v2，用于模拟 Token 失效
+        self.valid_token = valid_token
+
+    def to_dict(self) -> Dict:
+        return dict(vars(self))
+
+
+def create_app(config: FakeNotionConfig) -> FastAPI:
+    app = FastAPI(title="fake-notion")
+    app.state.config = config
+    app.state.stats = {"inference": 0, "transactions": 0, "injected_401": 0, "injected_429": 0, "rejected_token": 0}
+
+    def jittered(seconds: float) -> float:
+        spread = seconds * config.jitter
+        return max(0.0, seconds + random.uniform(-spread, spread))
+
+    def unauthorized():
+        return JSONResponse(status_code=401, content={"errorId": str(uuid.uuid4()), "name": "UnauthorizedError"})
+
+    def injected_error(request: Request):
+        if config.valid_token and request.cookies.get("token_v2") != config.valid_token:
+            app.state.stats["rejected_token"] += 1
+            return unauthorized()
+        roll = random.random()
+        if roll < config.rate_401:
+            app.state.stats["injected_401"] += 1
+            return unauthorized()
+        if roll < config.rate_401 + config.rate_429:
+            app.state.stats["injected_429"] += 1
+            return JSONResponse(
+                status_code=429,
+                content={"errorId": str(uuid.uuid4()), "name": "RateLimitedError"},
+                headers={"Retry-After": "1"},
+            )
+        return None
+
+    @app.get("/", response_class=HTMLResponse)
+    async def root():
+        # 会话预热请求
+        return "<html><body>fake notion</body></html>"
+
+    @app.post("/api/v3/saveTransactionsFanout")
+    async def save_transactions(request: Request):
+        app.state.stats["transactions"] += 1
+        return injected_error(request) or {}
+
+    @app.post("/api/v3/runInferenceTranscript")
+    async def run_inference(request: Request):
+        app.state.stats["inference"] += 1
+        error = injected_error(request)
+        if error is not None:
+            return error
+
+        raw_body = await request.body()
+        body = json.loads(raw_body)
+        transcript = body.get("transcript", [])
+        model = next((t["value"].get("model") for t in transcript if t.get("type") == "config"), "apple-danish")
+        if model not in AVAILABLE_MODELS:
+            return JSONResponse(status_code=400, content={"errorId": str(uuid.uuid4()), "name": "ValidationError"})
+        # 真实上游的首字节时间随 transcript 长度增长
+        ttfb = (config.model_ttfb_ms.get(model, config.ttfb_ms) + config.ttfb_per_kb_ms * len(raw_body) / 1024) / 1000
+        user_text = next(
+            (t["value"][0][0] for t in reversed(transcript) if t.get("type") == "user" and t.get("value")),
+            "",
+        )
+        tokens = generate_tokens(config.response_tokens, seed=app.state.stats["inference"])
+        frame_interval = config.tokens_per_frame / config.token_rate if config.token_rate > 0 else 0
+
+        async def stream():
+            await asyncio.sleep(jittered(ttfb))
+            for frame in build_frames(tokens, config.protocol, config.tokens_per_frame, model, user_text):
+                yield encode_frame(frame)
+                if frame_interval and frame.get("type") != "patch-start":
+                    await asyncio.sleep(jittered(frame_interval))
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    @app.post("/api/v3/getSpaces")
+    async def get_spaces(request: Request):
+        # Token 校验请求
+        return injected_error(request) or {}
+
+    @app.post("/api/v3/getAvailableModels")
+    async def available_models():
+        return {"models": [{"model": model} for model in AVAILABLE_MODELS]}
+
+    @app.get("/__stats")
+    async def stats():
+        return {"config": config.to_dict(), **app.state.stats}
+
+    return app
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="本地 Notion 替身服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--token-rate", type=float, default=50.0, help="每秒输出的 token 数，0 表示不限速")
+    parser.add_argument("--ttfb-ms", type=float, default=500.0, help="首帧前的等待时间（毫秒）")
+    parser.add_argument("--ttfb-per-kb-ms", type=float, default=0.0, help="请求体每 KB 额外增加的首帧等待（毫秒）")
+    parser.add_argument("--response-tokens", type=int, default=200, help="每次回复的 token 数")
+    parser.add_argument("--tokens-per-frame", type=int, default=1, help="每个数据帧包含的 token 数")
+    parser.add_argument("--protocol", choices=PROTOCOLS, default="agent-inference")
+    parser.add_argument("--rate-401", type=float, default=0.0, help="注入 401 的概率")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="注入 429 的概率")
+    parser.add_argument("--jitter", type=float, default=0.1, help="时间抖动比例")
+    parser.add_argument("--valid-token", default=None, help="只接受该 token_v2，其余请求返回 401")
+    parser.add_argument(
+        "--slow-model", action="append", default=[], metavar="MODEL=MS",
+        help="单独设置某个模型的首帧等待（毫秒），可重复，例如 apple-danish=8000",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    import uvicorn
+
+    args = parse_args(argv)
+    config = FakeNotionConfig(
+        token_rate=args.token_rate,
+        ttfb_ms=args.ttfb_ms,
+        ttfb_per_kb_ms=args.ttfb_per_kb_ms,
+        response_tokens=args.response_tokens,
+        tokens_per_frame=args.tokens_per_frame,
+        protocol=args.protocol,
+        rate_401=args.rate_401,
+        rate_429=args.rate_429,
+        jitter=args.jitter,
+        valid_token=args.valid_token,
+        model_ttfb_ms={model: float(ms) for model, ms in (item.split("=", 1) for item in args.slow_model)},
+    )
+    print(f"fake notion 监听 http://{args.host}:{args.port}，配置: {config.to_dict()}")
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
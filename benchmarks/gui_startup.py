@@ -0,0 +1,126 @@
+"""
+GUI 启动耗时基准
+多次启动 gui_app.py --startup-benchmark（窗口首次显示后输出各阶段耗时并退出），
+统计导入、创建窗口、首次显示以及含解释器启动的进程总耗时。
+结果写成 JSON，可用 --compare 与之前的结果对比，发现启动变慢
+
+用法:
+    python -m benchmarks.gui_startup --repeat 5 --output before.json
+    python -m benchmarks.gui_startup --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from benchmarks.harness import DEFAULT_OUTPUT_DIR, REPO_ROOT
+from benchmarks.micro import _git_revision
+
+# gui_app 输出的阶段，以及本脚本测量的进程总耗时（process_ms）
+PHASES = ("import_ms", "window_ms", "show_ms", "total_ms", "process_ms")
+
+
+def run_once(python: str, show: bool, timeout: float) -> Dict[str, float]:
+    """启动一次 GUI，返回各阶段耗时（毫秒）"""
+    env = dict(os.environ)
+    if not show:
+        # 默认不显示窗口，也可以在没有桌面的环境中运行
+        env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    begin = time.perf_counter()
+    completed = subprocess.run(
+        [python, "gui_app.py", "--startup-benchmark"],
+        cwd=str(REPO_ROOT), env=env, capture_output=True, text=True, encoding="utf-8", errors="replace", timeout=timeout,
+    )
+    elapsed = time.perf_counter() - begin
+    lines = [line for line in completed.stdout.splitlines() if line.startswith("{")]
+    if completed.returncode != 0 or not lines:
+        raise RuntimeError(f"GUI 启动失败（退出码 {completed.returncode}）: {completed.stderr.strip()[-500:]}")
+    timings = json.loads(lines[-1])
+    timings["process_ms"] = round(elapsed * 1000, 1)
+    return timings
+
+
+def summarize(samples: List[Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    return {
+        phase: {
+            "median_ms": round(statistics.median(sample[phase] for sample in samples), 1),
+            "min_ms": min(sample[phase] for sample in samples),
+        }
+        for phase in PHASES
+    }
+
+
+def compare(summary: Dict[str, Dict[str, float]], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """按阶段对比 median，返回变慢超过 threshold 的阶段"""
+    previous = baseline.get("summary", {})
+    regressions = []
+    print(f"\n对比基线 {baseline.get('meta', {}).get('git_revision') or '-'}（median，<1 表示变快）")
+    for phase in PHASES:
+        old = previous.get(phase)
+        if not old:
+            continue
+        new = summary[phase]["median_ms"]
+        ratio = new / old["median_ms"] if old["median_ms"] else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  ← 回归"
+            regressions.append(phase)
+        elif ratio < 1 - threshold:
+            flag = "  ← 提升"
+        print(f"  {phase:<12} {old['median_ms']:>9.1f}ms → {new:>9.1f}ms  x{ratio:.3f}{flag}")
+    return regressions
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="notion-2api GUI 启动耗时基准")
+    parser.add_argument("--repeat", type=int, default=5, help="启动次数（第一次通常较慢，取中位数）")
+    parser.add_argument("--python", default=sys.executable, help="运行 GUI 的 Python 解释器")
+    parser.add_argument("--show", action="store_true", help="使用真实的窗口系统显示窗口（默认 offscreen）")
+    parser.add_argument("--timeout", type=float, default=60.0, help="单次启动的超时（秒）")
+    parser.add_argument("--output", type=Path, help="结果 JSON 路径，默认写入 benchmarks/results/")
+    parser.add_argument("--compare", type=Path, help="对比的基线结果 JSON")
+    parser.add_argument("--threshold", type=float, default=0.2, help="判定回归的变慢比例（启动耗时波动较大，默认 20%%）")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    samples = []
+    for index in range(args.repeat):
+        timings = run_once(args.python, args.show, args.timeout)
+        samples.append(timings)
+        print(f"第 {index + 1} 次  " + "  ".join(f"{phase} {timings[phase]:>8.1f}" for phase in PHASES))
+
+    summary = summarize(samples)
+    print("\nmedian  " + "  ".join(f"{phase} {summary[phase]['median_ms']:>8.1f}" for phase in PHASES))
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": _git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "samples": samples,
+        "summary": summary,
+    }
+    output = args.output or DEFAULT_OUTPUT_DIR / f"gui_startup_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+    print(f"结果已写入 {output}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        if compare(summary, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+压测公共工具
+启动/停止替身服务器与代理进程、抓取 /metrics、采样进程资源、计算分位数
+"""
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import httpx
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_OUTPUT_DIR = REPO_ROOT / "benchmarks" / "results"
+
+
+def free_port() -> int:
+    """获取一个空闲的本地端口"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_http(url: str, timeout: float = 30.0) -> bool:
+    """轮询直到 url 返回 2xx"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).is_success:
+                return True
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def percentile(values: Sequence[float], p: float) -> Optional[float]:
+    """线性插值分位数，p 取 0~100"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def parse_prometheus(text: str) -> Dict[str, float]:
+    """解析 Prometheus 文本中不带标签的样本"""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#") or "{" in line:
+            continue
+        name, _, value = line.partition(" ")
+        try:
+            samples[name] = float(value)
+        except ValueError:
+            continue
+    return samples
+
+
+def scrape_metrics(base_url: str, api_key: str) -> Dict[str, float]:
+    """抓取代理的 /metrics，失败时返回空字典"""
+    try:
+        response = httpx.get(
+            f"{base_url}/metrics",
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=5.0,
+        )
+        response.raise_for_status()
+        return parse_prometheus(response.text)
+    except httpx.HTTPError:
+        return {}
+
+
+def _children(pid: int) -> List[int]:
+    """直接子进程（Linux /proc）"""
+    children = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children.extend(int(c) for c in f.read().split())
+    except OSError:
+        pass
+    return children
+
+
+def process_tree(pid: int) -> List[int]:
+    """pid 及其所有后代进程（uvicorn 多 worker 时 worker 是子进程）"""
+    pids = [pid]
+    for child in _children(pid):
+        pids.extend(process_tree(child))
+    return pids
+
+
+def proc_stats(pid: int) -> Optional[Dict[str, float]]:
+    """
+    进程树的资源占用（仅 Linux）：CPU 秒数、RSS、文件描述符数、socket 数
+
+    非 Linux 平台返回 None
+    """
+    if not os.path.isdir(f"/proc/{pid}"):
+        return None
+    ticks = os.sysconf("SC_CLK_TCK")
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    totals = {"cpu_seconds": 0.0, "rss_bytes": 0.0, "open_fds": 0.0, "sockets": 0.0}
+    for member in process_tree(pid):
+        try:
+            with open(f"/proc/{member}/stat") as f:
+                # comm 字段可能含空格，从最后一个 ) 之后开始切分
+                fields = f.read().rsplit(")", 1)[1].split()
+            totals["cpu_seconds"] += (int(fields[11]) + int(fields[12])) / ticks
+            with open(f"/proc/{member}/statm") as f:
+                totals["rss_bytes"] += int(f.read().split()[1]) * page_size
+            fds = os.listdir(f"/proc/{member}/fd")
+            totals["open_fds"] += len(fds)
+            for fd in fds:
+                try:
+                    if os.readlink(f"/proc/{member}/fd/{fd}").startswith("socket:"):
+                        totals["sockets"] += 1
+                except OSError:
+                    continue
+        except (OSError, IndexError, ValueError):
+            continue
+    return totals
+
+
+class ManagedProcess:
+    """子进程封装，输出写入日志文件，退出时先 terminate 再 kill"""
+
+    def __init__(self, name: str, args: List[str], env: Dict[str, str], log_path: Path):
+        self.name = name
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        self.log_path = log_path
+        self._log = open(log_path, "wb")
+        self.proc = subprocess.Popen(
+            args,
+            cwd=str(REPO_ROOT),
+            env={**os.environ, **env},
+            stdout=self._log,
+            stderr=subprocess.STDOUT,
+        )
+
+    @property
+    def pid(self) -> int:
+        return self.proc.pid
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def stop(self, timeout: float = 10.0):
+        if self.alive():
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+        self._log.close()
+
+
+def start_fake_notion(port: int, extra_args: Sequence[str], log_dir: Path) -> ManagedProcess:
+    """启动替身服务器并等待就绪"""
+    process = ManagedProcess(
+        "fake-notion",
+        [sys.executable, "-m", "benchmarks.fake_notion", "--port", str(port), *extra_args],
+        {},
+        log_dir / "fake_notion.log",
+    )
+    if not wait_http(f"http://127.0.0.1:{port}/"):
+        process.stop()
+        raise RuntimeError(f"替身服务器启动失败，日志: {process.log_path}")
+    return process
+
+
+def start_proxy(
+    port: int,
+    upstream_url: str,
+    api_key: str,
+    log_dir: Path,
+    workers: int = 1,
+    extra_env: Optional[Dict[str, str]] = None,
+) -> ManagedProcess:
+    """启动指向替身服务器的代理并等待就绪"""
+    env = {
+        "NOTION_BASE_URL": upstream_url,
+        "API_MASTER_KEY": api_key,
+        "NOTION_COOKIE": "v02:benchmark",
+        "NOTION_SPACE_ID": "00000000-0000-0000-0000-000000000000",
+        "NOTION_USER_ID": "00000000-0000-0000-0000-000000000001",
+        **(extra_env or {}),
+    }
+    process = ManagedProcess(
+        "proxy",
+        [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning",
+        ],
+        env,
+        log_dir / "proxy.log",
+    )
+    if not wait_http(f"http://127.0.0.1:{port}/", timeout=60):
+        process.stop()
+        raise RuntimeError(f"代理启动失败，日志: {process.log_path}")
+    return process
@@ -0,0 +1,210 @@
+"""
+端到端负载测试
+以逐级递增的并发驱动 /v1/chat/completions，统计吞吐、首字节时间（TTFB）、
+p50/p99 延迟以及每请求 CPU 开销
+
+用法:
+    # 自动启动本地替身服务器与代理
+    python -m benchmarks.load_test --spawn --concurrency 1,4,16,64 --duration 20
+
+    # 压测已运行的代理（CPU 开销通过 /metrics 的 process_cpu_seconds_total 计算）
+    python -m benchmarks.load_test --url http://127.0.0.1:8088 --api-key 1
+"""
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from benchmarks.harness import (
+    DEFAULT_OUTPUT_DIR,
+    free_port,
+    percentile,
+    proc_stats,
+    scrape_metrics,
+    start_fake_notion,
+    start_proxy,
+)
+
+
+def classify_error(message: str) -> str:
+    """把代理以 SSE 下发的错误归类"""
+    if "429" in message:
+        return "upstream_429"
+    if "Token" in message or "401" in message or "403" in message:
+        return "upstream_auth"
+    return "upstream_other"
+
+
+async def run_request(client: httpx.AsyncClient, url: str, headers: Dict[str, str], payload: Dict[str, Any]) -> Dict[str, Any]:
+    """发送一个流式请求，记录 TTFB（首个内容块）与总耗时"""
+    begin = time.perf_counter()
+    result: Dict[str, Any] = {"ok": False, "ttfb": None, "latency": None, "chars": 0, "error": None}
+    try:
+        async with client.stream("POST", url, headers=headers, json=payload) as response:
+            if response.status_code != 200:
+                result["error"] = f"http_{response.status_code}"
+                await response.aread()
+                return result
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                data = line[6:]
+                if data == "[DONE]":
+                    result["ok"] = result["error"] is None
+                    break
+                chunk = json.loads(data)
+                if "error" in chunk:
+                    result["error"] = classify_error(chunk["error"].get("message", ""))
+                    continue
+                content = chunk["choices"][0]["delta"].get("content", "") if chunk.get("choices") else ""
+                if content:
+                    if result["ttfb"] is None:
+                        result["ttfb"] = time.perf_counter() - begin
+                    result["chars"] += len(content)
+    except httpx.HTTPError as e:
+        result["error"] = f"client_{type(e).__name__}"
+    finally:
+        result["latency"] = time.perf_counter() - begin
+    return result
+
+
+async def run_level(
+    base_url: str,
+    api_key: str,
+    concurrency: int,
+    duration: float,
+    payload: Dict[str, Any],
+    proxy_pid: Optional[int] = None,
+) -> Dict[str, Any]:
+    """在固定并发下持续压测 duration 秒"""
+    url = f"{base_url}/v1/chat/completions"
+    headers = {"Authorization": f"Bearer {api_key}"}
+    results: List[Dict[str, Any]] = []
+    deadline = time.perf_counter() + duration
+
+    cpu_before = _cpu_seconds(base_url, api_key, proxy_pid)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(300.0), limits=limits) as client:
+        async def worker():
+            while time.perf_counter() < deadline:
+                results.append(await run_request(client, url, headers, payload))
+
+        begin = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - begin
+    cpu_after = _cpu_seconds(base_url, api_key, proxy_pid)
+
+    ok = [r for r in results if r["ok"]]
+    ttfbs = [r["ttfb"] for r in ok if r["ttfb"] is not None]
+    latencies = [r["latency"] for r in ok]
+    errors: Dict[str, int] = {}
+    for r in results:
+        if r["error"]:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+
+    cpu_per_request = None
+    if cpu_before is not None and cpu_after is not None and results:
+        cpu_per_request = (cpu_after - cpu_before) / len(results)
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return None if value is None else round(value * 1000, 2)
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "ok": len(ok),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else 0,
+        "output_chars_per_s": round(sum(r["chars"] for r in ok) / elapsed, 1) if elapsed else 0,
+        "ttfb_p50_ms": ms(percentile(ttfbs, 50)),
+        "ttfb_p99_ms": ms(percentile(ttfbs, 99)),
+        "latency_p50_ms": ms(percentile(latencies, 50)),
+        "latency_p99_ms": ms(percentile(latencies, 99)),
+        "cpu_ms_per_request": ms(cpu_per_request),
+    }
+
+
+def _cpu_seconds(base_url: str, api_key: str, proxy_pid: Optional[int]) -> Optional[float]:
+    """优先读取本机进程树的 CPU 时间（覆盖所有 worker），否则退回到 /metrics"""
+    if proxy_pid is not None:
+        stats = proc_stats(proxy_pid)
+        if stats is not None:
+            return stats["cpu_seconds"]
+    return scrape_metrics(base_url, api_key).get("process_cpu_seconds_total")
+
+
+def print_report(levels: List[Dict[str, Any]]):
+    columns = [
+        ("concurrency", "并发"), ("requests", "请求"), ("ok", "成功"), ("throughput_rps", "吞吐/s"),
+        ("ttfb_p50_ms", "TTFB p50"), ("ttfb_p99_ms", "TTFB p99"),
+        ("latency_p50_ms", "延迟 p50"), ("latency_p99_ms", "延迟 p99"), ("cpu_ms_per_request", "CPU ms/请求"),
+    ]
+    print(" | ".join(title for _, title in columns) + " | 错误")
+    for level in levels:
+        cells = ["-" if level[key] is None else str(level[key]) for key, _ in columns]
+        print(" | ".join(cells) + f" | {level['errors'] or '-'}")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="notion-2api 端到端负载测试")
+    parser.add_argument("--url", default="http://127.0.0.1:8088", help="代理地址（--spawn 时忽略）")
+    parser.add_argument("--api-key", default="1")
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32", help="逗号分隔的并发级别")
+    parser.add_argument("--duration", type=float, default=15.0, help="每个并发级别的持续时间（秒）")
+    parser.add_argument("--model", default="claude-opus-4.5")
+    parser.add_argument("--prompt", default="请介绍一下 Notion AI。")
+    parser.add_argument("--output", type=Path, help="结果 JSON 路径，默认写入 benchmarks/results/")
+    parser.add_argument("--spawn", action="store_true", help="自动启动替身服务器与代理")
+    parser.add_argument("--workers", type=int, default=1, help="--spawn 时代理的 worker 数")
+    parser.add_argument(
+        "--fake-args",
+        default="",
+        help='--spawn 时传给替身服务器的参数，例如 "--token-rate 100 --ttfb-ms 300 --rate-429 0.02"',
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    payload = {
+        "model": args.model,
+        "stream": True,
+        "messages": [{"role": "user", "content": args.prompt}],
+    }
+    run_dir = DEFAULT_OUTPUT_DIR / f"load_{time.strftime('%Y%m%d_%H%M%S')}"
+
+    processes = []
+    results = []
+    proxy_pid = None
+    base_url = args.url.rstrip("/")
+    try:
+        if args.spawn:
+            fake_port, proxy_port = free_port(), free_port()
+            processes.append(start_fake_notion(fake_port, args.fake_args.split(), run_dir))
+            proxy = start_proxy(proxy_port, f"http://127.0.0.1:{fake_port}", args.api_key, run_dir, args.workers)
+            processes.append(proxy)
+            proxy_pid = proxy.pid
+            base_url = f"http://127.0.0.1:{proxy_port}"
+
+        for concurrency in levels:
+            print(f"▶ 并发 {concurrency}，持续 {args.duration}s ...")
+            results.append(asyncio.run(run_level(base_url, args.api_key, concurrency, args.duration, payload, proxy_pid)))
+        print_report(results)
+    finally:
+        for process in reversed(processes):
+            process.stop()
+
+    output = args.output or run_dir / "load_test.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({"args": vars(args), "levels": results}, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+    print(f"结果已写入 {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""
+解析与编码热路径微基准
+在不启动服务、不访问网络的情况下单独测量 notion_provider.py 中的 CPU 热点：
+帧切分、agent-inference 增量计算、<lang> 标签过滤、_format_sse_chunk 以及长历史的 _build_transcript
+
+数据流样本按真实协议生成（回复 1KB ~ 1MB，多种 chunk 切分方式），也可以用 --fixture 载入录制的原始响应。
+结果写成 JSON，可用 --compare 与之前的结果对比，发现回归或验证优化效果
+
+用法:
+    python -m benchmarks.micro
+    python -m benchmarks.micro --sizes 1k,64k --filter parse_stream --output before.json
+    python -m benchmarks.micro --compare before.json
+"""
+import argparse
+import gc
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.utils.capture import CAPTURE_SUFFIX, load_capture
+from benchmarks.fake_notion import PROTOCOLS, build_frames, encode_frame, generate_tokens
+from benchmarks.harness import DEFAULT_OUTPUT_DIR, REPO_ROOT
+
+# 累积协议下每帧携带全文，帧数过多时样本会按平方增长，这里限制单个流的帧数
+MAX_FRAMES = 64
+DEFAULT_SIZES = "1k,16k,256k,1m"
+SPLITS = ("frame", "4k", "random")
+HISTORY_LENGTHS = (10, 100, 1000)
+
+
+def parse_size(text: str) -> int:
+    """解析 1k / 256k / 1m 形式的大小"""
+    text = text.strip().lower()
+    units = {"k": 1024, "m": 1024 * 1024}
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def format_size(size: int) -> str:
+    for unit, factor in (("m", 1024 * 1024), ("k", 1024)):
+        if size >= factor and size % factor == 0:
+            return f"{size // factor}{unit}"
+    return str(size)
+
+
+def build_stream(output_bytes: int, protocol: str = "agent-inference", seed: int = 0) -> bytes:
+    """生成回复正文约为 output_bytes 字节的上游原始响应"""
+    tokens = []
+    total = 0
+    for token in generate_tokens(output_bytes, seed):
+        if total >= output_bytes:
+            break
+        tokens.append(token)
+        total += len(token.encode("utf-8"))
+    tokens_per_frame = max(1, -(-len(tokens) // MAX_FRAMES))
+    frames = build_frames(tokens, protocol, tokens_per_frame, user_text="benchmark")
+    return b"".join(encode_frame(frame) for frame in frames)
+
+
+def split_stream(data: bytes, mode: str, seed: int = 0) -> List[bytes]:
+    """
+    按指定方式切分为 chunk
+
+    frame: 每帧一个 chunk；4k 等: 固定字节数；random: 64B ~ 16KB 随机切分（会拆开多字节字符）
+    """
+    if mode == "frame":
+        return data.splitlines(keepends=True)
+    if mode == "random":
+        rng = random.Random(seed)
+        chunks = []
+        pos = 0
+        while pos < len(data):
+            step = rng.randint(64, 16 * 1024)
+            chunks.append(data[pos:pos + step])
+            pos += step
+        return chunks
+    size = parse_size(mode)
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def load_fixture(path: Path) -> bytes:
+    """载入录制的上游原始响应：.ncap 录制文件或 NDJSON 字节流"""
+    if path.suffix == CAPTURE_SUFFIX:
+        return load_capture(path).body
+    return path.read_bytes()
+
+
+def _new_provider():
+    """创建不做会话预热的 provider，仅用于调用纯 CPU 的格式化方法"""
+    from app.providers.notion_provider import NotionAIProvider
+
+    return NotionAIProvider.__new__(NotionAIProvider)
+
+
+def _parse_all(chunks: List[bytes]) -> List[str]:
+    from app.providers.notion_provider import NotionStreamParser
+
+    parser = NotionStreamParser()
+    deltas = []
+    for chunk in chunks:
+        deltas.extend(parser.feed(chunk))
+    return deltas
+
+
+def _extract_all(chunks: List[bytes]) -> int:
+    from app.providers.notion_provider import NotionStreamParser
+
+    parser = NotionStreamParser()
+    count = 0
+    for chunk in chunks:
+        parser.append(chunk)
+        count += len(parser.extract_frames())
+    return count
+
+
+def stream_cases(name: str, data: bytes, splits: List[str]) -> Iterator[Tuple[str, Dict[str, Any], Callable[[], Any]]]:
+    """一个数据流样本上的所有用例：(用例名, 参数, 待测函数)"""
+    from app.providers.notion_provider import NotionStreamParser, strip_lang_tags
+
+    params = {"stream": name, "stream_bytes": len(data)}
+    for split in splits:
+        chunks = split_stream(data, split)
+        split_params = {**params, "split": split, "chunks": len(chunks)}
+        yield f"parse_stream/{name}/{split}", split_params, lambda chunks=chunks: _parse_all(chunks)
+        yield f"extract_frames/{name}/{split}", split_params, lambda chunks=chunks: _extract_all(chunks)
+
+    frames = [json.loads(line) for line in data.splitlines() if line.strip()]
+    frame_params = {**params, "frames": len(frames)}
+
+    def handle_all():
+        parser = NotionStreamParser()
+        for frame in frames:
+            parser.handle_frame(frame)
+
+    yield f"handle_frame/{name}", frame_params, handle_all
+
+    contents = [
+        item.get("content", "")
+        for frame in frames if frame.get("type") == "agent-inference"
+        for item in frame.get("value", []) if item.get("type") == "text"
+    ]
+    if contents:
+        def strip_all():
+            for content in contents:
+                strip_lang_tags(content)
+
+        yield f"strip_lang/{name}", {**params, "contents": len(contents)}, strip_all
+
+    provider = _new_provider()
+    deltas = _parse_all(split_stream(data, "frame"))
+    if deltas:
+        def format_all():
+            for delta in deltas:
+                provider._format_sse_chunk(delta)
+
+        yield f"format_sse_chunk/{name}", {**params, "deltas": len(deltas)}, format_all
+
+
+def transcript_cases(lengths) -> Iterator[Tuple[str, Dict[str, Any], Callable[[], Any]]]:
+    provider = _new_provider()
+    text = "".join(generate_tokens(300, seed=1))
+    for length in lengths:
+        messages = [
+            {"role": "user" if i % 2 == 0 else "assistant", "content": text}
+            for i in range(length)
+        ]
+        yield (
+            f"build_transcript/{length}",
+            {"messages": length, "message_chars": len(text)},
+            lambda messages=messages: provider._build_transcript(messages, "apple-danish", "workflow"),
+        )
+
+
+def measure(func: Callable[[], Any], repeat: int, min_time: float) -> Dict[str, Any]:
+    """
+    每轮循环调用 func 直到耗时不少于 min_time，重复 repeat 轮，返回单次调用耗时统计
+
+    计时期间关闭 GC（与 timeit 一致），减少噪声
+    """
+    func()  # 预热
+    loops = 1
+    while True:
+        begin = time.perf_counter()
+        for _ in range(loops):
+            func()
+        if time.perf_counter() - begin >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2
+
+    samples = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            begin = time.perf_counter()
+            for _ in range(loops):
+                func()
+            samples.append((time.perf_counter() - begin) / loops)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return {
+        "loops": loops,
+        "repeat": repeat,
+        "min_s": min(samples),
+        "median_s": statistics.median(samples),
+        "stdev_s": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+    }
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=str(REPO_ROOT), capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """按用例名对比 median，返回变慢超过 threshold 的用例"""
+    previous = {r["name"]: r for r in baseline.get("results", [])}
+    regressions = []
+    print(f"\n对比基线 {baseline.get('meta', {}).get('git_revision') or '-'}（median，<1 表示变快）")
+    for result in results:
+        old = previous.get(result["name"])
+        if not old:
+            continue
+        ratio = result["median_s"] / old["median_s"] if old["median_s"] else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  ← 回归"
+            regressions.append(result["name"])
+        elif ratio < 1 - threshold:
+            flag = "  ← 提升"
+        print(f"  {result['name']:<48} {_format_seconds(old['median_s']):>10} → {_format_seconds(result['median_s']):>10}  x{ratio:.3f}{flag}")
+    return regressions
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.3f}s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.3f}ms"
+    return f"{seconds * 1e6:.1f}µs"
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="notion-2api 解析/编码微基准")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="逗号分隔的回复大小，例如 1k,16k,256k,1m")
+    parser.add_argument("--protocols", default=",".join(PROTOCOLS), help="逗号分隔的协议")
+    parser.add_argument("--splits", default=",".join(SPLITS), help="逗号分隔的切分方式：frame / random / 固定大小如 4k")
+    parser.add_argument("--fixture", type=Path, action="append", default=[], help="录制的上游原始响应（.ncap 或 NDJSON），可重复")
+    parser.add_argument("--filter", default="", help="只运行名称包含该字符串的用例")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="每轮最短耗时（秒）")
+    parser.add_argument("--output", type=Path, help="结果 JSON 路径，默认写入 benchmarks/results/")
+    parser.add_argument("--compare", type=Path, help="对比的基线结果 JSON")
+    parser.add_argument("--threshold", type=float, default=0.1, help="判定回归的变慢比例")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    splits = [s.strip() for s in args.splits.split(",") if s.strip()]
+
+    streams: List[Tuple[str, bytes]] = []
+    for protocol in [p.strip() for p in args.protocols.split(",") if p.strip()]:
+        for size in [parse_size(s) for s in args.sizes.split(",") if s.strip()]:
+            streams.append((f"{protocol}-{format_size(size)}", build_stream(size, protocol)))
+    for path in args.fixture:
+        streams.append((f"fixture-{path.stem}", load_fixture(path)))
+
+    cases: List[Tuple[str, Dict[str, Any], Callable[[], Any]]] = []
+    for name, data in streams:
+        cases.extend(stream_cases(name, data, splits))
+    cases.extend(transcript_cases(HISTORY_LENGTHS))
+
+    results = []
+    for name, params, func in cases:
+        if args.filter and args.filter not in name:
+            continue
+        stats = measure(func, args.repeat, args.min_time)
+        result = {"name": name, "params": params, **stats}
+        if "stream_bytes" in params:
+            result["throughput_mb_s"] = round(params["stream_bytes"] / stats["median_s"] / 1e6, 2)
+        results.append(result)
+        throughput = f"  {result['throughput_mb_s']:>8} MB/s" if "throughput_mb_s" in result else ""
+        print(f"{name:<48} median {_format_seconds(stats['median_s']):>10}  min {_format_seconds(stats['min_s']):>10}{throughput}")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": _git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    output = args.output or DEFAULT_OUTPUT_DIR / f"micro_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+    print(f"结果已写入 {output}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+离线回放录制的上游响应
+用 ReplayTransport 代替网络，让录制的 .ncap 文件走与线上完全相同的 _iter_deltas 解析路径，
+用于稳定复现、对比和剖析真实数据流上的性能问题
+
+录制: 服务端设置 CAPTURE_DIR=captures 后正常发起请求
+回放:
+    python -m benchmarks.replay captures/ --speed 0 --repeat 5
+    python -m benchmarks.replay captures/xxx.ncap --speed 1          # 按录制节奏
+    python -m benchmarks.replay captures/ --speed 0 --profile out.prof
+"""
+import argparse
+import asyncio
+import cProfile
+import json
+import pstats
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from app.providers.notion_provider import NotionAIProvider
+from app.utils.capture import ReplayTransport, capture_files, load_capture
+from app.utils.tracing import tracer
+from benchmarks.harness import DEFAULT_OUTPUT_DIR
+
+
+async def replay_once(provider: NotionAIProvider, model: str) -> Dict[str, Any]:
+    """回放一次，返回该次的分段耗时"""
+    trace = tracer.start_trace("replay")
+    chunks = 0
+    errors = 0
+    begin = time.perf_counter()
+    async for event in provider.stream_generator([{"role": "user", "content": "replay"}], model, trace=trace):
+        if event.startswith('data: {"error"'):
+            errors += 1
+        elif event.startswith("data: {"):
+            chunks += 1
+    return {
+        "total_ms": round((time.perf_counter() - begin) * 1000, 3),
+        "parse_ms": round(trace.totals.get("parse", 0.0) * 1000, 3),
+        "ttfb_ms": round((trace.span_duration("upstream_ttfb") or 0.0) * 1000, 3),
+        "sse_chunks": chunks,
+        "errors": errors,
+        "output_chars": trace.attrs.get("output_chars", 0),
+    }
+
+
+async def replay_file(path: Path, speed: float, repeat: int) -> Dict[str, Any]:
+    capture = load_capture(path)
+    provider = NotionAIProvider(scraper=ReplayTransport(path, speed))
+    runs = [await replay_once(provider, capture.model) for _ in range(repeat)]
+    return {
+        "file": str(path),
+        "status": capture.status,
+        "chunks": len(capture.records),
+        "bytes": len(capture.body),
+        "runs": runs,
+        "best_parse_ms": min(r["parse_ms"] for r in runs),
+        "best_total_ms": min(r["total_ms"] for r in runs),
+    }
+
+
+async def replay_all(files: List[Path], speed: float, repeat: int) -> List[Dict[str, Any]]:
+    return [await replay_file(path, speed, repeat) for path in files]
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="回放录制的 Notion 上游响应")
+    parser.add_argument("captures", type=Path, nargs="+", help=".ncap 文件或包含它们的目录")
+    parser.add_argument("--speed", type=float, default=0.0, help="回放速度，1 为原速，0 为不等待（默认）")
+    parser.add_argument("--repeat", type=int, default=3, help="每个文件回放次数")
+    parser.add_argument("--profile", type=Path, help="用 cProfile 剖析并把结果写入该文件")
+    parser.add_argument("--output", type=Path, help="结果 JSON 路径，默认写入 benchmarks/results/")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    files = [f for path in args.captures for f in capture_files(path)]
+    if not files:
+        raise SystemExit("没有找到录制文件")
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    results = asyncio.run(replay_all(files, args.speed, args.repeat))
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(str(args.profile))
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+
+    for result in results:
+        print(
+            f"{result['file']}: status {result['status']}, {result['chunks']} chunks / {result['bytes']} bytes, "
+            f"解析 {result['best_parse_ms']}ms, 总计 {result['best_total_ms']}ms"
+        )
+
+    output = args.output or DEFAULT_OUTPUT_DIR / f"replay_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(
+        json.dumps({"args": vars(args), "results": results}, ensure_ascii=False, indent=2, default=str),
+        encoding="utf-8",
+    )
+    print(f"结果已写入 {output}")
+
+
+if __name__ == "__main__":
+    main()
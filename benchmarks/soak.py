@@ -0,0 +1,363 @@
+"""
+长时间稳定性（soak）测试
+以固定并发长时间压测代理（默认自动启动本地替身服务器），期间混入客户端中途断开与上游 401/429，
+定时采样 RSS、文件描述符、socket、事件循环延迟与进行中的上游流数量；
+结束后比较稳定期首尾的资源占用，增长超过阈值即判定失败（退出码 1），并输出 CSV 与 SVG 趋势图
+
+用法:
+    python -m benchmarks.soak --duration 2h --concurrency 8
+    python -m benchmarks.soak --duration 10m --disconnect-rate 0.2 --fake-args "--rate-429 0.05 --rate-401 0.01"
+"""
+import argparse
+import asyncio
+import csv
+import json
+import random
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.harness import (
+    DEFAULT_OUTPUT_DIR,
+    free_port,
+    percentile,
+    proc_stats,
+    scrape_metrics,
+    start_fake_notion,
+    start_proxy,
+)
+from benchmarks.load_test import classify_error
+
+# 采样字段：(键, 图表标题)
+SERIES = (
+    ("rss_mb", "RSS (MB)"),
+    ("open_fds", "文件描述符"),
+    ("sockets", "socket"),
+    ("loop_lag_ms", "事件循环延迟 (ms)"),
+    ("active_streams", "进行中的上游流"),
+)
+
+
+def parse_duration(text: str) -> float:
+    """解析 90s / 30m / 2h 形式的时长，纯数字按秒"""
+    text = text.strip().lower()
+    units = {"s": 1, "m": 60, "h": 3600}
+    if text and text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+class SoakCounters:
+    def __init__(self):
+        self.requests = 0
+        self.ok = 0
+        self.disconnects = 0
+        self.errors: Dict[str, int] = {}
+
+    def error(self, kind: str):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"requests": self.requests, "ok": self.ok, "disconnects": self.disconnects, "errors": dict(self.errors)}
+
+
+async def soak_request(
+    client: httpx.AsyncClient,
+    url: str,
+    headers: Dict[str, str],
+    payload: Dict[str, Any],
+    disconnect: bool,
+    counters: SoakCounters,
+):
+    """发送一个流式请求；disconnect 为 True 时收到首个内容块后立即断开"""
+    counters.requests += 1
+    failed = False
+    try:
+        async with client.stream("POST", url, headers=headers, json=payload) as response:
+            if response.status_code != 200:
+                counters.error(f"http_{response.status_code}")
+                await response.aread()
+                return
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                data = line[6:]
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                if "error" in chunk:
+                    counters.error(classify_error(chunk["error"].get("message", "")))
+                    failed = True
+                    continue
+                if disconnect:
+                    # 不读完响应就退出上下文，httpx 会直接关闭连接
+                    counters.disconnects += 1
+                    return
+        if not failed:
+            counters.ok += 1
+    except httpx.HTTPError as e:
+        counters.error(f"client_{type(e).__name__}")
+
+
+def sample_once(base_url: str, api_key: str, proxy_pid: Optional[int]) -> Dict[str, Optional[float]]:
+    """采样一次：进程资源优先读 /proc（覆盖所有 worker），其余来自 /metrics"""
+    metrics = scrape_metrics(base_url, api_key)
+    stats = proc_stats(proxy_pid) if proxy_pid is not None else None
+    rss = stats["rss_bytes"] if stats else metrics.get("process_resident_memory_bytes")
+    lag = metrics.get("event_loop_lag_seconds")
+    lag_max = metrics.get("event_loop_lag_max_seconds")
+    return {
+        "rss_mb": None if rss is None else round(rss / 1024 / 1024, 2),
+        "open_fds": stats["open_fds"] if stats else metrics.get("process_open_fds"),
+        "sockets": stats["sockets"] if stats else None,
+        "loop_lag_ms": None if lag is None else round(lag * 1000, 2),
+        "loop_lag_max_ms": None if lag_max is None else round(lag_max * 1000, 2),
+        "active_streams": metrics.get("upstream_active_streams"),
+    }
+
+
+async def run_soak(args, base_url: str, proxy_pid: Optional[int]) -> Tuple[List[Dict[str, Any]], SoakCounters]:
+    url = f"{base_url}/v1/chat/completions"
+    headers = {"Authorization": f"Bearer {args.api_key}"}
+    payload = {
+        "model": args.model,
+        "stream": True,
+        "messages": [{"role": "user", "content": args.prompt}],
+    }
+    counters = SoakCounters()
+    samples: List[Dict[str, Any]] = []
+    rng = random.Random(args.seed)
+    begin = time.monotonic()
+    load_deadline = begin + args.duration
+    cooldown_deadline = load_deadline + args.cooldown
+
+    async def take_sample(phase: str):
+        sample = await asyncio.to_thread(sample_once, base_url, args.api_key, proxy_pid)
+        sample.update(t=round(time.monotonic() - begin, 1), phase=phase, **counters.to_dict())
+        sample["errors"] = sum(counters.errors.values())
+        samples.append(sample)
+        if len(samples) % args.report_every == 0:
+            print(
+                f"[{sample['t']:>8.0f}s] {phase:<8} RSS {sample['rss_mb']}MB  fds {sample['open_fds']}  "
+                f"sockets {sample['sockets']}  lag {sample['loop_lag_ms']}ms  streams {sample['active_streams']}  "
+                f"请求 {counters.requests} 成功 {counters.ok} 断开 {counters.disconnects} 错误 {sample['errors']}"
+            )
+
+    async def sampler():
+        while time.monotonic() < cooldown_deadline:
+            await take_sample("load" if time.monotonic() < load_deadline else "cooldown")
+            await asyncio.sleep(args.sample_interval)
+        await take_sample("cooldown")
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(300.0), limits=limits) as client:
+        async def worker():
+            while time.monotonic() < load_deadline:
+                disconnect = rng.random() < args.disconnect_rate
+                await soak_request(client, url, headers, payload, disconnect, counters)
+
+        sampler_task = asyncio.create_task(sampler())
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        await sampler_task
+    return samples, counters
+
+
+def _window_median(samples: List[Dict[str, Any]], key: str) -> Optional[float]:
+    values = [s[key] for s in samples if s.get(key) is not None]
+    return statistics.median(values) if values else None
+
+
+def _slope_per_hour(samples: List[Dict[str, Any]], key: str) -> Optional[float]:
+    """最小二乘斜率（每小时增长量）"""
+    points = [(s["t"], s[key]) for s in samples if s.get(key) is not None]
+    if len(points) < 2:
+        return None
+    mean_t = statistics.fmean(t for t, _ in points)
+    mean_v = statistics.fmean(v for _, v in points)
+    denominator = sum((t - mean_t) ** 2 for t, _ in points)
+    if not denominator:
+        return None
+    return sum((t - mean_t) * (v - mean_v) for t, v in points) / denominator * 3600
+
+
+def analyze(samples: List[Dict[str, Any]], args) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    比较稳定期（跳过预热）开头与结尾各 10% 窗口的中位数，超过阈值即失败
+
+    另外检查冷却期（停止加压后）进行中的上游流是否归零
+    """
+    load = [s for s in samples if s["phase"] == "load" and s["t"] >= args.warmup]
+    cooldown = [s for s in samples if s["phase"] == "cooldown"]
+    failures: List[str] = []
+    summary: Dict[str, Any] = {"samples": len(samples), "steady_samples": len(load)}
+    if len(load) < 4:
+        failures.append("稳定期样本过少，无法判断趋势（请延长 --duration 或缩短 --sample-interval）")
+        return summary, failures
+
+    window = max(1, len(load) // 10)
+    head, tail = load[:window], load[-window:]
+    limits = {
+        "rss_mb": ("pct", args.max_rss_growth),
+        "open_fds": ("abs", args.max_fd_growth),
+        "sockets": ("abs", args.max_socket_growth),
+    }
+    for key, (mode, limit) in limits.items():
+        start, end = _window_median(head, key), _window_median(tail, key)
+        if start is None or end is None:
+            continue
+        growth = end - start
+        summary[key] = {
+            "start": start,
+            "end": end,
+            "growth": round(growth, 2),
+            "slope_per_hour": _slope_per_hour(load, key),
+        }
+        if mode == "pct":
+            growth_pct = growth / start * 100 if start else 0.0
+            summary[key]["growth_pct"] = round(growth_pct, 2)
+            if growth_pct > limit:
+                failures.append(f"{key} 增长 {growth_pct:.1f}% 超过阈值 {limit}%（{start} → {end}）")
+        elif growth > limit:
+            failures.append(f"{key} 增长 {growth:.0f} 超过阈值 {limit}（{start} → {end}）")
+
+    lags = [s["loop_lag_ms"] for s in load if s.get("loop_lag_ms") is not None]
+    if lags:
+        summary["loop_lag_ms"] = {"p50": percentile(lags, 50), "p99": percentile(lags, 99), "max": max(lags)}
+        if summary["loop_lag_ms"]["p99"] > args.max_loop_lag_ms:
+            failures.append(f"事件循环延迟 p99 {summary['loop_lag_ms']['p99']:.0f}ms 超过阈值 {args.max_loop_lag_ms}ms")
+
+    if cooldown and cooldown[-1].get("active_streams"):
+        failures.append(f"停止加压 {args.cooldown:.0f}s 后仍有 {cooldown[-1]['active_streams']:.0f} 个上游流未关闭")
+    return summary, failures
+
+
+def write_csv(samples: List[Dict[str, Any]], path: Path):
+    if not samples:
+        return
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(samples[0].keys()))
+        writer.writeheader()
+        writer.writerows(samples)
+
+
+def render_svg(samples: List[Dict[str, Any]], path: Path, cooldown_start: float):
+    """不依赖绘图库，直接输出多面板折线图（SVG）"""
+    width, panel_height, margin = 900, 140, 50
+    panels = [(key, title) for key, title in SERIES if any(s.get(key) is not None for s in samples)]
+    height = len(panels) * (panel_height + margin) + margin
+    max_t = max((s["t"] for s in samples), default=1) or 1
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'font-family="sans-serif" font-size="12">',
+        f'<rect width="{width}" height="{height}" fill="white"/>',
+    ]
+    plot_width = width - 2 * margin
+    for index, (key, title) in enumerate(panels):
+        top = margin + index * (panel_height + margin)
+        points = [(s["t"], s[key]) for s in samples if s.get(key) is not None]
+        low = min(v for _, v in points)
+        high = max(v for _, v in points)
+        span = (high - low) or 1
+
+        def x(t):
+            return margin + t / max_t * plot_width
+
+        def y(v):
+            return top + panel_height - (v - low) / span * panel_height
+
+        cooldown_x = x(cooldown_start)
+        parts.append(f'<text x="{margin}" y="{top - 8}" font-weight="bold">{title}</text>')
+        parts.append(
+            f'<rect x="{margin}" y="{top}" width="{plot_width}" height="{panel_height}" fill="none" stroke="#ccc"/>'
+        )
+        parts.append(
+            f'<rect x="{cooldown_x:.1f}" y="{top}" width="{max(0, margin + plot_width - cooldown_x):.1f}" '
+            f'height="{panel_height}" fill="#f3f3f3"/>'
+        )
+        parts.append(f'<text x="{margin - 4}" y="{top + 10}" text-anchor="end">{high:g}</text>')
+        parts.append(f'<text x="{margin - 4}" y="{top + panel_height}" text-anchor="end">{low:g}</text>')
+        polyline = " ".join(f"{x(t):.1f},{y(v):.1f}" for t, v in points)
+        parts.append(f'<polyline points="{polyline}" fill="none" stroke="#2f6fde" stroke-width="1.5"/>')
+    parts.append(
+        f'<text x="{width - margin}" y="{height - 15}" text-anchor="end">时间（秒），灰色区域为冷却期，总计 {max_t:.0f}s</text>'
+    )
+    parts.append("</svg>")
+    path.write_text("\n".join(parts), encoding="utf-8")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="notion-2api 长时间稳定性测试")
+    parser.add_argument("--url", default="http://127.0.0.1:8088", help="代理地址（未指定 --no-spawn 时忽略）")
+    parser.add_argument("--no-spawn", action="store_true", help="压测已运行的代理，而不是自动启动替身与代理")
+    parser.add_argument("--api-key", default="1")
+    parser.add_argument("--duration", type=parse_duration, default="1h", help="加压时长，例如 90s / 30m / 2h")
+    parser.add_argument("--cooldown", type=parse_duration, default="30s", help="停止加压后继续观察的时长")
+    parser.add_argument("--warmup", type=parse_duration, default="60s", help="判断趋势时跳过的预热时长")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--disconnect-rate", type=float, default=0.1, help="客户端收到首块后主动断开的比例")
+    parser.add_argument("--sample-interval", type=float, default=5.0, help="采样间隔（秒）")
+    parser.add_argument("--report-every", type=int, default=12, help="每采样多少次打印一行进度")
+    parser.add_argument("--max-rss-growth", type=float, default=20.0, help="RSS 允许增长的百分比")
+    parser.add_argument("--max-fd-growth", type=float, default=20, help="文件描述符允许增长的数量")
+    parser.add_argument("--max-socket-growth", type=float, default=20, help="socket 允许增长的数量")
+    parser.add_argument("--max-loop-lag-ms", type=float, default=1000, help="事件循环延迟 p99 上限（毫秒）")
+    parser.add_argument("--model", default="claude-opus-4.5")
+    parser.add_argument("--prompt", default="请介绍一下 Notion AI。")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1, help="代理的 worker 数")
+    parser.add_argument(
+        "--fake-args",
+        default="--token-rate 100 --ttfb-ms 300 --rate-429 0.02 --rate-401 0.005",
+        help="传给替身服务器的参数",
+    )
+    parser.add_argument("--output-dir", type=Path, help="结果目录，默认 benchmarks/results/soak_<时间>")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    run_dir = args.output_dir or DEFAULT_OUTPUT_DIR / f"soak_{time.strftime('%Y%m%d_%H%M%S')}"
+    run_dir.mkdir(parents=True, exist_ok=True)
+
+    processes = []
+    proxy_pid = None
+    base_url = args.url.rstrip("/")
+    try:
+        if not args.no_spawn:
+            fake_port, proxy_port = free_port(), free_port()
+            processes.append(start_fake_notion(fake_port, args.fake_args.split(), run_dir))
+            proxy = start_proxy(proxy_port, f"http://127.0.0.1:{fake_port}", args.api_key, run_dir, args.workers)
+            processes.append(proxy)
+            proxy_pid = proxy.pid
+            base_url = f"http://127.0.0.1:{proxy_port}"
+
+        print(f"▶ soak 测试：并发 {args.concurrency}，加压 {args.duration:.0f}s，冷却 {args.cooldown:.0f}s，结果目录 {run_dir}")
+        samples, counters = asyncio.run(run_soak(args, base_url, proxy_pid))
+    finally:
+        for process in reversed(processes):
+            process.stop()
+
+    summary, failures = analyze(samples, args)
+    summary["counters"] = counters.to_dict()
+    write_csv(samples, run_dir / "samples.csv")
+    render_svg(samples, run_dir / "trend.svg", args.duration)
+    (run_dir / "summary.json").write_text(
+        json.dumps({"args": vars(args), "summary": summary, "failures": failures}, ensure_ascii=False, indent=2, default=str),
+        encoding="utf-8",
+    )
+
+    print(json.dumps(summary, ensure_ascii=False, indent=2, default=str))
+    print(f"采样数据: {run_dir / 'samples.csv'}，趋势图: {run_dir / 'trend.svg'}")
+    if failures:
+        print("✗ soak 测试未通过:")
+        for failure in failures:
+            print(f"  - {failure}")
+        raise SystemExit(1)
+    print("✓ soak 测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,23 +4,108 @@ import signal
 import json
 import re
 import ctypes
-from typing import Dict
+import html
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+# 启动耗时从这里开始计算（之前只有标准库的轻量模块）
+STARTUP_STARTED_AT = time.perf_counter()
+
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                                QHBoxLayout, QLabel, QLineEdit, QPushButton, 
-                               QTextEdit, QSystemTrayIcon, QMenu, QMessageBox,
+                               QTextEdit, QPlainTextEdit, QComboBox, QSystemTrayIcon, QMenu, QMessageBox,
                                QGroupBox, QFormLayout, QStyle, QDialog, QCheckBox, 
                                QTabWidget, QFrame, QStackedWidget, QButtonGroup,
-                               QScrollArea, QSizePolicy, QSpacerItem)
-from PySide6.QtCore import QProcess, Qt, QSize, Slot, QThread, Signal, QTimer
-from PySide6.QtGui import QIcon, QAction, QTextCursor, QClipboard, QTextCharFormat, QColor, QPixmap, QImage, QPainter
-from app.utils.cookie_extractor import try_all_browsers, CookieError
+                               QScrollArea, QSizePolicy, QSpacerItem, QGridLayout,
+                               QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView)
+from PySide6.QtCore import QProcess, Qt, QSize, Slot, QThread, Signal, QTimer, QEvent
+from PySide6.QtGui import QIcon, QAction, QTextCursor, QClipboard, QPixmap, QImage, QPainter, QIntValidator, QPainterPath, QPen, QColor
 from app.utils.config_manager import ConfigManager
 from app.utils.logger import get_logger
-from app.utils.notifier import notify_service_started, notify_service_stopped
+from app.utils.metrics import histogram_quantile
+# cookie_extractor（browser_cookie3）与 notifier（plyer、pydantic-settings）导入较慢，在首次使用时才导入
+
+STARTUP_IMPORTED_AT = time.perf_counter()
 
 # 获取 logger
 logger = get_logger(__name__)
 
+# 交接重启时等待新进程就绪的最长时间
+HANDOFF_TIMEOUT_MS = 30000
+# 服务进程意外退出后自动重启的等待时间：从 1 秒开始翻倍，最长 30 秒；稳定运行 60 秒后恢复为 1 秒
+RESTART_BACKOFF_MAX_SECONDS = 30
+RESTART_STABLE_SECONDS = 60
+# 自动选择 worker 进程数时的上限（与 Docker 镜像一致）
+DEFAULT_MAX_WORKERS = 4
+
+# 去除 ANSI 颜色代码
+ANSI_ESCAPE_RE = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+# 日志行的级别：logging 格式（" - INFO - "）与 uvicorn 格式（"INFO:     "，多 worker 时带 "[worker i] " 前缀）
+LOG_LEVEL_RE = re.compile(r' - (DEBUG|INFO|WARNING|ERROR|CRITICAL) - |^(?:\[worker \d+\] )?(DEBUG|INFO|WARNING|ERROR|CRITICAL):')
+LOG_LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+# 日志过滤选项：(显示名, 最低级别)
+LOG_FILTERS = [("全部", 0), ("INFO 及以上", 20), ("WARNING 及以上", 30), ("仅 ERROR", 40)]
+# 日志批量刷新到控件的间隔；窗口隐藏时日志只写入文件，间隔放宽
+LOG_FLUSH_INTERVAL_MS = 200
+LOG_HIDDEN_FLUSH_INTERVAL_MS = 2000
+# Token 失效提示的最小间隔（秒），失败的请求会反复输出同样的错误
+TOKEN_ALERT_INTERVAL = 60
+
+# 设置页与监控页在 QStackedWidget 中的位置（首次切换到该页时才创建）
+SETTINGS_PAGE_INDEX = 1
+DASHBOARD_PAGE_INDEX = 2
+# 监控页轮询 /metrics 的间隔，以及吞吐、分位数等滚动统计的时间窗口（秒）
+DASHBOARD_POLL_MS = 2000
+DASHBOARD_WINDOW_SECONDS = 60
+# 迷你折线图保留的点数
+SPARKLINE_POINTS = 60
+CHAT_PATH = "/v1/chat/completions"
+# 服务返回这些状态码时说明 API_MASTER_KEY 校验未通过
+AUTH_FAILED_STATUSES = (401, 403)
+AUTH_FAILED_MESSAGE = "API 密钥校验失败（HTTP {status}）：请确认 .env 中的 API_MASTER_KEY 与服务启动时读取的一致"
+# 监控页专用的样式，随监控页一起创建（全局样式在 apply_modern_style 中）
+DASHBOARD_STYLE = """
+#stat_value {
+    font-size: 22px;
+    font-weight: 600;
+    color: #e6edf3;
+}
+
+#stat_detail {
+    font-size: 12px;
+    color: #8b949e;
+}
+
+QTableWidget#usage_table {
+    background-color: #0d1117;
+    color: #c9d1d9;
+    border: 1px solid #30363d;
+    border-radius: 6px;
+    gridline-color: #21262d;
+    font-size: 12px;
+}
+
+QTableWidget#usage_table QHeaderView::section {
+    background-color: #161b22;
+    color: #8b949e;
+    border: none;
+    border-bottom: 1px solid #30363d;
+    padding: 6px;
+}
+"""
+
+# 图标透明化：RGB 分量都低于阈值的像素视为黑色背景；处理后缩放到的最大边长（原图 1024px，显示尺寸远小于此）
+ICON_BACKGROUND_THRESHOLD = 30
+ICON_MAX_SIZE = 256
+# 以 --startup-benchmark 启动时，输出启动耗时（JSON）后立即退出，供 benchmarks.gui_startup 使用
+STARTUP_BENCHMARK_ARG = "--startup-benchmark"
+
+# 快速测试的并发请求数上限
+BURST_MAX_REQUESTS = 64
+# 并发测试结果中耗时分布的分组数
+BURST_HISTOGRAM_BINS = 8
+
 # --- 手动引导对话框 ---
 class ManualGuideDialog(QDialog):
     def __init__(self, parent=None):
@@ -89,11 +174,433 @@ class ManualGuideDialog(QDialog):
             self.result_label.setText("⚠️ 内容不像 token_v2（应以 v02: 开头且长度 > 100）")
             self.result_label.setStyleSheet("color: #ff9800;")
 
+# --- 运行日志控件 ---
+class LogConsole(QPlainTextEdit):
+    """
+    运行日志：环形缓冲保存最近 max_lines 行，新日志先累积，由定时器批量刷新到控件；
+    控件本身也限制行数（setMaximumBlockCount），内存不会随运行时间增长。可按级别过滤。
+    暂停（窗口隐藏）期间只输出 flushed 信号，不更新控件，恢复时从缓冲区重建一次
+    """
+    # 每批刷新的服务输出行（写入日志文件用，GUI 自身的提示不在其中）
+    flushed = Signal(list)
+
+    def __init__(self, max_lines: int = 2000, parent=None):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.min_level = 0
+        # (级别, 行)
+        self._lines: deque = deque(maxlen=max_lines)
+        # (级别, 行, 是否为服务输出)
+        self._pending: List[Tuple[int, str, bool]] = []
+        # 尚未收到换行的半行输出
+        self._partial = ""
+        # 没有级别标记的续行（如 traceback）沿用上一行的级别
+        self._last_level = LOG_LEVELS["INFO"]
+        self._paused = False
+        # 暂停期间有未显示的日志
+        self._stale = False
+        self.setMaximumBlockCount(max_lines)
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(LOG_FLUSH_INTERVAL_MS)
+        self._timer.timeout.connect(self.flush)
+
+    @property
+    def max_lines(self) -> int:
+        return self._lines.maxlen
+
+    def set_max_lines(self, max_lines: int):
+        self._lines = deque(self._lines, maxlen=max_lines)
+        self.setMaximumBlockCount(max_lines)
+
+    def feed(self, text: str):
+        """追加服务进程的原始输出（可能包含不完整的行）"""
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self._add(line.rstrip("\r"))
+        self._schedule()
+
+    def append(self, text: str, level: str = "INFO"):
+        """追加 GUI 自身的提示"""
+        for line in text.split("\n"):
+            self._add(line, LOG_LEVELS[level], from_service=False)
+        self._schedule()
+
+    def append_alert(self, text: str):
+        """立即显示一条醒目的错误提示"""
+        self.flush()
+        self._lines.append((LOG_LEVELS["ERROR"], text))
+        if self._paused:
+            self._stale = True
+            return
+        self.appendHtml(f'<span style="color: #ff6b6b; font-weight: 700;">{html.escape(text)}</span>')
+        self.moveCursor(QTextCursor.End)
+
+    def _add(self, line: str, level: int = None, from_service: bool = True):
+        if level is None:
+            match = LOG_LEVEL_RE.search(line)
+            level = LOG_LEVELS[match.group(1) or match.group(2)] if match else self._last_level
+        self._last_level = level
+        self._lines.append((level, line))
+        self._pending.append((level, line, from_service))
+
+    def _schedule(self):
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def finish_partial(self):
+        """进程结束时输出最后的半行（定时刷新时不输出，避免一行日志被拆成两行）"""
+        if self._partial:
+            self._add(self._partial)
+            self._partial = ""
+            self._schedule()
+
+    def flush(self):
+        """把累积的日志一次性写入控件"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        self.flushed.emit([line for _, line, from_service in pending if from_service])
+        if self._paused:
+            self._stale = True
+            return
+        # 超出上限的部分显示后也会被丢弃，不必写入控件
+        visible = [line for level, line, _ in pending[-self.max_lines:] if level >= self.min_level]
+        if not visible:
+            return
+        scrollbar = self.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum() - 4
+        self.appendPlainText("\n".join(visible))
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
+
+    def set_paused(self, paused: bool):
+        """暂停或恢复控件刷新"""
+        if paused == self._paused:
+            return
+        self._paused = paused
+        self._timer.setInterval(LOG_HIDDEN_FLUSH_INTERVAL_MS if paused else LOG_FLUSH_INTERVAL_MS)
+        if not paused:
+            self.flush()
+            if self._stale:
+                self.set_min_level(self.min_level)
+
+    def set_min_level(self, level: int):
+        """按级别过滤，从缓冲区重建显示内容"""
+        self.flush()
+        self._stale = False
+        self.min_level = level
+        self.setPlainText("\n".join(line for lvl, line in self._lines if lvl >= level))
+        self.moveCursor(QTextCursor.End)
+
+    def clear_log(self):
+        self._lines.clear()
+        self._pending.clear()
+        self._partial = ""
+        self.clear()
+
+# --- 图标 ---
+# 分量低于阈值的为 1，其余为 0
+_DARK_CHANNEL_TABLE = bytes(1 if value < ICON_BACKGROUND_THRESHOLD else 0 for value in range(256))
+# 背景像素（1）的 alpha 掩码为 0x00，其余为 0xFF
+_ALPHA_MASK_TABLE = bytes([0xFF, 0x00] + [0xFF] * 254)
+# 路径 -> 处理好的图标（复制按钮等多处使用同一图标）
+_icon_cache: Dict[str, QIcon] = {}
+
+# --- 访问本地服务 ---
+class ServiceAuthError(Exception):
+    """本地服务拒绝了 GUI 使用的 API 密钥"""
+    pass
+
+def service_auth_headers() -> Dict[str, str]:
+    """
+    访问 /metrics 与对话接口的认证头：与服务进程一样从环境变量与当前目录的 .env 读取 API_MASTER_KEY
+    （服务进程继承 GUI 的环境与工作目录），未开启认证时任意密钥均可
+    """
+    from app.core.config import Settings
+    return {"Authorization": f"Bearer {Settings().API_MASTER_KEY or '1'}"}
+
+def check_service_auth(response):
+    """认证失败时抛出 ServiceAuthError，与其他错误区分显示"""
+    if response.status_code in AUTH_FAILED_STATUSES:
+        raise ServiceAuthError(AUTH_FAILED_MESSAGE.format(status=response.status_code))
+
+# --- 监控页 ---
+def metric_sum(snapshot: dict, name: str, **labels) -> float:
+    """指标快照中标签匹配的各序列之和"""
+    return sum(
+        item["value"] for item in snapshot["metrics"].get(name, [])
+        if all(item["labels"].get(k) == v for k, v in labels.items())
+    )
+
+def histogram_buckets(snapshot: dict, name: str, **labels) -> Dict[str, float]:
+    """直方图快照中标签匹配的各序列的分桶计数之和"""
+    buckets: Dict[str, float] = {}
+    for item in snapshot["metrics"].get(name, []):
+        if all(item["labels"].get(k) == v for k, v in labels.items()):
+            for le, count in item["buckets"].items():
+                buckets[le] = buckets.get(le, 0) + count
+    return buckets
+
+def merge_snapshots(snapshots: List[dict]) -> dict:
+    """把多个进程的指标快照合并为一份（同名指标的序列合在一起，求和时自然相加）"""
+    merged: Dict[str, list] = {}
+    for snapshot in snapshots:
+        for name, series in snapshot["metrics"].items():
+            merged.setdefault(name, []).extend(series)
+    return {"metrics": merged}
+
+def summarize_metrics(histories: Dict[int, deque]) -> dict:
+    """
+    由各服务进程时间窗口内最早与最新的两份快照计算监控数据（计数器取差值，多个 worker 的数据相加）
+
+    Args:
+        histories: 进程 pid -> (monotonic 时间, 快照) 序列，按时间先后排列
+    """
+    pairs = [(history[0], history[-1]) for history in histories.values() if history]
+    old = merge_snapshots([snapshot for (_, snapshot), _ in pairs])
+    new = merge_snapshots([snapshot for _, (_, snapshot) in pairs])
+    elapsed = max(newest_at - oldest_at for (oldest_at, _), (newest_at, _) in pairs)
+    stats = {
+        "inflight": metric_sum(new, "http_inflight_requests"),
+        "streams": metric_sum(new, "upstream_active_streams"),
+        "window": elapsed,
+    }
+
+    def delta(name: str, **labels) -> float:
+        return metric_sum(new, name, **labels) - metric_sum(old, name, **labels)
+
+    def rate(name: str, **labels) -> Optional[float]:
+        """各进程按各自的采样间隔计算速率后相加"""
+        rates = [
+            (metric_sum(newest, name, **labels) - metric_sum(oldest, name, **labels)) / (newest_at - oldest_at)
+            for (oldest_at, oldest), (newest_at, newest) in pairs if newest_at > oldest_at
+        ]
+        return sum(rates) if rates else None
+
+    def quantiles(name: str) -> Tuple[Optional[float], Optional[float]]:
+        before = histogram_buckets(old, name, path=CHAT_PATH)
+        buckets = {le: count - before.get(le, 0) for le, count in histogram_buckets(new, name, path=CHAT_PATH).items()}
+        return histogram_quantile(buckets, 0.5), histogram_quantile(buckets, 0.95)
+
+    requests_count = delta("http_requests_total", path=CHAT_PATH)
+    stats["requests"] = requests_count
+    stats["throughput"] = rate("http_requests_total", path=CHAT_PATH)
+    stats["tokens_per_sec"] = rate("usage_completion_tokens_total")
+    stats["errors"] = delta("http_requests_total", path=CHAT_PATH, outcome="error")
+    stats["rate_limited"] = delta("http_requests_total", path=CHAT_PATH, outcome="rate_limited")
+    stats["error_rate"] = stats["errors"] / requests_count if requests_count else (0.0 if elapsed > 0 else None)
+    stats["rate_limited_rate"] = stats["rate_limited"] / requests_count if requests_count else (0.0 if elapsed > 0 else None)
+    stats["ttfb_p50"], stats["ttfb_p95"] = quantiles("http_response_ttfb_seconds")
+    stats["latency_p50"], stats["latency_p95"] = quantiles("http_request_duration_seconds")
+
+    # 按 API Key（指纹）汇总用量：累计值与窗口内的请求数
+    accounts: Dict[str, Dict[str, float]] = {}
+    for name, field in (
+        ("usage_requests_total", "requests"),
+        ("usage_prompt_tokens_total", "prompt_tokens"),
+        ("usage_completion_tokens_total", "completion_tokens"),
+    ):
+        for item in new["metrics"].get(name, []):
+            row = accounts.setdefault(item["labels"].get("key", "anonymous"), {})
+            row[field] = row.get(field, 0) + item["value"]
+    for key, row in accounts.items():
+        row["recent"] = row.get("requests", 0) - metric_sum(old, "usage_requests_total", key=key) if elapsed > 0 else None
+    stats["accounts"] = accounts
+    return stats
+
+class MetricsWorker(QThread):
+    """
+    在后台线程中轮询服务的指标快照并计算监控数据，UI 线程只负责显示
+    多 worker 时每次轮询由其中一个 worker 响应，按 pid 分别保存各 worker 的快照后合并
+    """
+    stats_signal = Signal(dict)
+    error_signal = Signal(str)
+    # API 密钥校验失败（重试也不会成功，单独提示）
+    auth_error_signal = Signal(str)
+
+    def __init__(self, port, workers: int = 1, parent=None):
+        super().__init__(parent)
+        self.port = port
+        self.workers = max(1, workers)
+        self._is_running = True
+
+    def run(self):
+        import requests
+        url = f"http://127.0.0.1:{self.port}/metrics"
+        headers = service_auth_headers()
+        if self.workers > 1:
+            # 每次轮询使用新连接，由不同的 worker 接受，否则长连接只会看到同一个 worker
+            headers["Connection"] = "close"
+        session = requests.Session()
+        histories: Dict[int, deque] = {}
+        while self._is_running:
+            try:
+                response = session.get(url, params={"format": "json"}, headers=headers, timeout=2)
+                check_service_auth(response)
+                response.raise_for_status()
+                snapshot = response.json()
+                now = time.monotonic()
+                history = histories.pop(snapshot.get("pid"), None) or deque()
+                history.append((now, snapshot))
+                while len(history) > 2 and now - history[1][0] >= DASHBOARD_WINDOW_SECONDS:
+                    history.popleft()
+                # 字典按最近一次采样的先后排列；服务或 worker 重启后出现新的 pid，
+                # 多出来的是已退出进程的快照（计数器已从零开始，不再可比），与窗口内未再出现的一并丢弃
+                histories = {
+                    pid: samples for pid, samples in list(histories.items())[-(self.workers - 1):]
+                    if now - samples[-1][0] < DASHBOARD_WINDOW_SECONDS
+                } if self.workers > 1 else {}
+                histories[snapshot.get("pid")] = history
+                self.stats_signal.emit(summarize_metrics(histories))
+            except ServiceAuthError as e:
+                histories.clear()
+                if self._is_running:
+                    self.auth_error_signal.emit(str(e))
+            except Exception as e:
+                histories.clear()
+                if self._is_running:
+                    self.error_signal.emit(str(e))
+            # 分段等待，停止时及时退出
+            for _ in range(DASHBOARD_POLL_MS // 100):
+                if not self._is_running:
+                    break
+                self.msleep(100)
+        session.close()
+
+    def stop(self):
+        self._is_running = False
+
+class Sparkline(QWidget):
+    """迷你折线图：只保存最近 SPARKLINE_POINTS 个点，有新数据时重绘"""
+
+    def __init__(self, color: str, parent=None):
+        super().__init__(parent)
+        self.color = QColor(color)
+        self._values: deque = deque(maxlen=SPARKLINE_POINTS)
+        self.setFixedHeight(36)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+
+    def add(self, value: Optional[float]):
+        """追加一个点，None 表示该时刻没有数据（折线断开）"""
+        self._values.append(value)
+        self.update()
+
+    def clear(self):
+        self._values.clear()
+        self.update()
+
+    def paintEvent(self, event):
+        values = [v for v in self._values if v is not None]
+        if not values:
+            return
+        top = max(values) or 1.0
+        width, height = self.width(), self.height()
+        step = width / (SPARKLINE_POINTS - 1)
+        offset = SPARKLINE_POINTS - len(self._values)
+
+        path = QPainterPath()
+        drawing = False
+        last = None
+        for i, value in enumerate(self._values):
+            if value is None:
+                drawing = False
+                continue
+            x = (offset + i) * step
+            y = height - 2 - (height - 4) * value / top
+            if drawing:
+                path.lineTo(x, y)
+            else:
+                path.moveTo(x, y)
+                drawing = True
+            last = (x, y)
+
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(QPen(self.color, 1.5))
+        painter.drawPath(path)
+        if last is not None:
+            painter.setBrush(self.color)
+            painter.drawEllipse(int(last[0]) - 2, int(last[1]) - 2, 4, 4)
+        painter.end()
+
+def format_seconds(value: Optional[float]) -> str:
+    if value is None:
+        return "—"
+    return f"{value * 1000:.0f}ms" if value < 1 else f"{value:.2f}s"
+
+def format_rate(value: Optional[float]) -> str:
+    return "—" if value is None else f"{value:.1%}"
+
 # --- 测试工作线程 ---
+def run_chat_probe(port, message, on_delta=None, is_running=None, auth_headers=None) -> dict:
+    """
+    发送一次流式对话请求并测量耗时
+
+    Args:
+        on_delta: 收到文本增量时的回调
+        is_running: 返回 False 时提前结束读取
+        auth_headers: 认证头，默认调用 service_auth_headers（批量请求时由调用方读取一次后传入）
+
+    Returns:
+        {"ok", "ttfb"（首个文本增量的耗时）, "total", "chars", "error", "auth_failed"}，耗时单位为秒
+    """
+    import requests
+    url = f"http://127.0.0.1:{port}/v1/chat/completions"
+    headers = {
+        "Content-Type": "application/json",
+        **(auth_headers or service_auth_headers()),
+    }
+    data = {
+        "model": "claude-opus-4.5", 
+        "messages": [{"role": "user", "content": message}],
+        "stream": True
+    }
+    result = {"ok": False, "ttfb": None, "total": None, "chars": 0, "error": None, "auth_failed": False}
+    started = time.perf_counter()
+    try:
+        with requests.post(url, headers=headers, json=data, stream=True, timeout=60) as response:
+            check_service_auth(response)
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if is_running is not None and not is_running():
+                    break
+                if not line.startswith(b"data: "):
+                    continue
+                content = line[6:]
+                if content == b"[DONE]":
+                    break
+                try:
+                    json_data = json.loads(content)
+                except ValueError:
+                    continue
+                if "error" in json_data:
+                    # 流式响应的错误在 200 之后以数据块下发
+                    result["error"] = json_data["error"].get("message", str(json_data["error"]))
+                    break
+                delta = (json_data.get("choices") or [{}])[0].get("delta", {}).get("content", "")
+                if delta:
+                    if result["ttfb"] is None:
+                        result["ttfb"] = time.perf_counter() - started
+                    result["chars"] += len(delta)
+                    if on_delta is not None:
+                        on_delta(delta)
+        result["ok"] = result["error"] is None
+    except ServiceAuthError as e:
+        result["error"] = str(e)
+        result["auth_failed"] = True
+    except Exception as e:
+        result["error"] = str(e)
+    result["total"] = time.perf_counter() - started
+    return result
+
 class TestWorker(QThread):
     response_signal = Signal(str)
     finished_signal = Signal()
     error_signal = Signal(str)
+    # 单次测试的耗时统计（run_chat_probe 的返回值）
+    stats_signal = Signal(dict)
 
     def __init__(self, port, message):
         super().__init__()
@@ -102,45 +609,90 @@ class TestWorker(QThread):
         self._is_running = True
 
     def run(self):
-        url = f"http://127.0.0.1:{self.port}/v1/chat/completions"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": "Bearer 1"
-        }
-        data = {
-            "model": "claude-opus-4.5", 
-            "messages": [{"role": "user", "content": self.message}],
-            "stream": True
-        }
-        
         try:
-            import requests
-            response = requests.post(url, headers=headers, json=data, stream=True, timeout=60)
-            response.raise_for_status()
-            
-            for line in response.iter_lines():
-                if not self._is_running: break
-                if line:
-                    decoded = line.decode('utf-8')
-                    if decoded.startswith("data: "):
-                        content = decoded[6:]
-                        if content == "[DONE]":
-                            break
-                        try:
-                            json_data = json.loads(content)
-                            delta = json_data.get("choices", [{}])[0].get("delta", {}).get("content", "")
-                            if delta:
-                                self.response_signal.emit(delta)
-                        except:
-                            pass
-        except Exception as e:
-            self.error_signal.emit(f"Error: {str(e)}")
+            result = run_chat_probe(self.port, self.message, self.response_signal.emit, lambda: self._is_running)
+            if result["auth_failed"]:
+                self.error_signal.emit(f"🔒 {result['error']}")
+            elif result["error"]:
+                self.error_signal.emit(f"Error: {result['error']}")
+            self.stats_signal.emit(result)
         finally:
             self.finished_signal.emit()
 
     def stop(self):
         self._is_running = False
 
+class BurstWorker(QThread):
+    """并发发送 count 个测试请求，全部结束后汇总耗时分布"""
+    progress_signal = Signal(int, int)
+    finished_signal = Signal(dict)
+
+    def __init__(self, port, message, count):
+        super().__init__()
+        self.port = port
+        self.message = message
+        self.count = count
+
+    def run(self):
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        # 所有请求共用一次读取的认证头
+        auth_headers = service_auth_headers()
+        started = time.perf_counter()
+        results = []
+        with ThreadPoolExecutor(max_workers=self.count, thread_name_prefix="burst") as executor:
+            futures = [
+                executor.submit(run_chat_probe, self.port, self.message, auth_headers=auth_headers)
+                for _ in range(self.count)
+            ]
+            for future in as_completed(futures):
+                results.append(future.result())
+                self.progress_signal.emit(len(results), self.count)
+        self.finished_signal.emit({"results": results, "elapsed": time.perf_counter() - started})
+
+def format_burst_report(report: dict) -> str:
+    """并发测试结果：成功率、吞吐、首字与总耗时分位数，以及总耗时分布"""
+    from app.utils.model_health import percentile
+    results, elapsed = report["results"], report["elapsed"]
+    ok = [r for r in results if r["ok"]]
+    lines = [
+        f"并发测试：{len(results)} 个请求，成功 {len(ok)}，失败 {len(results) - len(ok)}，"
+        f"用时 {elapsed:.2f}s（{len(ok) / elapsed:.2f} req/s）",
+    ]
+    if ok:
+        for label, values in (
+            ("首字耗时", [r["ttfb"] for r in ok if r["ttfb"] is not None]),
+            ("总耗时  ", [r["total"] for r in ok]),
+        ):
+            if values:
+                lines.append(
+                    f"{label}  p50 {format_seconds(percentile(values, 0.5))}  "
+                    f"p95 {format_seconds(percentile(values, 0.95))}  最大 {format_seconds(max(values))}"
+                )
+        speeds = [r["chars"] / r["total"] for r in ok if r["total"]]
+        lines.append(f"输出速度  平均 {sum(speeds) / len(speeds):.0f} 字/秒，合计 {sum(r['chars'] for r in ok) / elapsed:.0f} 字/秒")
+
+        totals = [r["total"] for r in ok]
+        low, high = min(totals), max(totals)
+        bins = BURST_HISTOGRAM_BINS if high > low else 1
+        width = (high - low) / bins or 1.0
+        counts = [0] * bins
+        for value in totals:
+            counts[min(bins - 1, int((value - low) / width))] += 1
+        lines.append("")
+        lines.append("总耗时分布：")
+        for i, count in enumerate(counts):
+            lines.append(f"  {format_seconds(low + i * width):>7} ~ {format_seconds(low + (i + 1) * width):<7} {'█' * count} {count}")
+
+    errors: Dict[str, int] = {}
+    for r in results:
+        if not r["ok"]:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+    if errors:
+        lines.append("")
+        lines.append("失败原因：")
+        lines.extend(f"  ×{count} {error}" for error, count in sorted(errors.items(), key=lambda item: -item[1]))
+    return "\n".join(lines)
+
 
 # --- 主窗口 ---
 class MainWindow(QMainWindow):
@@ -155,20 +707,31 @@ class MainWindow(QMainWindow):
         self.config_manager = ConfigManager()
         self.config = self.config_manager.get_all()
         self.process = None
+        # 交接重启中、尚未就绪的新进程
+        self.handoff_process = None
+        # 各服务进程尚未收到换行的半行输出（原始字节，交接期间新旧进程的输出交替到达，按进程分别拼接）
+        self.stdout_partials: Dict[QProcess, bytes] = {}
         self.clipboard_monitoring = False
         self.last_clipboard_text = ""
-        
+        self.last_token_alert = 0.0
+        self.metrics_worker = None
+        # 当前服务进程的 worker 数（启动时确定）
+        self.service_workers = 1
+        # 用户主动停止服务时置位，服务进程在此之外退出视为崩溃并自动重启
+        self.stopping = False
+        self.service_started_at = 0.0
+        self.restart_backoff = 1.0
+        self.restart_timer = QTimer(self)
+        self.restart_timer.setSingleShot(True)
+        self.restart_timer.timeout.connect(self.auto_restart_service)
+        
+        # 先设置样式表再创建控件：控件创建时应用一次样式即可，之后再设置会对所有已有控件重新应用
+        self.apply_modern_style()
         self.init_ui()
         self.init_tray()
-        self.apply_modern_style()
         
         # 初始加载配置
         self.load_config_to_ui()
-        
-        # 剪贴板监听定时器
-        self.clipboard_timer = QTimer()
-        self.clipboard_timer.timeout.connect(self.check_clipboard)
-        self.clipboard_timer.setInterval(1000)
 
     def init_ui(self):
         main_widget = QWidget()
@@ -189,9 +752,13 @@ class MainWindow(QMainWindow):
         console_page = self.create_console_page()
         self.content_stack.addWidget(console_page)
         
-        # 设置页
-        settings_page = self.create_settings_page()
-        self.content_stack.addWidget(settings_page)
+        # 设置页与监控页先放空白占位，首次切换到该页时才创建
+        self.page_builders = {
+            SETTINGS_PAGE_INDEX: self.create_settings_page,
+            DASHBOARD_PAGE_INDEX: self.create_dashboard_page,
+        }
+        for _ in self.page_builders:
+            self.content_stack.addWidget(QWidget())
         
         layout.addWidget(self.content_stack)
 
@@ -229,15 +796,22 @@ class MainWindow(QMainWindow):
         self.tab_console.setChecked(True)
         self.tab_console.clicked.connect(lambda: self.switch_page(0))
         
+        self.tab_dashboard = QPushButton("监控")
+        self.tab_dashboard.setObjectName("tab_btn")
+        self.tab_dashboard.setCheckable(True)
+        self.tab_dashboard.clicked.connect(lambda: self.switch_page(DASHBOARD_PAGE_INDEX))
+        
         self.tab_settings = QPushButton("设置")
         self.tab_settings.setObjectName("tab_btn")
         self.tab_settings.setCheckable(True)
-        self.tab_settings.clicked.connect(lambda: self.switch_page(1))
+        self.tab_settings.clicked.connect(lambda: self.switch_page(SETTINGS_PAGE_INDEX))
         
         self.tab_group.addButton(self.tab_console, 0)
-        self.tab_group.addButton(self.tab_settings, 1)
+        self.tab_group.addButton(self.tab_settings, SETTINGS_PAGE_INDEX)
+        self.tab_group.addButton(self.tab_dashboard, DASHBOARD_PAGE_INDEX)
         
         tab_layout.addWidget(self.tab_console)
+        tab_layout.addWidget(self.tab_dashboard)
         tab_layout.addWidget(self.tab_settings)
         
         layout.addWidget(tab_container)
@@ -265,7 +839,22 @@ class MainWindow(QMainWindow):
     
     def switch_page(self, index):
         """切换页面"""
+        self.ensure_page(index)
         self.content_stack.setCurrentIndex(index)
+        self.update_dashboard_polling()
+
+    def ensure_page(self, index):
+        """页面尚未创建时创建并替换占位控件"""
+        builder = self.page_builders.pop(index, None)
+        if builder is None:
+            return
+        placeholder = self.content_stack.widget(index)
+        self.content_stack.removeWidget(placeholder)
+        placeholder.deleteLater()
+        self.content_stack.insertWidget(index, builder())
+
+    def is_page_built(self, index) -> bool:
+        return index not in self.page_builders
 
     def create_console_page(self):
         """创建控制台页 - 水平双列布局"""
@@ -398,25 +987,32 @@ class MainWindow(QMainWindow):
         return card
     
     def load_transparent_icon(self, path):
-        """加载图标并将黑色背景转为透明"""
+        """加载图标并将黑色背景转为透明（按路径缓存）"""
+        icon = _icon_cache.get(path)
+        if icon is not None:
+            return icon
         if not os.path.exists(path):
             return QIcon()
             
-        image = QImage(path)
-        image = image.convertToFormat(QImage.Format_RGBA8888)
-        
-        width = image.width()
-        height = image.height()
-        
-        for y in range(height):
-            for x in range(width):
-                pixel = image.pixelColor(x, y)
-                # 如果是深色背景 (阈值 30)，则设为全透明
-                if pixel.red() < 30 and pixel.green() < 30 and pixel.blue() < 30:
-                    pixel.setAlpha(0)
-                    image.setPixelColor(x, y, pixel)
-                    
-        return QIcon(QPixmap.fromImage(image))
+        image = QImage(path).convertToFormat(QImage.Format_RGBA8888)
+        width, height = image.width(), image.height()
+        count = width * height
+        pixels = bytearray(image.constBits())
+        
+        # 各通道查表得到"低于阈值"的 0/1 序列，转为整数按位与得到深色背景像素；
+        # 整块运算在 C 中完成，不必对 1024x1024 的原图逐像素调用 pixelColor
+        dark = int.from_bytes(pixels[0::4].translate(_DARK_CHANNEL_TABLE), "little")
+        dark &= int.from_bytes(pixels[1::4].translate(_DARK_CHANNEL_TABLE), "little")
+        dark &= int.from_bytes(pixels[2::4].translate(_DARK_CHANNEL_TABLE), "little")
+        alpha_mask = dark.to_bytes(count, "little").translate(_ALPHA_MASK_TABLE)
+        alpha = int.from_bytes(pixels[3::4], "little") & int.from_bytes(alpha_mask, "little")
+        pixels[3::4] = alpha.to_bytes(count, "little")
+        
+        image = QImage(bytes(pixels), width, height, width * 4, QImage.Format_RGBA8888)
+        if max(width, height) > ICON_MAX_SIZE:
+            image = image.scaled(ICON_MAX_SIZE, ICON_MAX_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        icon = _icon_cache[path] = QIcon(QPixmap.fromImage(image))
+        return icon
 
     def create_api_key_card(self):
         """创建 API 密钥卡片"""
@@ -614,8 +1210,24 @@ class MainWindow(QMainWindow):
         self.btn_test_send.setFixedWidth(80)
         self.btn_test_send.setFixedHeight(40)
         
+        # 并发测试：同时发送 N 个相同的请求
+        self.burst_count_input = QLineEdit("8")
+        self.burst_count_input.setObjectName("input")
+        self.burst_count_input.setFixedWidth(50)
+        self.burst_count_input.setFixedHeight(40)
+        self.burst_count_input.setValidator(QIntValidator(1, BURST_MAX_REQUESTS))
+        self.burst_count_input.setToolTip(f"并发请求数（1~{BURST_MAX_REQUESTS}）")
+        
+        self.btn_test_burst = QPushButton("并发测试")
+        self.btn_test_burst.setObjectName("secondary_btn")
+        self.btn_test_burst.clicked.connect(self.send_burst_test)
+        self.btn_test_burst.setFixedWidth(90)
+        self.btn_test_burst.setFixedHeight(40)
+        
         test_input_layout.addWidget(self.test_input)
         test_input_layout.addWidget(self.btn_test_send)
+        test_input_layout.addWidget(self.burst_count_input)
+        test_input_layout.addWidget(self.btn_test_burst)
         
         layout.addLayout(test_input_layout)
         
@@ -628,6 +1240,11 @@ class MainWindow(QMainWindow):
         
         layout.addWidget(self.test_response)
         
+        # 耗时统计
+        self.test_stats_label = QLabel("")
+        self.test_stats_label.setObjectName("stat_detail")
+        layout.addWidget(self.test_stats_label)
+        
         return card
     
     def create_log_card(self):
@@ -649,10 +1266,19 @@ class MainWindow(QMainWindow):
         title_layout.addWidget(title_label)
         title_layout.addStretch()
         
+        # 级别过滤
+        self.log_filter = QComboBox()
+        self.log_filter.setObjectName("log_filter")
+        for label, level in LOG_FILTERS:
+            self.log_filter.addItem(label, level)
+        self.log_filter.currentIndexChanged.connect(
+            lambda index: self.log_area.set_min_level(self.log_filter.itemData(index))
+        )
+        
         # 日志按钮
         self.btn_clear_log = QPushButton("清空")
         self.btn_clear_log.setObjectName("text_btn")
-        self.btn_clear_log.clicked.connect(lambda: self.log_area.clear())
+        self.btn_clear_log.clicked.connect(lambda: self.log_area.clear_log())
         
         self.btn_copy_log = QPushButton("")
         self.btn_copy_log.setObjectName("icon_btn")
@@ -662,15 +1288,16 @@ class MainWindow(QMainWindow):
         self.btn_copy_log.setToolTip("复制日志")
         self.btn_copy_log.clicked.connect(lambda: self.log_area.selectAll() or self.log_area.copy())
         
+        title_layout.addWidget(self.log_filter)
         title_layout.addWidget(self.btn_clear_log)
         title_layout.addWidget(self.btn_copy_log)
         
         layout.addLayout(title_layout)
         
         # 日志区域
-        self.log_area = QTextEdit()
-        self.log_area.setReadOnly(True)
+        self.log_area = LogConsole(self.get_log_max_lines())
         self.log_area.setObjectName("log_area")
+        self.log_area.flushed.connect(self.write_log_file)
         self.log_area.setFixedHeight(150)
         
         layout.addWidget(self.log_area)
@@ -726,7 +1353,7 @@ class MainWindow(QMainWindow):
         
         # 剪贴板监听
         self.clipboard_checkbox = QCheckBox("启用剪贴板监听（自动检测 v02: 开头的 token）")
-        self.clipboard_checkbox.stateChanged.connect(self.toggle_clipboard_monitoring)
+        self.clipboard_checkbox.toggled.connect(self.toggle_clipboard_monitoring)
         cookie_layout.addWidget(self.clipboard_checkbox)
         
         cookie_card.setLayout(cookie_layout)
@@ -744,18 +1371,58 @@ class MainWindow(QMainWindow):
         port_label.setStyleSheet("color: #8b949e; font-size: 13px;")
         port_label.setFixedWidth(100)
         
-        self.port_input = QLineEdit()
-        self.port_input.setPlaceholderText("8088")
-        self.port_input.setObjectName("input")
-        self.port_input.setFixedWidth(150)
-        self.port_input.setFixedHeight(40)
-        self.port_input.textChanged.connect(self.update_port_display)
+        self.settings_port_input = QLineEdit(self.port_input.text())
+        self.settings_port_input.setPlaceholderText("8088")
+        self.settings_port_input.setObjectName("input")
+        self.settings_port_input.setFixedWidth(150)
+        self.settings_port_input.setFixedHeight(40)
+        # 与控制台的端口输入框保持同步（内容相同时 setText 不会再触发 textChanged）
+        self.settings_port_input.textChanged.connect(self.port_input.setText)
+        self.port_input.textChanged.connect(self.settings_port_input.setText)
         
         port_layout.addWidget(port_label)
-        port_layout.addWidget(self.port_input)
+        port_layout.addWidget(self.settings_port_input)
         port_layout.addStretch()
         service_layout.addLayout(port_layout)
         
+        # 日志保留行数
+        log_lines_layout = QHBoxLayout()
+        log_lines_label = QLabel("日志行数:")
+        log_lines_label.setStyleSheet("color: #8b949e; font-size: 13px;")
+        log_lines_label.setFixedWidth(100)
+        
+        self.log_lines_input = QLineEdit()
+        self.log_lines_input.setPlaceholderText("2000")
+        self.log_lines_input.setObjectName("input")
+        self.log_lines_input.setFixedWidth(150)
+        self.log_lines_input.setFixedHeight(40)
+        self.log_lines_input.setValidator(QIntValidator(100, 1000000))
+        self.log_lines_input.setToolTip("运行日志最多保留的行数，超出后丢弃最早的日志")
+        
+        log_lines_layout.addWidget(log_lines_label)
+        log_lines_layout.addWidget(self.log_lines_input)
+        log_lines_layout.addStretch()
+        service_layout.addLayout(log_lines_layout)
+        
+        # worker 进程数
+        workers_layout = QHBoxLayout()
+        workers_label = QLabel("Worker 数:")
+        workers_label.setStyleSheet("color: #8b949e; font-size: 13px;")
+        workers_label.setFixedWidth(100)
+        
+        self.workers_input = QLineEdit()
+        self.workers_input.setPlaceholderText(f"自动（{self.default_worker_count()}）")
+        self.workers_input.setObjectName("input")
+        self.workers_input.setFixedWidth(150)
+        self.workers_input.setFixedHeight(40)
+        self.workers_input.setValidator(QIntValidator(0, 64))
+        self.workers_input.setToolTip("服务使用的进程数，留空或 0 时按 CPU 核数自动选择（最多 4 个），修改后重启服务生效")
+        
+        workers_layout.addWidget(workers_label)
+        workers_layout.addWidget(self.workers_input)
+        workers_layout.addStretch()
+        service_layout.addLayout(workers_layout)
+        
         service_card.setLayout(service_layout)
         layout.addWidget(service_card)
         
@@ -821,8 +1488,192 @@ class MainWindow(QMainWindow):
         
         layout.addStretch()
         
+        self.load_settings_to_ui()
+        return page
+    
+    def create_dashboard_page(self):
+        """创建监控页：吞吐、耗时分位数、进行中请求、错误率与按 Key 的用量"""
+        page = QWidget()
+        page.setObjectName("dashboard_page")
+        page.setStyleSheet(DASHBOARD_STYLE)
+        layout = QVBoxLayout(page)
+        layout.setContentsMargins(24, 24, 24, 24)
+        layout.setSpacing(16)
+        
+        self.dashboard_status = QLabel("服务未运行")
+        self.dashboard_status.setObjectName("field_label")
+        layout.addWidget(self.dashboard_status)
+        
+        # 指标卡片：(key, 图标, 标题, 折线颜色)
+        tiles = [
+            ("throughput", "⚡", "吞吐", "#58a6ff"),
+            ("ttfb", "⏱️", "首字节耗时", "#a371f7"),
+            ("latency", "⌛", "总耗时", "#d29922"),
+            ("inflight", "🔀", "进行中", "#3fb950"),
+            ("errors", "❗", "错误率", "#f85149"),
+            ("rate_limited", "🚦", "429 限流率", "#db6d28"),
+        ]
+        self.dashboard_tiles = {}
+        grid = QGridLayout()
+        grid.setSpacing(16)
+        for i, (key, icon, title, color) in enumerate(tiles):
+            card = QFrame()
+            card.setObjectName("card")
+            card_layout = QVBoxLayout(card)
+            card_layout.setContentsMargins(16, 12, 16, 12)
+            card_layout.setSpacing(4)
+            
+            title_label = QLabel(f"{icon} {title}")
+            title_label.setObjectName("field_label")
+            value_label = QLabel("—")
+            value_label.setObjectName("stat_value")
+            detail_label = QLabel("")
+            detail_label.setObjectName("stat_detail")
+            sparkline = Sparkline(color)
+            
+            card_layout.addWidget(title_label)
+            card_layout.addWidget(value_label)
+            card_layout.addWidget(detail_label)
+            card_layout.addWidget(sparkline)
+            grid.addWidget(card, i // 3, i % 3)
+            self.dashboard_tiles[key] = (value_label, detail_label, sparkline)
+        layout.addLayout(grid)
+        
+        # 按 API Key 的用量
+        usage_card = QFrame()
+        usage_card.setObjectName("card")
+        usage_layout = QVBoxLayout(usage_card)
+        usage_layout.setContentsMargins(20, 16, 20, 20)
+        usage_layout.setSpacing(12)
+        
+        usage_title = QLabel("按 API Key 的用量")
+        usage_title.setObjectName("card_title")
+        usage_layout.addWidget(usage_title)
+        
+        self.usage_table = QTableWidget(0, 5)
+        self.usage_table.setObjectName("usage_table")
+        self.usage_table.setHorizontalHeaderLabels(["API Key（指纹）", "请求数", f"最近 {DASHBOARD_WINDOW_SECONDS}s", "Prompt tokens", "Completion tokens"])
+        self.usage_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.usage_table.verticalHeader().setVisible(False)
+        self.usage_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.usage_table.setSelectionMode(QAbstractItemView.NoSelection)
+        usage_layout.addWidget(self.usage_table)
+        
+        layout.addWidget(usage_card, 1)
+        
         return page
     
+    def update_dashboard_polling(self):
+        """只在监控页可见且服务运行时轮询，切换页面、隐藏到托盘、最小化或停止服务后停止"""
+        port = self.port_input.text().strip() or "8088"
+        active = (
+            self.process is not None
+            and self.is_window_active()
+            and self.content_stack.currentIndex() == DASHBOARD_PAGE_INDEX
+        )
+        worker = self.metrics_worker
+        if worker is not None and (not active or worker.port != port or worker.workers != self.service_workers):
+            self.stop_dashboard_polling()
+        if active and self.metrics_worker is None:
+            for _, _, sparkline in self.dashboard_tiles.values():
+                sparkline.clear()
+            self.dashboard_status.setText("正在获取指标...")
+            self.metrics_worker = MetricsWorker(port, self.service_workers, self)
+            self.metrics_worker.stats_signal.connect(self.update_dashboard)
+            self.metrics_worker.error_signal.connect(self.handle_dashboard_error)
+            self.metrics_worker.auth_error_signal.connect(self.handle_dashboard_auth_error)
+            self.metrics_worker.finished.connect(self.metrics_worker.deleteLater)
+            self.metrics_worker.start()
+        elif self.process is None and self.is_page_built(DASHBOARD_PAGE_INDEX):
+            self.dashboard_status.setText("服务未运行")
+    
+    def stop_dashboard_polling(self, wait: bool = False):
+        worker, self.metrics_worker = self.metrics_worker, None
+        if worker is None:
+            return
+        worker.stats_signal.disconnect(self.update_dashboard)
+        worker.error_signal.disconnect(self.handle_dashboard_error)
+        worker.auth_error_signal.disconnect(self.handle_dashboard_auth_error)
+        worker.stop()
+        if wait:
+            worker.wait(3000)
+    
+    def update_dashboard(self, stats: dict):
+        """显示 MetricsWorker 计算好的监控数据"""
+        window = f"最近 {stats['window']:.0f}s"
+        self.dashboard_status.setText(f"每 {DASHBOARD_POLL_MS / 1000:g} 秒刷新，统计{window}（最长 {DASHBOARD_WINDOW_SECONDS}s）")
+        tiles = self.dashboard_tiles
+        
+        throughput = stats["throughput"]
+        tiles["throughput"][0].setText("—" if throughput is None else f"{throughput:.2f} req/s")
+        tokens = stats["tokens_per_sec"]
+        tiles["throughput"][1].setText(f"{window} {stats['requests']:.0f} 个请求" + ("" if tokens is None else f" · 输出 {tokens:.0f} token/s"))
+        tiles["throughput"][2].add(throughput)
+        
+        for key in ("ttfb", "latency"):
+            p50, p95 = stats[f"{key}_p50"], stats[f"{key}_p95"]
+            tiles[key][0].setText(f"p50 {format_seconds(p50)}")
+            tiles[key][1].setText(f"p95 {format_seconds(p95)}")
+            tiles[key][2].add(p95)
+        
+        tiles["inflight"][0].setText(f"{stats['inflight']:.0f} 个请求")
+        tiles["inflight"][1].setText(f"上游流 {stats['streams']:.0f}")
+        tiles["inflight"][2].add(stats["inflight"])
+        
+        for key, count_key, rate_key in (("errors", "errors", "error_rate"), ("rate_limited", "rate_limited", "rate_limited_rate")):
+            tiles[key][0].setText(format_rate(stats[rate_key]))
+            tiles[key][1].setText(f"{window} {stats[count_key]:.0f} 个")
+            tiles[key][2].add(stats[rate_key])
+        
+        accounts = sorted(stats["accounts"].items(), key=lambda item: -item[1].get("requests", 0))
+        self.usage_table.setRowCount(len(accounts))
+        for row, (key, usage) in enumerate(accounts):
+            recent = usage.get("recent")
+            values = [
+                key,
+                f"{usage.get('requests', 0):.0f}",
+                "—" if recent is None else f"{recent:.0f}",
+                f"{usage.get('prompt_tokens', 0):.0f}",
+                f"{usage.get('completion_tokens', 0):.0f}",
+            ]
+            for column, value in enumerate(values):
+                item = self.usage_table.item(row, column)
+                if item is None:
+                    self.usage_table.setItem(row, column, QTableWidgetItem(value))
+                elif item.text() != value:
+                    item.setText(value)
+    
+    def handle_dashboard_error(self, error: str):
+        self.dashboard_status.setText(f"无法获取指标（服务正在启动或繁忙）: {error}")
+        for _, _, sparkline in self.dashboard_tiles.values():
+            sparkline.add(None)
+    
+    def handle_dashboard_auth_error(self, error: str):
+        self.dashboard_status.setText(f"🔒 无法获取指标，{error}")
+        for _, _, sparkline in self.dashboard_tiles.values():
+            sparkline.add(None)
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.update_idle_state()
+    
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.update_idle_state()
+    
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == QEvent.WindowStateChange:
+            self.update_idle_state()
+    
+    def is_window_active(self) -> bool:
+        return self.isVisible() and not self.isMinimized()
+    
+    def update_idle_state(self):
+        """窗口隐藏到托盘或最小化时暂停界面刷新：日志只写入文件、监控页停止轮询，恢复显示时再更新"""
+        self.log_area.set_paused(not self.is_window_active())
+        self.update_dashboard_polling()
+    
     def update_port_display(self):
         """更新端口显示"""
         port = self.port_input.text().strip() or "8088"
@@ -961,7 +1812,7 @@ class MainWindow(QMainWindow):
             background-color: #0d1117;
         }
         
-        #console_page {
+        #console_page, #dashboard_page {
             background-color: #0d1117;
         }
         
@@ -1101,6 +1952,21 @@ class MainWindow(QMainWindow):
             color: #c9d1d9;
         }
         
+        QComboBox#log_filter {
+            background-color: transparent;
+            color: #8b949e;
+            border: 1px solid #30363d;
+            border-radius: 4px;
+            padding: 2px 8px;
+            font-size: 12px;
+        }
+        
+        QComboBox#log_filter QAbstractItemView {
+            background-color: #161b22;
+            color: #c9d1d9;
+            selection-background-color: #30363d;
+        }
+        
         /* === URL 文本 === */
         #url_text {
             color: #e6edf3;
@@ -1127,7 +1993,7 @@ class MainWindow(QMainWindow):
         }
         
         /* === 日志区域 === */
-        QTextEdit#log_area {
+        QPlainTextEdit#log_area {
             background-color: #0d1117;
             border: 1px solid #30363d;
             border-radius: 6px;
@@ -1208,19 +2074,56 @@ class MainWindow(QMainWindow):
         self.setStyleSheet(style)
 
     def load_config_to_ui(self):
+        self.port_input.setText(self.config.get("port", "8088"))
+        if self.is_page_built(SETTINGS_PAGE_INDEX):
+            self.load_settings_to_ui()
+
+    def load_settings_to_ui(self):
+        """设置页的字段（设置页创建时调用）"""
+        # 启动后服务可能已更新配置文件（如从浏览器恢复的 token_v2）
+        self.config = self.config_manager.get_all()
         self.cookie_input.setText(self.config.get("token_v2", ""))
         self.space_id_input.setText(self.config.get("space_id", ""))
         self.user_id_input.setText(self.config.get("user_id", ""))
-        self.port_input.setText(self.config.get("port", "8088"))
+        self.log_lines_input.setText(str(self.get_log_max_lines()))
+        workers = self.config.get("workers", 0)
+        self.workers_input.setText(str(workers) if workers else "")
+
+    def get_log_max_lines(self) -> int:
+        try:
+            return max(100, int(self.config.get("log_max_lines", 2000)))
+        except (TypeError, ValueError):
+            return 2000
+
+    @staticmethod
+    def default_worker_count() -> int:
+        return max(1, min(os.cpu_count() or 1, DEFAULT_MAX_WORKERS))
+
+    def get_worker_count(self) -> int:
+        """配置的 worker 数，0（自动）时按 CPU 核数选择"""
+        try:
+            workers = int(self.config.get("workers", 0))
+        except (TypeError, ValueError):
+            workers = 0
+        return workers if workers > 0 else self.default_worker_count()
 
-    def toggle_clipboard_monitoring(self, state):
-        """切换剪贴板监听"""
-        self.clipboard_monitoring = (state == Qt.Checked)
-        if self.clipboard_monitoring:
-            self.clipboard_timer.start()
-            self.last_clipboard_text = QApplication.clipboard().text()
+    def write_log_file(self, lines: List[str]):
+        """每批日志写入一次日志文件"""
+        text = "\n".join(lines).strip()
+        if text:
+            logger.info(text)
+
+    def toggle_clipboard_monitoring(self, enabled: bool):
+        """切换剪贴板监听：剪贴板内容变化时由 dataChanged 信号触发检查，不再定时轮询"""
+        if enabled == self.clipboard_monitoring:
+            return
+        self.clipboard_monitoring = enabled
+        clipboard = QApplication.clipboard()
+        if enabled:
+            self.last_clipboard_text = clipboard.text().strip()
+            clipboard.dataChanged.connect(self.check_clipboard)
         else:
-            self.clipboard_timer.stop()
+            clipboard.dataChanged.disconnect(self.check_clipboard)
 
     def check_clipboard(self):
         """检查剪贴板内容"""
@@ -1242,17 +2145,21 @@ class MainWindow(QMainWindow):
 
     def auto_load_cookie(self):
         """自动获取 Cookie"""
+        from app.utils.cookie_extractor import CookieError, last_success, try_all_browsers
         cookie, error_type, error_msg = try_all_browsers()
         
         if cookie:
             self.cookie_input.setText(cookie)
-            QMessageBox.information(self, "✅ 成功", "已成功读取 token_v2！\n请记得点击'保存配置'。")
+            source = last_success()
+            browser = f"（来自 {source[1].title()}）" if source else ""
+            QMessageBox.information(self, "✅ 成功", f"已成功读取 token_v2{browser}！\n请记得点击'保存配置'。")
         else:
             error_messages = {
                 CookieError.DATABASE_LOCKED: "浏览器正在运行，请关闭所有浏览器窗口后重试",
                 CookieError.PERMISSION_DENIED: "没有权限读取浏览器数据，请以管理员身份运行",
                 CookieError.FILE_NOT_FOUND: "找不到浏览器 Cookie 文件，请确认已安装 Chrome/Edge/Firefox",
                 CookieError.COOKIE_NOT_FOUND: "未找到 Notion Cookie，请确认已登录 notion.so",
+                CookieError.TIMEOUT: "读取浏览器 Cookie 超时，请稍后重试",
             }
             
             msg = error_messages.get(error_type, f"自动获取失败：{error_msg}")
@@ -1278,20 +2185,32 @@ class MainWindow(QMainWindow):
             "token_v2": self.cookie_input.text().strip(),
             "space_id": self.space_id_input.text().strip(),
             "user_id": self.user_id_input.text().strip(),
-            "port": self.port_input.text().strip() or "8088"
+            "port": self.port_input.text().strip() or "8088",
+            "log_max_lines": int(self.log_lines_input.text() or 2000),
+            "workers": int(self.workers_input.text() or 0)
         }
+        old_port = str(self.config_manager.get("port", "8088"))
+        old_workers = self.get_worker_count()
         self.config_manager.update(new_config)
+        self.config = self.config_manager.get_all()
         logger.info("配置已保存")
-        
-        # 如果服务正在运行，提示重启
-        if self.process:
+        self.log_area.set_max_lines(self.get_log_max_lines())
+        
+        # 服务会监视配置文件并热更新凭证，只有端口或 worker 数变化才需要重启
+        changed = [name for name, differs in (
+            ("端口", new_config["port"] != old_port),
+            ("Worker 数", self.get_worker_count() != old_workers),
+        ) if differs]
+        if self.process and changed:
             reply = QMessageBox.question(
                 self, "配置已更新", 
-                "配置已保存。服务正在运行，需要重启以应用新配置。\n\n是否立即重启服务？",
+                f"配置已保存。{'、'.join(changed)}已变更，需要重启服务才能生效。\n\n是否立即重启服务？",
                 QMessageBox.Yes | QMessageBox.No
             )
             if reply == QMessageBox.Yes:
                 self.restart_service()
+        elif self.process:
+            QMessageBox.information(self, "💾 保存成功", "配置已更新，运行中的服务将在几秒内自动加载新凭证，无需重启。")
         else:
             QMessageBox.information(self, "💾 保存成功", "配置已更新。")
     
@@ -1319,15 +2238,9 @@ class MainWindow(QMainWindow):
         self.config_manager.update(current_config)
         logger.info(f"Cookie 已保存，长度: {len(cookie)}")
         
-        # 如果服务正在运行，提示重启
+        # 服务会监视配置文件并热更新凭证，无需重启
         if self.process:
-            reply = QMessageBox.question(
-                self, "💾 保存成功", 
-                "Cookie 已保存。服务正在运行，需要重启以应用新配置。\n\n是否立即重启服务？",
-                QMessageBox.Yes | QMessageBox.No
-            )
-            if reply == QMessageBox.Yes:
-                self.restart_service()
+            QMessageBox.information(self, "💾 保存成功", "Cookie 已保存，运行中的服务将在几秒内自动加载新凭证，无需重启。")
         else:
             QMessageBox.information(self, "💾 保存成功", f"Cookie 已保存（长度: {len(cookie)}）")
 
@@ -1341,26 +2254,21 @@ class MainWindow(QMainWindow):
         if not os.path.exists(venv_python):
             QMessageBox.critical(self, "错误", f"找不到虚拟环境 Python:\n{venv_python}\n\n请确保已创建虚拟环境。")
             return
+        self.restart_timer.stop()
+        self.stopping = False
+        self.service_started_at = time.monotonic()
         
         # 打印日志文件路径
         from app.utils.logger import LOG_FILE
-        log_msg = f"⏳ 正在启动服务 (Port: {self.port_input.text()})...\n📝 日志文件: {LOG_FILE}"
+        log_msg = f"⏳ 正在启动服务 (Port: {self.port_input.text()}, Workers: {self.get_worker_count()})...\n📝 日志文件: {LOG_FILE}"
         self.log_area.append(log_msg)
         logger.info(f"启动服务，端口: {self.port_input.text().strip() or '8088'}")
         logger.info(f"日志文件: {LOG_FILE}")
         
-        self.process = QProcess()
-        self.process.setProcessChannelMode(QProcess.MergedChannels)
-        
         port = self.port_input.text().strip() or "8088"
-        cmd = venv_python
-        args = ["-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", port]
-        
-        self.process.readyReadStandardOutput.connect(self.handle_stdout)
-        self.process.finished.connect(self.process_finished)
-        
-        self.process.start(cmd, args)
+        self.process = self.spawn_service(venv_python, port)
         
+        from app.utils.notifier import notify_service_started
         notify_service_started(port)
         
         self.btn_start.setEnabled(False)
@@ -1380,28 +2288,106 @@ class MainWindow(QMainWindow):
         # 更新托盘菜单状态
         self.tray_start_action.setEnabled(False)
         self.tray_stop_action.setEnabled(True)
+        
+        self.update_dashboard_polling()
 
-    def stop_service(self):
+    def spawn_service(self, venv_python: str, port: str, handoff: bool = False) -> QProcess:
+        """启动服务进程；通过标准输入发送 drain 指令即可优雅停止（Windows 上 terminate 无法让控制台进程优雅退出）"""
+        # 服务启动时读取配置文件，先写入尚未落盘的修改
+        self.config_manager.flush()
+        process = QProcess()
+        process.setProcessChannelMode(QProcess.MergedChannels)
+        process.readyReadStandardOutput.connect(lambda p=process: self.handle_stdout(p))
+        process.finished.connect(lambda *_, p=process: self.process_finished(p))
+        args = ["-m", "app.core.server", "--host", "127.0.0.1", "--port", port, "--control-stdin"]
+        # 多个 worker 时服务进程作为监督进程，负责汇总输出、检查心跳并重启崩溃的 worker
+        self.service_workers = self.get_worker_count()
+        if self.service_workers > 1:
+            args += ["--workers", str(self.service_workers)]
+        if handoff:
+            # 交接重启的新进程与旧进程共享端口；普通启动时端口被占用会直接报错
+            args.append("--handoff")
+        process.start(venv_python, args)
+        return process
+
+    def drain_process(self, process: QProcess, wait: bool = False):
+        """让服务进程排空后退出：进行中的请求继续完成，超过排空时限仍未退出则强制结束"""
+        from app.core.config import settings
+        from app.core.server import DRAIN_COMMAND
+        process.write(f"{DRAIN_COMMAND}\n".encode())
+        timeout_ms = int((settings.SHUTDOWN_DRAIN_SECONDS + 5) * 1000)
+        if wait:
+            if not process.waitForFinished(timeout_ms):
+                process.kill()
+        else:
+            QTimer.singleShot(timeout_ms, lambda: self.kill_if_running(process))
+
+    def kill_if_running(self, process: QProcess):
+        if process.state() != QProcess.NotRunning:
+            logger.warning("服务进程排空超时，强制结束")
+            process.kill()
+
+    def stop_service(self, wait: bool = False):
+        if self.restart_timer.isActive():
+            # 等待自动重启期间停止：取消重启
+            self.restart_timer.stop()
+            self.log_area.append("⏹️ 已取消自动重启。")
+            self.status_text.setText("已停止")
+            self.btn_stop.setEnabled(False)
+            self.tray_stop_action.setEnabled(False)
         if self.process:
-            self.log_area.append("⏹️ 正在停止服务...")
+            self.stopping = True
+            self.log_area.append("⏹️ 正在停止服务（等待进行中的请求完成）...")
             logger.info("停止服务")
+            from app.utils.notifier import notify_service_stopped
             notify_service_stopped()
-            self.process.terminate()
-            if not self.process.waitForFinished(2000):
-                self.process.kill()
+            self.drain_process(self.process, wait)
     
     def restart_service(self):
-        """重启服务"""
-        self.log_area.append("🔄 正在重启服务...")
-        logger.info("重启服务")
-        if self.process:
-            self.stop_service()
-            # 等待进程完全停止后再启动
-            QTimer.singleShot(1500, self.start_service)
-        else:
+        """交接重启：新进程绑定同一端口并就绪后，旧进程再排空退出，期间请求不中断"""
+        if not self.process:
             self.start_service()
+            return
+        if self.handoff_process:
+            return
+        venv_python = os.path.join(os.getcwd(), ".venv", "Scripts", "python.exe")
+        port = self.port_input.text().strip() or "8088"
+        self.log_area.append("🔄 正在重启服务（新进程就绪后旧进程再退出）...")
+        logger.info("交接重启服务")
+        process = self.spawn_service(venv_python, port, handoff=True)
+        self.handoff_process = process
+        QTimer.singleShot(HANDOFF_TIMEOUT_MS, lambda: self.handoff_timeout(process))
+
+    def complete_handoff(self):
+        """新进程已就绪：切换为当前进程，旧进程排空退出"""
+        old, self.process = self.process, self.handoff_process
+        self.handoff_process = None
+        self.log_area.append("✅ 新服务进程已就绪，旧进程正在排空...")
+        logger.info("交接重启：新进程已就绪")
+        if old:
+            self.drain_process(old)
+
+    def handoff_timeout(self, process: QProcess):
+        if process is self.handoff_process:
+            self.log_area.append(f"❌ 新服务进程 {HANDOFF_TIMEOUT_MS // 1000} 秒内未就绪，继续使用原进程")
+            process.kill()
 
-    def process_finished(self):
+    def process_finished(self, process: QProcess = None):
+        # 读出剩余的输出，最后不带换行的半行也写入日志
+        if process is not None:
+            self.handle_stdout(process)
+        remainder = self.stdout_partials.pop(process, b"")
+        if remainder:
+            self.log_area.feed(ANSI_ESCAPE_RE.sub('', remainder.decode("utf-8", errors="ignore")))
+        self.log_area.finish_partial()
+        if process is not None and process is self.handoff_process:
+            self.handoff_process = None
+            self.log_area.append("❌ 新服务进程启动失败，继续使用原进程。")
+            return
+        if process is not None and process is not self.process:
+            # 交接重启后排空完毕的旧进程
+            self.log_area.append("♻️ 旧服务进程已退出。")
+            return
         self.process = None
         self.btn_start.setEnabled(True)
         self.btn_stop.setEnabled(False)
@@ -1417,43 +2403,62 @@ class MainWindow(QMainWindow):
         self.header_status_dot.setStyleSheet("")
         self.header_status_text.setText("已停止")
         
-        self.log_area.append("✅ 服务已停止。")
-        
         # 更新托盘菜单状态
         self.tray_start_action.setEnabled(True)
         self.tray_stop_action.setEnabled(False)
+        
+        if self.stopping:
+            self.log_area.append("✅ 服务已停止。")
+        else:
+            self.schedule_service_restart(process)
+        
+        self.update_dashboard_polling()
 
-    def handle_stdout(self):
-        data = self.process.readAllStandardOutput()
-        text = bytes(data).decode("utf-8", errors="ignore")
+    def schedule_service_restart(self, process: QProcess = None):
+        """服务进程意外退出：按退避间隔自动重启，等待期间点击停止可取消"""
+        if time.monotonic() - self.service_started_at >= RESTART_STABLE_SECONDS:
+            self.restart_backoff = 1.0
+        delay = self.restart_backoff
+        self.restart_backoff = min(self.restart_backoff * 2, RESTART_BACKOFF_MAX_SECONDS)
+        exit_code = process.exitCode() if process is not None else "未知"
+        self.log_area.append(f"❌ 服务进程意外退出（退出码 {exit_code}），{delay:.0f} 秒后自动重启...")
+        logger.error(f"服务进程意外退出（退出码 {exit_code}），{delay:.0f} 秒后自动重启")
+        self.status_text.setText("等待重启")
+        self.btn_stop.setEnabled(True)
+        self.tray_stop_action.setEnabled(True)
+        self.restart_timer.start(int(delay * 1000))
+
+    def auto_restart_service(self):
+        if self.process is None and not self.stopping:
+            self.start_service()
+
+    def handle_stdout(self, process: QProcess = None):
+        process = process or self.process
+        data = self.stdout_partials.get(process, b"") + bytes(process.readAllStandardOutput())
+        
+        # 只处理完整的行：就绪标记等关键字（以及多字节字符）被拆在两次读取之间时也能完整匹配
+        complete, newline, partial = data.rpartition(b"\n")
+        self.stdout_partials[process] = partial
+        if not newline:
+            return
+        text = complete.decode("utf-8", errors="ignore") + "\n"
         
         # 去除 ANSI 颜色代码
-        ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-        text = ansi_escape.sub('', text)
+        text = ANSI_ESCAPE_RE.sub('', text)
         
-        # 检测 Token 失效错误
-        if "TokenExpiredError" in text or "Token 已失效" in text:
-            cursor = self.log_area.textCursor()
-            cursor.movePosition(QTextCursor.End)
-            
-            fmt = QTextCharFormat()
-            fmt.setForeground(QColor("#ff6b6b"))
-            fmt.setFontWeight(700)
-            
-            cursor.insertText("\n❌ Token 已失效，请更新 token_v2\n", fmt)
-            
-            self.log_area.setTextCursor(cursor)
-            self.log_area.moveCursor(QTextCursor.End)
-            
-            if self.process:
-                self.stop_service()
-            return
+        if process is self.handoff_process:
+            from app.core.server import READY_MARKER
+            if READY_MARKER in text:
+                self.complete_handoff()
         
-        logger.info(text.strip())
+        # 日志按批写入控件与日志文件
+        self.log_area.feed(text)
         
-        self.log_area.moveCursor(QTextCursor.End)
-        self.log_area.insertPlainText(text)
-        self.log_area.moveCursor(QTextCursor.End)
+        # 检测 Token 失效错误：服务会热更新配置中的凭证，无需停止服务；失败的请求会反复输出，提示限频
+        if "TokenExpiredError" in text or "Token 已失效" in text:
+            if time.monotonic() - self.last_token_alert >= TOKEN_ALERT_INTERVAL:
+                self.last_token_alert = time.monotonic()
+                self.log_area.append_alert("❌ Token 已失效，请更新 token_v2（保存配置后自动生效）")
 
     def closeEvent(self, event):
         # 关闭窗口时最小化到托盘
@@ -1472,9 +2477,11 @@ class MainWindow(QMainWindow):
             reply = QMessageBox.question(self, '确认退出', "服务正在运行，退出将停止服务。确定要退出吗？",
                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
             if reply == QMessageBox.Yes:
-                self.stop_service()
+                self.stop_dashboard_polling(wait=True)
+                self.stop_service(wait=True)
                 QApplication.quit()
         else:
+            self.stop_dashboard_polling(wait=True)
             QApplication.quit()
 
     # --- 测试功能 ---
@@ -1484,16 +2491,44 @@ class MainWindow(QMainWindow):
         
         self.test_response.clear()
         self.test_response.append("⏳ 正在请求...")
-        self.btn_test_send.setEnabled(False)
-        self.test_input.setEnabled(False)
+        self.test_stats_label.setText("")
+        self.set_test_controls_enabled(False)
         
         port = self.port_input.text().strip() or "8088"
         self.test_worker = TestWorker(port, msg)
         self.test_worker.response_signal.connect(self.handle_test_response)
         self.test_worker.error_signal.connect(self.handle_test_error)
+        self.test_worker.stats_signal.connect(self.handle_test_stats)
         self.test_worker.finished_signal.connect(self.handle_test_finished)
         self.test_worker.start()
 
+    def send_burst_test(self):
+        msg = self.test_input.text().strip()
+        if not msg: return
+        count = min(BURST_MAX_REQUESTS, max(1, int(self.burst_count_input.text() or 1)))
+        
+        self.test_response.setPlainText(f"⏳ 正在并发发送 {count} 个请求...")
+        self.test_stats_label.setText(f"已完成 0/{count}")
+        self.set_test_controls_enabled(False)
+        
+        port = self.port_input.text().strip() or "8088"
+        self.burst_worker = BurstWorker(port, msg, count)
+        self.burst_worker.progress_signal.connect(lambda done, total: self.test_stats_label.setText(f"已完成 {done}/{total}"))
+        self.burst_worker.finished_signal.connect(self.handle_burst_finished)
+        self.burst_worker.start()
+
+    def handle_burst_finished(self, report: dict):
+        self.test_response.setPlainText(format_burst_report(report))
+        self.test_stats_label.setText("")
+        logger.info(f"并发测试完成: {len(report['results'])} 个请求，用时 {report['elapsed']:.2f}s")
+        self.handle_test_finished()
+
+    def set_test_controls_enabled(self, enabled: bool):
+        self.btn_test_send.setEnabled(enabled)
+        self.btn_test_burst.setEnabled(enabled)
+        self.burst_count_input.setEnabled(enabled)
+        self.test_input.setEnabled(enabled)
+
     def handle_test_response(self, content):
         text = self.test_response.toPlainText()
         if "⏳ 正在请求..." in text:
@@ -1505,9 +2540,17 @@ class MainWindow(QMainWindow):
     def handle_test_error(self, error):
         self.test_response.append(f"\n❌ {error}")
 
+    def handle_test_stats(self, result: dict):
+        """显示单次测试的首字耗时、总耗时与输出速度"""
+        total = result["total"]
+        speed = result["chars"] / total if total else 0
+        self.test_stats_label.setText(
+            f"首字耗时 {format_seconds(result['ttfb'])} · 总耗时 {format_seconds(total)} · "
+            f"{result['chars']} 字，{speed:.0f} 字/秒"
+        )
+
     def handle_test_finished(self):
-        self.test_input.setEnabled(True)
-        self.btn_test_send.setEnabled(True)
+        self.set_test_controls_enabled(True)
         self.test_input.setFocus()
 
 if __name__ == "__main__":
@@ -1521,6 +2564,25 @@ if __name__ == "__main__":
     app = QApplication(sys.argv)
     
     window = MainWindow()
+    window_created_at = time.perf_counter()
     window.show()
     
+    def report_startup_time():
+        """事件循环处理完窗口的首次显示后记录启动耗时，便于发现启动变慢"""
+        now = time.perf_counter()
+        timings = {
+            "import_ms": round((STARTUP_IMPORTED_AT - STARTUP_STARTED_AT) * 1000, 1),
+            "window_ms": round((window_created_at - STARTUP_IMPORTED_AT) * 1000, 1),
+            "show_ms": round((now - window_created_at) * 1000, 1),
+            "total_ms": round((now - STARTUP_STARTED_AT) * 1000, 1),
+        }
+        logger.info(
+            f"GUI 启动耗时 {timings['total_ms']:.0f}ms（导入 {timings['import_ms']:.0f}ms，"
+            f"创建窗口 {timings['window_ms']:.0f}ms，首次显示 {timings['show_ms']:.0f}ms）"
+        )
+        if STARTUP_BENCHMARK_ARG in sys.argv:
+            print(json.dumps(timings), flush=True)
+            app.quit()
+    
+    QTimer.singleShot(0, report_startup_time)
     sys.exit(app.exec())
@@ -1,13 +1,29 @@
 # main.py
+import asyncio
 import logging
+import os
+import secrets
+import time
 from contextlib import asynccontextmanager
 from typing import Optional
 
-from fastapi import FastAPI, Request, HTTPException, Depends, Header
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import FastAPI, Request, HTTPException, Depends, Header, Query
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 
 from app.core.config import settings
+from app.core.credentials import credential_store
 from app.providers.notion_provider import NotionAIProvider
+from app.utils.credential_recovery import credential_recovery
+from app.utils.drain import EXEMPT_PATH_PREFIXES, drain_controller
+from app.utils.loop_monitor import loop_monitor
+from app.utils.memory import GROUP_BY_CHOICES, memory_inspector
+from app.utils.metrics import metrics
+from app.utils.model_health import model_health
+from app.utils.model_registry import etag_matches, models_response_counter
+from app.utils.profiler import ProfilerBusyError, cpu_profiler
+from app.utils.stream_tracker import stream_tracker
+from app.utils.tracing import current_trace, tracer
+from app.utils.usage import key_fingerprint
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -18,13 +34,28 @@ provider = NotionAIProvider()
 async def lifespan(app: FastAPI):
     # 启动时重新加载配置（从 JSON 文件）
     logger.info("正在从配置文件重新加载配置...")
-    settings.reload_from_json()
+    credential_store.reload("startup")
+    if settings.CONFIG_WATCH_INTERVAL > 0:
+        credential_store.start_watching(settings.CONFIG_WATCH_INTERVAL)
     
     logger.info(f"应用启动中... {settings.APP_NAME} v{settings.APP_VERSION}")
     logger.info("服务已配置为 Notion AI 代理模式。")
     logger.info(f"服务将在 http://localhost:{settings.NGINX_PORT} 上可用")
     logger.info(f"使用 Cookie: {settings.NOTION_COOKIE[:20] if settings.NOTION_COOKIE else 'None'}...")
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    if settings.MODEL_REFRESH_INTERVAL > 0 and not settings.REPLAY_CAPTURE:
+        provider.models.start_refreshing(settings.MODEL_REFRESH_INTERVAL)
+    if settings.MODEL_PROBE_INTERVAL > 0 and not settings.REPLAY_CAPTURE:
+        provider.prober.start(settings.MODEL_PROBE_INTERVAL)
+    if settings.TOKEN_CHECK_INTERVAL > 0 and not settings.REPLAY_CAPTURE:
+        provider.token_validator.start(settings.TOKEN_CHECK_INTERVAL)
     yield
+    await provider.token_validator.stop()
+    await provider.prober.stop()
+    await provider.models.stop_refreshing()
+    await credential_store.stop_watching()
+    await loop_monitor.stop()
     logger.info("应用关闭。")
 
 app = FastAPI(
@@ -34,6 +65,86 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# 请求指标（只统计 /v1/ 接口），供 /metrics 与 GUI 监控页使用
+REQUEST_METRICS_PREFIX = "/v1/"
+requests_counter = metrics.counter("http_requests_total", "API 请求数（outcome: ok / error / rate_limited / rejected）")
+ttfb_histogram = metrics.histogram("http_response_ttfb_seconds", "从收到请求到发出首个响应数据块的耗时（秒）")
+duration_histogram = metrics.histogram("http_request_duration_seconds", "请求总耗时，流式响应到流结束为止（秒）")
+
+def request_outcome(status: int, trace) -> str:
+    """请求结果分类：流式响应的错误在 200 之后以 SSE 下发，需结合 trace 判断"""
+    error = trace is not None and "error" in trace.attrs
+    if status == 429 or (error and trace.attrs.get("upstream_status") == 429):
+        return "rate_limited"
+    if status >= 500 or error:
+        return "error"
+    if status >= 400:
+        return "rejected"
+    return "ok"
+
+class RequestTimingMiddleware:
+    """记录请求到达时间（用于计算排队耗时），并统计 /v1/ 接口的结果、首字节与总耗时（纯 ASGI 实现，不影响流式响应）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        received_at = time.perf_counter()
+        state = scope.setdefault("state", {})
+        state["received_at"] = received_at
+        path = scope["path"]
+        if not path.startswith(REQUEST_METRICS_PREFIX):
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        first_byte_at = None
+
+        async def send_wrapper(message):
+            nonlocal status, first_byte_at
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body" and first_byte_at is None and message.get("body"):
+                first_byte_at = time.perf_counter()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            now = time.perf_counter()
+            # 不存在的路径统一归为 other，避免标签无限增长
+            if status == 404:
+                path = "other"
+            requests_counter.inc(path=path, status=status, outcome=request_outcome(status, state.get("trace")))
+            duration_histogram.observe(now - received_at, path=path)
+            if first_byte_at is not None:
+                ttfb_histogram.observe(first_byte_at - received_at, path=path)
+
+class InflightMiddleware:
+    """
+    统计进行中的请求（流式响应结束才算完成），供排空进度使用。
+    排空开始后 uvicorn 自行关闭监听端口，已经接受的请求照常处理，不在这里拒绝，避免交接重启时出现失败请求
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(EXEMPT_PATH_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        drain_controller.inflight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            drain_controller.inflight -= 1
+
+app.add_middleware(RequestTimingMiddleware)
+app.add_middleware(InflightMiddleware)
+
 async def verify_api_key(authorization: Optional[str] = Header(None)):
     if settings.API_MASTER_KEY and settings.API_MASTER_KEY != "1":
         if not authorization or "bearer" not in authorization.lower():
@@ -42,18 +153,172 @@ async def verify_api_key(authorization: Optional[str] = Header(None)):
         if token != settings.API_MASTER_KEY:
             raise HTTPException(status_code=403, detail="无效的 API Key。")
 
+async def verify_admin_key(authorization: Optional[str] = Header(None)):
+    """管理接口认证：必须单独配置 ADMIN_API_KEY，不受 API_MASTER_KEY 开关影响"""
+    if not settings.ADMIN_API_KEY:
+        raise HTTPException(status_code=404, detail="管理接口未启用，请配置 ADMIN_API_KEY。")
+    if not authorization or "bearer" not in authorization.lower():
+        raise HTTPException(status_code=401, detail="需要 Bearer Token 认证。")
+    token = authorization.split(" ")[-1]
+    if not secrets.compare_digest(token, settings.ADMIN_API_KEY):
+        raise HTTPException(status_code=403, detail="无效的管理密钥。")
+
 @app.post("/v1/chat/completions", dependencies=[Depends(verify_api_key)])
 async def chat_completions(request: Request) -> StreamingResponse:
+    # 每个请求一个 trace，trace id 同时作为发往 Notion 的 traceId
+    received_at = getattr(request.state, "received_at", None)
+    trace = tracer.start_trace("chat_completions", start=received_at)
+    # 供 RequestTimingMiddleware 判断流式响应是否出错
+    request.state.trace = trace
+    # 用量按 Key 的指纹汇总
+    trace.set(api_key=key_fingerprint(request.headers.get("authorization")))
+    if received_at is not None:
+        trace.add_span("queue", received_at, time.perf_counter())
+    current_trace.set(trace)
     try:
-        request_data = await request.json()
+        with trace.span("read_request"):
+            request_data = await request.json()
         return await provider.chat_completion(request_data)
     except Exception as e:
         logger.error(f"处理聊天请求时发生顶层错误: {e}", exc_info=True)
+        trace.set(error=str(e))
+        tracer.finish(trace)
         raise HTTPException(status_code=500, detail=f"内部服务器错误: {str(e)}")
 
 @app.get("/v1/models", dependencies=[Depends(verify_api_key)], response_class=JSONResponse)
-async def list_models():
-    return await provider.get_models()
+async def list_models(if_none_match: Optional[str] = Header(None)):
+    """模型列表：响应体预先序列化，客户端带 If-None-Match 轮询时列表未变化则返回 304"""
+    listing = provider.models.listing
+    headers = {"ETag": listing.etag, "Cache-Control": "private, max-age=60"}
+    if etag_matches(if_none_match, listing.etag):
+        models_response_counter.inc(status="304")
+        return Response(status_code=304, headers=headers)
+    models_response_counter.inc(status="200")
+    return Response(listing.body, media_type="application/json", headers=headers)
+
+@app.get("/metrics", dependencies=[Depends(verify_api_key)], response_class=PlainTextResponse)
+async def prometheus_metrics(format: str = Query("prometheus", pattern="^(prometheus|json)$")):
+    """Prometheus 文本格式的指标，format=json 时返回 JSON 快照（GUI 监控页使用）"""
+    if format == "json":
+        return JSONResponse({**metrics.snapshot(), "pid": os.getpid()})
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health")
+async def health():
+    """健康检查：排空期间返回 503，便于负载均衡与交接重启摘除本进程"""
+    if drain_controller.draining:
+        return JSONResponse({"status": "draining", **drain_controller.status()}, status_code=503)
+    return {"status": "ok", "pid": os.getpid(), "inflight_requests": drain_controller.inflight}
+
+# --- 管理接口 ---
+
+@app.get("/admin/profile/cpu", dependencies=[Depends(verify_admin_key)], response_class=PlainTextResponse)
+async def profile_cpu(
+    seconds: float = Query(10, gt=0, description="采样时长（秒）"),
+    interval_ms: float = Query(10, ge=1, le=1000, description="采样间隔（毫秒）"),
+    include_idle: bool = Query(False, description="保留阻塞等待中的线程（按墙钟时间统计）"),
+):
+    """对当前 worker 进行采样式 CPU 分析，返回折叠栈（flamegraph 格式），默认不含空闲等待的线程"""
+    seconds = min(seconds, settings.PROFILE_MAX_SECONDS)
+    try:
+        # 在线程中采样，事件循环照常处理请求（也会被采样到）
+        collapsed = await asyncio.to_thread(cpu_profiler.profile, seconds, interval_ms / 1000, include_idle)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    filename = f"cpu-{os.getpid()}-{int(time.time())}.collapsed"
+    return PlainTextResponse(
+        collapsed,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@app.get("/admin/credentials", dependencies=[Depends(verify_admin_key)])
+async def credentials_info():
+    """当前凭证快照的版本与概况（不含明文），以及最近一次校验结果"""
+    return {
+        **credential_store.info(),
+        "token": provider.token_validator.info(),
+        "recovery": credential_recovery.info(),
+    }
+
+@app.post("/admin/credentials/validate", dependencies=[Depends(verify_admin_key)])
+async def credentials_validate():
+    """立即校验一次当前凭证"""
+    await provider.token_validator.validate()
+    return provider.token_validator.info()
+
+@app.post("/admin/reload-config", dependencies=[Depends(verify_admin_key)])
+async def reload_config():
+    """立即重新读取配置文件并热更新凭证，进行中的请求继续使用旧凭证"""
+    return credential_store.reload("admin")
+
+@app.get("/admin/models", dependencies=[Depends(verify_admin_key)])
+async def models_info():
+    """模型注册表状态：对外列表、Notion 可用模型、最近一次刷新结果、各模型的健康状态与回退链的路由顺序"""
+    return {**provider.models.info(), "health": model_health.snapshot(), "routing": provider.router.info()}
+
+@app.post("/admin/models/refresh", dependencies=[Depends(verify_admin_key)])
+async def models_refresh():
+    """立即向 Notion 查询一次可用模型"""
+    await provider.models.refresh()
+    return {**provider.models.info(), "health": model_health.snapshot()}
+
+@app.post("/admin/models/probe", dependencies=[Depends(verify_admin_key)])
+async def models_probe():
+    """立即探测一遍所有模型（每个模型一次真实的推理请求）"""
+    await provider.prober.probe_all()
+    return model_health.snapshot()
+
+@app.get("/admin/drain", dependencies=[Depends(verify_admin_key)])
+async def drain_status():
+    """排空进度：进行中的请求与上游流数量、已等待与剩余时间"""
+    return drain_controller.status()
+
+@app.post("/admin/drain", dependencies=[Depends(verify_admin_key)])
+async def drain_and_exit():
+    """开始排空：不再接受新请求，进行中的请求完成（或超时）后进程退出"""
+    drain_controller.request_shutdown("管理接口")
+    return drain_controller.status()
+
+@app.get("/admin/loop-lag", dependencies=[Depends(verify_admin_key)])
+async def loop_lag():
+    """事件循环延迟统计与最近的阻塞调用栈"""
+    return {**loop_monitor.stats(), "recent_blocks": loop_monitor.recent_events()}
+
+@app.get("/admin/memory", dependencies=[Depends(verify_admin_key)])
+async def memory_overview():
+    """进程内存概况 + 进行中流的内存占用 + 上游会话状态"""
+    streams = stream_tracker.snapshot()
+    return {
+        "process": memory_inspector.status(),
+        "inflight_streams": len(streams),
+        "inflight_held_bytes": sum(s["held_bytes"] for s in streams),
+        "streams": streams,
+        "upstream_session": provider.session_stats(),
+    }
+
+@app.post("/admin/memory/start", dependencies=[Depends(verify_admin_key)])
+async def memory_start(frames: int = Query(1, ge=1, le=64, description="每个分配记录的栈帧数")):
+    """开启 tracemalloc 并记录基线快照"""
+    return await asyncio.to_thread(memory_inspector.start, frames)
+
+@app.get("/admin/memory/diff", dependencies=[Depends(verify_admin_key)])
+async def memory_diff(
+    group_by: str = Query("lineno", description=f"分组方式: {', '.join(GROUP_BY_CHOICES)}"),
+    limit: int = Query(30, ge=1, le=500),
+    against: str = Query("baseline", pattern="^(baseline|previous)$"),
+):
+    """记录新快照，与基线或上一次快照对比，按模块/代码行列出增长最多的分配"""
+    try:
+        return await asyncio.to_thread(memory_inspector.diff, group_by, limit, against)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post("/admin/memory/stop", dependencies=[Depends(verify_admin_key)])
+async def memory_stop():
+    """停止 tracemalloc 并释放快照"""
+    return await asyncio.to_thread(memory_inspector.stop)
 
 @app.get("/", summary="根路径")
 def root():